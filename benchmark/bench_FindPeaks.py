@@ -0,0 +1,72 @@
+'''
+Copyright (C) 2016 Saeed Gholami Shahbandi. All rights reserved.
+
+This program is free software: you can redistribute it and/or
+modify it under the terms of the GNU Lesser General Public License
+as published by the Free Software Foundation, either version 3 of
+the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public
+License along with this program. If not, see
+<http://www.gnu.org/licenses/>
+'''
+
+from __future__ import print_function
+
+import sys, os, time
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../lib/'))
+import utilities
+
+################################################################################
+def synthetic_sinograms(n_samples, n_angles=2, n_walls=40, seed=0):
+    '''
+    sinogram-like signals: a noisy smooth background with sharp peaks (walls)
+    '''
+    rng = np.random.RandomState(seed)
+    x = np.arange(n_samples)
+    sinograms = np.zeros((n_angles, n_samples))
+    for a in range(n_angles):
+        sinograms[a] = 50 * np.exp(-((x-n_samples/2.)/(n_samples/4.))**2)
+        sinograms[a] += 5 * rng.rand(n_samples)
+        for pos in rng.randint(0, n_samples, n_walls):
+            sinograms[a] += 500*rng.rand() * np.exp(-((x-pos)/2.)**2)
+    return sinograms
+
+################################################################################
+if __name__ == '__main__':
+    '''
+    FindPeaks (one signal at a time) vs. FindPeaksVectorized (all at once)
+    with the default setting of the annotation gui [refWin, minDist, minVal]
+
+    python benchmark/bench_FindPeaks.py
+    '''
+    refWin, minDist, minVal = 10, 15, .15
+
+    print ('{:>10s} {:>14s} {:>14s} {:>10s} {:>10s}'.format('samples', 'FindPeaks(s)',
+                                                           'Vectorized(s)', 'speedup', 'identical'))
+    for n_samples in [2000, 5000, 10000, 20000]:
+        sinograms = synthetic_sinograms(n_samples)
+
+        tic = time.time()
+        peaks_ref = [ utilities.FindPeaks(sinogram, CWT=False,
+                                          Refine_win=refWin, MinPeakDist=minDist,
+                                          MinPeakVal=minVal, Polar=False)
+                      for sinogram in sinograms ]
+        t_ref = time.time() - tic
+
+        tic = time.time()
+        peaks_vec = utilities.FindPeaksVectorized(sinograms,
+                                                  Refine_win=refWin, MinPeakDist=minDist,
+                                                  MinPeakVal=minVal, Polar=False)
+        t_vec = time.time() - tic
+
+        identical = all([ list(p1) == list(p2) for p1,p2 in zip(peaks_ref, peaks_vec) ])
+        print ('{:>10d} {:>14.4f} {:>14.4f} {:>10.1f} {:>10s}'.format(n_samples, t_ref, t_vec,
+                                                                      t_ref/t_vec, str(identical)))
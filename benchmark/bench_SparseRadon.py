@@ -0,0 +1,64 @@
+'''
+Copyright (C) 2016 Saeed Gholami Shahbandi. All rights reserved.
+
+This program is free software: you can redistribute it and/or
+modify it under the terms of the GNU Lesser General Public License
+as published by the Free Software Foundation, either version 3 of
+the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public
+License along with this program. If not, see
+<http://www.gnu.org/licenses/>
+'''
+
+from __future__ import print_function
+
+import sys, os, time
+import numpy as np
+import cv2
+import skimage.transform
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../lib/'))
+import utilities
+
+################################################################################
+def synthetic_edge_map(size, n_walls=60, seed=0):
+    ''' a sparse edge image: thin random walls on a zero background '''
+    rng = np.random.RandomState(seed)
+    image = np.zeros((size, size), dtype=np.uint8)
+    for _ in range(n_walls):
+        p1 = tuple(int(v) for v in rng.randint(0, size, 2))
+        p2 = tuple(int(v) for v in rng.randint(0, size, 2))
+        cv2.line(image, p1, p2, 255, 1)
+    return image
+
+################################################################################
+if __name__ == '__main__':
+    '''
+    skimage.transform.radon vs utilities.SparseRadon on sparse edge maps
+
+    python benchmark/bench_SparseRadon.py
+    '''
+    theta = np.array([-60.3, -15., 12.7, 29.7]) # a handful of angles, as in radiography
+
+    print ('{:>8s} {:>10s} {:>12s} {:>12s} {:>10s} {:>12s}'.format('size', 'nonzero', 'skimage(s)',
+                                                                   'sparse(s)', 'speedup', 'min corr'))
+    for size in [500, 1000, 2000, 4000]:
+        image = synthetic_edge_map(size)
+
+        tic = time.time()
+        sinog_ref = skimage.transform.radon(image, theta=theta, circle=False)
+        t_ref = time.time() - tic
+
+        tic = time.time()
+        sinog_spr = utilities.SparseRadon(image, theta=theta)
+        t_spr = time.time() - tic
+
+        corr = min([ np.corrcoef(s1, s2)[0,1] for s1,s2 in zip(sinog_ref.T, sinog_spr.T) ])
+        print ('{:>8d} {:>10d} {:>12.4f} {:>12.4f} {:>10.1f} {:>12.5f}'.format(size, np.count_nonzero(image),
+                                                                             t_ref, t_spr, t_ref/t_spr, corr))
@@ -0,0 +1,819 @@
+'''
+Copyright (C) 2015 Saeed Gholami Shahbandi. All rights reserved.
+
+This program is free software: you can redistribute it and/or
+modify it under the terms of the GNU Lesser General Public License
+as published by the Free Software Foundation, either version 3 of
+the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public
+License along with this program. If not, see
+<http://www.gnu.org/licenses/>
+'''
+
+from __future__ import print_function
+
+import time
+import cv2
+import yaml
+
+import numpy as np
+import scipy.ndimage
+import skimage.transform # for radon
+
+# this repo
+import utilities
+import tiledImage
+from traitTable import TraitTable
+
+################################################################################
+################################################################################
+################################################################################
+'''
+Qt-free steps of the annotation pipeline.
+myWindowLib_annotation.MainWindow calls these from its button callbacks,
+and runMe_batch_annotation.py chains them over a directory of maps.
+'''
+
+# default settings, same as the initial values of the annotation gui
+default_setting = {'radiography source': 'origin', # 'origin', 'binary' or 'edge'
+                   'binary thresholding': [120, 255],
+                   'binary inverted': True,
+                   'canny setting': [50,150,3],
+                   'sinogram peak detection': [10,15,.15],
+                   'number of orientations': 2,
+                   'orientation refinement': [2., .5], # [window (degree), time budget (sec)] or None
+                   'radiography segments': None, # [max_gap, min_length] or None (infinite lines)
+                   'circle detection': [5, 100, .3]} # [min radius, max radius, min coverage]
+
+########################################
+def load_image(image_name):
+    '''
+    loading an image (grayscale), flipped upside down
+    see "known bugs" in docs/HOWTO_annotation_GUI.md for the flipping
+    pgm and npy maps are memory-mapped, see tiledImage.load_map
+    '''
+    return tiledImage.load_map(image_name)
+
+########################################
+def binary_image(image, thresholding=[120, 255], inverted=True):
+    ''' '''
+    [thr1, thr2] = thresholding
+    if inverted:
+        ret, binary = cv2.threshold(image , thr1,thr2 , cv2.THRESH_BINARY_INV)
+    else:
+        ret, binary = cv2.threshold(image , thr1,thr2 , cv2.THRESH_BINARY)
+    return binary
+
+########################################
+def edge_image(image, canny_setting=[50,150,3]):
+    ''' '''
+    [thr1, thr2, apt_size] = canny_setting
+    return cv2.Canny(image, thr1, thr2, apertureSize=int(apt_size))
+
+########################################
+def cached(cache, name, params, compute):
+    '''
+    the result of compute(), through the cache (a productCache.ImageCache of
+    the image) if it is given, the product is keyed by its name and params
+    '''
+    if cache is None:
+        return compute()
+    return cache.get(name, params, compute)
+
+########################################
+def report_progress(progress, fraction, message=''):
+    '''
+    reporting the progress of a step, if a progress callback is given
+    the callback might raise an exception to cancel the step (see workers.Worker)
+    '''
+    if progress is not None:
+        progress(fraction, message)
+
+########################################
+def find_dominant_orientations(image, num_orientations=2, gradient_threshold=.1,
+                               min_separation=5*np.pi/180, min_peak_value=.2,
+                               perpendicular=False, tile_size=1024, cache=None, progress=None):
+    '''
+    returns the dominant orientations (radian, in [-pi/2, pi/2)) of the image,
+    sorted from the strongest to the weakest
+
+    dominant orientations are the peaks of the (circular) weighted histogram
+    of oriented gradients. Only the gradients stronger than a fraction
+    (gradient_threshold) of the strongest gradient contribute to the histogram.
+
+    num_orientations: maximum number of orientations
+    min_separation: minimum angle between two orientations (radian)
+    min_peak_value: peaks smaller than this fraction of the highest are ignored
+    perpendicular: if True, only the strongest orientation is detected, and the
+    second is assumed to be perpendicular to it (the old behavior)
+    tile_size: the gradients are computed on tiles of this size (pixel),
+    so the whole gradient image is never in memory (see tiledImage.TiledImage)
+    cache: the histogram is reused (see cached)
+    progress: a callback, see report_progress
+    '''
+
+    ### computing orientations
+    if image is None:
+        return np.array([])
+
+    ### oriented gradients of the smoothed image, tile by tile
+    # the halo covers the smoothing and the aperture of the sobel (3 x 4 pixels),
+    # so the gradients of a tile are the same as those of the whole image.
+    # the gradient was of np.flipud(image), as (dx, -dy); that is the
+    # gradient of the image itself, at the flipped pixels, and the histogram
+    # does not depend on the order of the pixels, so nothing is flipped here
+    def oriented_gradient(tile):
+        smoothed = cv2.GaussianBlur(cv2.blur(tile, (9,9)), (9,9),0)
+        return ( cv2.Sobel(smoothed, cv2.CV_32F, 1,0, ksize=9) +
+                 1j*cv2.Sobel(smoothed, cv2.CV_32F, 0,1, ksize=9) )
+    gradients = tiledImage.TiledImage(image, oriented_gradient, tile_size=tile_size, halo=16, max_tiles=1)
+
+    ### weighted histogram of oriented gradients (only strong gradients)
+    # gradients are perpendicular to the walls, and walls are axial (theta = theta+pi)
+    # the strongest gradient is only known after the last tile, the gradients
+    # of the tiles are kept if they are strong enough for the strongest so far
+    num_bin = 180*5
+    def histogram():
+        (H, W), s = gradients.shape, gradients.tile_size
+        tiles = [(i,j) for i in range((H+s-1)//s) for j in range((W+s-1)//s)]
+        strong, max_magnitude = [], 0.
+        for (k, (i,j)) in enumerate(tiles):
+            report_progress(progress, .9*k/len(tiles), 'oriented gradients')
+            gradient = gradients.tile(i,j).ravel()
+            magnitude = np.abs(gradient)
+            max_magnitude = max(max_magnitude, magnitude.max())
+            strong.append( gradient[magnitude > gradient_threshold * max_magnitude] )
+        strong = np.concatenate(strong)
+
+        report_progress(progress, .9, 'histogram of oriented gradients')
+        hist, binc = utilities.wHOGBincount(strong.real, strong.imag, NumBin=num_bin,
+                                            MinMagnitude=gradient_threshold * max_magnitude,
+                                            Axial=True)
+        return utilities.smooth_circular(hist, window_len=21), binc
+
+    hist, binc = cached(cache, 'wHOG', [num_bin, gradient_threshold], histogram)
+    report_progress(progress, .95, 'peaks of the histogram')
+
+    ### finding peaks in the histogram
+    if perpendicular:
+        peakind = utilities.FindPeaksCircular(hist, NumPeaks=1)
+    else:
+        peakind = utilities.FindPeaksCircular(hist,
+                                              MinPeakDist = min_separation / (np.pi/num_bin),
+                                              MinPeakVal = min_peak_value,
+                                              NumPeaks = num_orientations)
+
+    # the orientations of walls are perpendicular to their gradients
+    orientations = binc[peakind] + np.pi/2
+    if perpendicular and len(orientations) > 0:
+        orientations = np.array([orientations[0], orientations[0]+np.pi/2])
+
+    # shrinking the range to [-pi/2, pi/2)
+    orientations = np.mod(orientations + np.pi/2, np.pi) - np.pi/2
+
+    return orientations
+
+########################################
+def refine_orientations(image, orientations, window=2*np.pi/180,
+                        coarse_step=.5*np.pi/180, min_step=.01*np.pi/180,
+                        time_budget=None, cache=None, progress=None):
+    '''
+    coarse-to-fine refinement of orientations (radian) for radiography
+
+    around each orientation, angles in [-window, window] are scored with
+    coarse_step, then the search narrows down to [-step, step] around the best
+    angle with a 4 times finer step, until the step is below min_step; the
+    refined angles stay within the window.
+    The score of an angle is the sharpness of its sinogram, the sum of squares
+    of its first differences: walls aligned with the projection make narrow
+    and high peaks. (The sum of squares of the sinogram itself is dominated by
+    large filled regions, which are not walls.)
+
+    the search of all orientations advances together, one level at a time,
+    and stops when time_budget (seconds) is over; the best angles so far are
+    returned (anytime). time_budget=None means no time limit.
+    cache: the nonzero pixels of the image are reused (see cached)
+    progress: a callback, see report_progress
+    '''
+
+    tic = time.time()
+    orientations = np.array(orientations, dtype=float)
+    if image is None or len(orientations) == 0:
+        return orientations
+
+    # same frame as find_lines_with_radiography
+    points = cached(cache, 'radon points', [], lambda: utilities.SparseRadonPoints(np.flipud(image)))
+    if len(points[2]) == 0:
+        return orientations
+
+    best = orientations.copy()
+    span, step = window, coarse_step
+    while step >= min_step:
+        offsets = np.arange(-span, span + step/2., step)
+        candidates = best[:,np.newaxis] + offsets[np.newaxis,:]
+
+        sinog_angles = candidates.ravel() - np.pi/2
+        sinograms = utilities.SparseRadonProjection(points, sinog_angles*180/np.pi)
+        sharpness = np.sum(np.diff(sinograms, axis=0)**2, axis=0).reshape(candidates.shape)
+
+        best = candidates[np.arange(len(best)), np.argmax(sharpness, axis=1)]
+        best = np.clip(best, orientations-window, orientations+window)
+        span, step = step, step/4.
+        report_progress(progress, min(1., np.log(coarse_step/step) / np.log(coarse_step/min_step)),
+                        'refining orientations')
+
+        if time_budget is not None and time.time()-tic > time_budget:
+            break
+
+    # shrinking the range to [-pi/2, pi/2)
+    return np.mod(best + np.pi/2, np.pi) - np.pi/2
+
+########################################
+def sinograms(image, orientations, radon_engine='sparse', cache=None):
+    '''
+    sinograms (one column per orientation) of the image, for lines along the
+    given orientations (radian)
+
+    radon_engine: 'sparse' (utilities.SparseRadon, projects only nonzero pixels)
+    or 'skimage' (skimage.transform.radon, rotates the whole image per angle)
+    cache: the sinograms (and nonzero pixels) of the image are reused (see cached)
+    they only depend on the image and the orientations, not on peak detection
+    '''
+    # flipud: why? I'm sure it won't work otherwise, but dont know why
+    # It should happen in both "find_dominant_orientations" & "find_grid_lines"
+    image = np.flipud(image)
+
+    orientations = np.array(orientations)
+    sinog_angles = orientations - np.pi/2 # in radian
+    def compute():
+        if radon_engine == 'sparse':
+            points = cached(cache, 'radon points', [], lambda: utilities.SparseRadonPoints(image))
+            return utilities.SparseRadonProjection(points, sinog_angles*180/np.pi)
+        elif radon_engine == 'skimage':
+            return skimage.transform.radon(image, theta=sinog_angles*180/np.pi, circle=False)
+    return cached(cache, 'sinograms', [radon_engine, orientations], compute)
+
+########################################
+def sinogram_peaks(sinograms, peak_detection=[10,15,.15]):
+    ''' peak indices of each sinogram (column), a list of arrays '''
+    [refWin, minDist, minVal] = peak_detection
+    # Find peaks in all sinograms at once
+    return utilities.FindPeaksVectorized(sinograms.T,
+                                         Refine_win = int(refWin),
+                                         MinPeakDist = int(minDist),
+                                         MinPeakVal = minVal,
+                                         Polar=False)
+
+########################################
+def lines_from_sinogram_peaks(image_shape, orientations, sinograms, peaks):
+    '''
+    returns (points, angles): for each peak, a point on the line (n x 2 array
+    of [x,y]) and the orientation of the line (radian)
+    '''
+    imgcenter = (image_shape[1]/2, # cols == x
+                 image_shape[0]/2) # rows == y
+    sinogram_center = len(sinograms.T[0])//2
+
+    points, angles = [np.zeros((0,2))], [np.zeros(0)]
+    for (orientation, peakind) in zip(orientations, peaks):
+        sinog_angle = orientation - np.pi/2
+        # line's distance to the center of the image
+        dist = np.array(peakind) - sinogram_center
+
+        points.append( np.stack([ imgcenter[0] + dist*np.cos(sinog_angle),
+                                  imgcenter[1] + dist*np.sin(sinog_angle) ], axis=1) )
+        angles.append( np.full(len(dist), orientation) )
+
+    return np.concatenate(points), np.concatenate(angles)
+
+########################################
+def radiography(image, orientations, peak_detection=[10,15,.15],
+                radon_engine='sparse', cache=None, progress=None):
+    '''
+    lines detected as peaks of the sinograms of the image along the given
+    orientations (radian)
+
+    returns (points, angles): for each line, a point on the line (n x 2 array
+    of [x,y]) and the orientation of the line (radian)
+
+    see sinograms() for radon_engine and cache, with a cache, changing only
+    the peak_detection does not recompute the sinograms
+    progress: a callback, see report_progress
+    '''
+    report_progress(progress, 0, 'sinograms')
+    sinogs = sinograms(image, orientations, radon_engine, cache)
+    report_progress(progress, .8, 'peaks of the sinograms')
+    peaks = sinogram_peaks(sinogs, peak_detection)
+    return lines_from_sinogram_peaks(image.shape, orientations, sinogs, peaks)
+
+########################################
+def find_lines_with_radiography(image, orientations, peak_detection=[10,15,.15],
+                                radon_engine='sparse', cache=None, progress=None):
+    '''
+    returns a TraitTable of lines, detected as peaks of the sinograms
+    of the image along the given orientations (radian)
+    see radiography()
+    '''
+    pts_0, angles = radiography(image, orientations, peak_detection, radon_engine, cache, progress)
+    pts_1 = pts_0 + np.stack([np.cos(angles), np.sin(angles)], axis=1)
+
+    lines = TraitTable()
+    lines.add_lines( np.concatenate([pts_0, pts_1], axis=1) )
+
+    return lines
+
+########################################
+def lines_to_segments(image, points, angles, max_gap=5, min_length=20, tolerance=1):
+    '''
+    the occupied runs of lines over the image, as segments
+
+    image: the source of radiography (nonzero pixels are occupied)
+    points, angles: lines, as returned by radiography()
+    max_gap: runs separated by gaps up to max_gap (pixels) are merged
+    min_length: shorter segments (pixels) are discarded
+    tolerance: a line occupies the pixels within this distance (pixels),
+    to tolerate thick walls and a slightly offset line
+
+    all lines are sampled (one sample per pixel) in one pass over the image
+    with scipy.ndimage.map_coordinates, and the runs of all lines are found
+    and merged together with array operations.
+
+    returns a (n x 4) array of segments [x1,y1,x2,y2]
+    '''
+    if len(points) == 0:
+        return np.zeros((0,4))
+
+    occupied = (np.asarray(image) > 0).astype(np.uint8)
+    if tolerance > 0:
+        occupied = scipy.ndimage.maximum_filter(occupied, size=2*int(tolerance)+1)
+
+    # samples along each line, from its closest point to the image center
+    # up to half of the image diagonal in both directions
+    h, w = occupied.shape
+    half_diagonal = int(np.ceil(np.sqrt(h**2 + w**2) / 2.)) + 1
+    t = np.arange(-half_diagonal, half_diagonal+1, dtype=float)
+
+    direction = np.stack([np.cos(angles), np.sin(angles)], axis=1)
+    center = np.array([w/2., h/2.])
+    foot = points + np.sum((center - points) * direction, axis=1)[:,np.newaxis] * direction
+
+    X = foot[:,0:1] + t[np.newaxis,:] * direction[:,0:1]
+    Y = foot[:,1:2] + t[np.newaxis,:] * direction[:,1:2]
+    samples = scipy.ndimage.map_coordinates(occupied, [Y.ravel(), X.ravel()],
+                                            order=0, mode='constant', cval=0)
+    samples = samples.reshape(X.shape) > 0
+
+    # runs of occupied samples, over all lines at once
+    padded = np.zeros((samples.shape[0], samples.shape[1]+2), dtype=np.int8)
+    padded[:,1:-1] = samples
+    change = np.diff(padded, axis=1)
+    run_line, run_start = np.nonzero(change == 1)
+    _, run_end = np.nonzero(change == -1) # exclusive, same order as starts (row major)
+
+    if len(run_start) == 0:
+        return np.zeros((0,4))
+
+    # merging runs of the same line, separated by gaps up to max_gap
+    new_segment = np.ones(len(run_start), dtype=bool)
+    new_segment[1:] = (run_line[1:] != run_line[:-1]) | (run_start[1:] - run_end[:-1] > max_gap)
+    first = np.flatnonzero(new_segment)
+    last = np.r_[first[1:], len(run_start)] - 1
+
+    seg_line, seg_start, seg_end = run_line[first], run_start[first], run_end[last]-1
+    keep = (seg_end - seg_start) >= min_length
+    seg_line, seg_start, seg_end = seg_line[keep], seg_start[keep], seg_end[keep]
+
+    p1 = foot[seg_line] + t[seg_start][:,np.newaxis] * direction[seg_line]
+    p2 = foot[seg_line] + t[seg_end][:,np.newaxis] * direction[seg_line]
+
+    return np.concatenate([p1, p2], axis=1)
+
+########################################
+def find_segments_with_radiography(image, orientations, peak_detection=[10,15,.15],
+                                   max_gap=5, min_length=20, tolerance=1,
+                                   radon_engine='sparse', cache=None, progress=None):
+    '''
+    returns a TraitTable of segments, the occupied runs of the lines
+    detected by radiography (see radiography() and lines_to_segments())
+    '''
+    points, angles = radiography(image, orientations, peak_detection, radon_engine, cache, progress)
+    report_progress(progress, .9, 'occupied segments')
+    segments = lines_to_segments(image, points, angles, max_gap, min_length, tolerance)
+
+    traits = TraitTable()
+    traits.add_segments(segments)
+
+    return traits
+
+########################################
+def find_circles(edges, radius_range=[5,100], min_coverage=.3, full_coverage=.9,
+                 gradient_image=None, max_circles=50, max_angle=np.pi/12,
+                 wall_thickness=6, max_gap=None, min_support=.75, progress=None):
+    '''
+    returns a TraitTable of circles and arcs, detected in
+    the edge image
+
+    every edge pixel votes for the centers along its gradient direction (both
+    sides, since the wall could be darker or brighter than the background),
+    at all the distances in radius_range. The votes of all pixels and radii are
+    accumulated with a single np.bincount. Peaks of the accumulator are the
+    candidate centers. The radius of each candidate is the distance with the
+    most edge pixels per unit of perimeter (with the other edge of the wall,
+    if there is one), and the circle is refined by a least squares fit to the
+    edge pixels near its edges (see fit_circle). The coverage is estimated
+    from all the edge pixels near the refined circle, and each supported part
+    of the perimeter is an arc (or the circle). Edge pixels supporting a
+    circle do not support the next candidates.
+
+    radius_range: [min, max] radius (pixel)
+    min_coverage: fraction of the perimeter that must be continuously supported
+    by edge pixels; less supported candidates are discarded
+    full_coverage: if the support is more than this fraction, a circle is
+    returned, otherwise an arc spanning the supported part of the perimeter
+    gradient_image: the image to compute the gradient directions from (e.g.
+    the original map); if None, the normal directions of the edges are
+    estimated from the edges (structure tensor)
+    max_circles: maximum number of accumulator peaks to examine
+    max_angle: an edge pixel supports a circle only if its gradient is
+    within this angle of the radial direction (rejects straight walls)
+    wall_thickness: the two edges of a wall, up to this far apart (pixel),
+    support the same circle (in the middle of the wall)
+    max_gap: gaps in the support shorter than this (pixel, along the
+    perimeter) are bridged, e.g. where a wall crosses the circle
+    default: 2*wall_thickness
+    min_support: fraction of the detected arc (or circle) that must be
+    supported by edge pixels (the rest is bridged gaps)
+    progress: see report_progress
+    '''
+    traits = TraitTable()
+    if edges is None:
+        return traits
+
+    [r_min, r_max] = [int(r) for r in radius_range]
+    max_gap = 2*wall_thickness if max_gap is None else max_gap
+    h, w = edges.shape
+    rows, cols = np.nonzero(edges) # sorted by rows
+    if len(rows) == 0:
+        return traits
+
+    ### gradient (normal) direction at edge pixels
+    report_progress(progress, 0, 'gradient directions')
+    if gradient_image is not None:
+        dx = cv2.Sobel(gradient_image, cv2.CV_32F, 1,0, ksize=5)[rows,cols]
+        dy = cv2.Sobel(gradient_image, cv2.CV_32F, 0,1, ksize=5)[rows,cols]
+    else:
+        # the gradient of an edge line is null on the line itself, but the
+        # dominant direction of the gradients around it (structure tensor) is its normal
+        blurred = cv2.GaussianBlur((edges>0).astype(np.float32), (5,5), 0)
+        gx = cv2.Sobel(blurred, cv2.CV_32F, 1,0, ksize=3)
+        gy = cv2.Sobel(blurred, cv2.CV_32F, 0,1, ksize=3)
+        jxx, jxy, jyy = [cv2.GaussianBlur(j, (5,5), 0)[rows,cols] for j in (gx*gx, gx*gy, gy*gy)]
+        angle = .5 * np.arctan2(2*jxy, jxx-jyy)
+        dx, dy = np.cos(angle), np.sin(angle)
+        dx[(jxx+jyy) == 0] = 0
+    mag = np.sqrt(dx**2 + dy**2)
+    valid = mag > 0
+    rows, cols = rows[valid], cols[valid]
+    ux, uy = dx[valid]/mag[valid], dy[valid]/mag[valid]
+
+    ### voting: (pixels x radii x 2 directions) votes, in one bincount
+    report_progress(progress, .1, 'voting')
+    radii = np.arange(r_min, r_max+1, dtype=np.float32)
+    radii = np.concatenate([radii, -radii])
+    cx = np.rint(cols[:,np.newaxis] + radii * ux[:,np.newaxis]).astype(np.int32)
+    cy = np.rint(rows[:,np.newaxis] + radii * uy[:,np.newaxis]).astype(np.int32)
+    inside = (cx>=0) & (cx<w) & (cy>=0) & (cy<h)
+    accumulator = np.bincount(cy[inside]*w + cx[inside], minlength=h*w).reshape(h,w)
+    del cx, cy, inside
+    accumulator = cv2.GaussianBlur(accumulator.astype(np.float32), (5,5), 0)
+
+    ### candidate centers: local maxima of the accumulator, strongest first
+    peaks = (accumulator == scipy.ndimage.maximum_filter(accumulator, size=2*r_min+1))
+    peaks &= accumulator > 2*np.pi*r_min*min_coverage / 4.
+    p_rows, p_cols = np.nonzero(peaks)
+    order = np.argsort(accumulator[p_rows,p_cols])[::-1][:max_circles]
+    p_rows, p_cols = p_rows[order], p_cols[order]
+
+    ### radius and support of each candidate
+    # the pixels supporting an accepted circle do not support the next
+    # candidates, so the fragments of a circle (or the circles tangent to it
+    # from inside) are not detected again
+    accepted = []
+    used = np.zeros(len(rows), dtype=bool)
+    margin = r_max + wall_thickness + 3
+    for (i, (yc, xc)) in enumerate(zip(p_rows, p_cols)):
+        report_progress(progress, .3 + .7*i/len(p_rows), 'candidate circles')
+        lo, hi = np.searchsorted(rows, [yc-margin, yc+margin])
+        idx = np.arange(lo, hi)
+
+        # the edge pixels near the candidate, that do not support an accepted circle
+        pixels = (cols[idx], rows[idx], ux[idx], uy[idx], ~used[idx])
+
+        # the support is within 1.5 pixel of an edge, a band as wide as the
+        # wall would also support small circles tangent to straight walls.
+        # if the peak is off the center, the edges are blurred, so the fit
+        # also starts from the whole wall fitted as one circle (which is
+        # biased on short arcs), and the fit with more support is kept
+        fits = [refine_circle(pixels, xc, yc, [r_min, r_max], radius_range, wall_thickness, max_angle)]
+        ex, ey, dist = radial_distances(pixels, xc, yc, max_angle)
+        rc = wall_edges(dist, [r_min, r_max], radius_range, wall_thickness)[0]
+        wall = np.abs(dist - rc) <= wall_thickness
+        if np.count_nonzero(wall) >= 3:
+            x0, y0, r0, _ = fit_circle(cols[idx[wall]], rows[idx[wall]])
+            if np.isfinite(r0) and r_min <= r0 <= r_max:
+                r0 = int(round(r0))
+                fits.append( refine_circle(pixels, x0, y0, [max(r0-wall_thickness, r_min), min(r0+wall_thickness, r_max)],
+                                           radius_range, wall_thickness, max_angle) )
+        (xc, yc, edge_radii, residual, ex, ey, dist, edge, support) = max(fits, key=lambda fit: np.count_nonzero(fit[-1]))
+        rc = np.mean(edge_radii)
+        if np.count_nonzero(support) < 3 or not np.isfinite(rc) or not (r_min <= rc <= r_max):
+            continue
+        # not a circle (e.g. a corner of two walls)
+        if residual > 1.:
+            continue
+
+        # the same circle, from another candidate
+        if any( np.sqrt((xc-x)**2+(yc-y)**2) < max(3, .05*r) and abs(rc-r) < wall_thickness
+                for (x,y,r) in accepted ):
+            continue
+        accepted.append( (xc,yc,rc) )
+        used[idx[support]] = True
+
+        # angular coverage of the supporting pixels, with bins of ~2 pixels of perimeter
+        theta = np.arctan2(ey[support], ex[support])
+        num_bin = int(max(8, min(360, np.pi*rc)))
+        occupied = np.bincount( (((theta+np.pi) / (2*np.pi)) * num_bin).astype(np.intp) % num_bin,
+                                minlength=num_bin) > 0
+        # bridging the gaps shorter than max_gap
+        supported = occupied
+        gap = int(np.ceil(max_gap / (2*np.pi*rc/num_bin)))
+        if gap > 0 and not np.all(occupied) and np.any(occupied):
+            occupied = scipy.ndimage.binary_closing(np.tile(occupied, 3), structure=np.ones(gap+1))[num_bin:2*num_bin]
+
+        if np.all(occupied):
+            if np.mean(supported) >= min_support:
+                traits.add_circles([[xc,yc]], [rc])
+            continue
+
+        # every circular run of occupied bins (the fragments of the circle) is an arc
+        shift = np.argmin(occupied) # start from an empty bin, so no run wraps around
+        rolled = np.concatenate([[0], np.roll(occupied, -shift).astype(np.int8), [0]])
+        starts = np.flatnonzero(np.diff(rolled) == 1)
+        ends = np.flatnonzero(np.diff(rolled) == -1)
+        for (start, end) in zip(starts, ends):
+            run_start, run_length = (start+shift) % num_bin, end-start
+            if run_length < min_coverage * num_bin:
+                continue
+            # most of the run must be supported, not bridged (e.g. a few walls
+            # tangent to a small circle, and the gaps between them)
+            run = (run_start + np.arange(run_length)) % num_bin
+            if np.mean(supported[run]) < min_support:
+                continue
+            if run_length >= full_coverage * num_bin:
+                traits.add_circles([[xc,yc]], [rc])
+            else:
+                t1 = -np.pi + run_start * 2*np.pi/num_bin
+                t2 = t1 + run_length * 2*np.pi/num_bin
+                traits.add_arcs([[xc,yc]], [rc], [[t1,t2]])
+
+    return traits
+
+########################################
+def radial_distances(pixels, xc, yc, max_angle=np.pi/12):
+    '''
+    offsets and distances of edge pixels to a center, the distance is nan if
+    the gradient is not radial, or if the pixel is not free
+    pixels: (x, y, ux, uy, free), the edge pixels with their unit gradients
+    '''
+    (x, y, ux, uy, free) = pixels
+    ex, ey = x - xc, y - yc
+    dist = np.sqrt( ex**2 + ey**2 )
+    radial = np.abs(ex*ux + ey*uy) >= np.cos(max_angle) * dist
+    radial &= free
+    return ex, ey, np.where(radial, dist, np.nan)
+
+########################################
+def wall_edges(dist, search_range, radius_range=[5,100], wall_thickness=6):
+    '''
+    radius of the densest edge (in search_range), and the other edge of the
+    wall if any, from the distances of edge pixels to a center
+    '''
+    [r_min, r_max] = [int(r) for r in radius_range]
+    [lo, hi] = search_range
+    in_range = (dist >= r_min-2) & (dist <= r_max+wall_thickness+2)
+    # edge pixels per unit of perimeter, at each radius
+    counts = np.bincount(np.rint(dist[in_range]).astype(np.intp), minlength=r_max+wall_thickness+4)
+    density = np.convolve(counts, np.ones(3), mode='same') / (2*np.pi*np.maximum(np.arange(len(counts)), 1))
+    r1 = lo + np.argmax(density[lo:hi+1])
+    near = np.arange(max(r1-wall_thickness, 1), min(r1+wall_thickness, len(density)-1)+1)
+    near = near[(np.abs(near-r1) > 2) & (density[near] >= .5*density[r1])]
+    return [r1, near[np.argmax(density[near])]] if len(near) > 0 else [r1]
+
+########################################
+def edge_support(dist, edge_radii):
+    ''' the nearest edge of each pixel, and whether it is within 1.5 pixel of it '''
+    edge = np.argmin([np.abs(dist - r) for r in edge_radii], axis=0)
+    return edge, np.abs(dist - np.choose(edge, edge_radii)) <= 1.5
+
+########################################
+def refine_circle(pixels, xc, yc, search_range, radius_range=[5,100],
+                  wall_thickness=6, max_angle=np.pi/12):
+    '''
+    least squares fit to the pixels of the edges of a wall (see fit_circle),
+    the center moves and the edges are found again (at most wall_thickness
+    from the last fit)
+    pixels: see radial_distances
+    search_range: [min, max] radius of the first edge
+    returns (xc, yc, edge_radii, residual, ex, ey, dist, edge, support)
+    '''
+    [r_min, r_max] = [int(r) for r in radius_range]
+    [lo, hi] = search_range
+    (x, y) = pixels[:2]
+    ex, ey, dist = radial_distances(pixels, xc, yc, max_angle)
+    edge_radii, residual = wall_edges(dist, [lo, hi], radius_range, wall_thickness), np.inf
+    radii = edge_radii # of the last fit
+    for _ in range(3):
+        edge, support = edge_support(dist, edge_radii)
+        if np.count_nonzero(support) < 3: break
+        fit = fit_circle(x[support], y[support], edge[support])
+        if not np.all(np.isfinite(fit[2])): break
+        xc, yc, radii, residual = fit
+        ex, ey, dist = radial_distances(pixels, xc, yc, max_angle)
+        rc = int(round(np.mean(radii)))
+        (lo, hi) = (max(rc-wall_thickness, r_min), min(rc+wall_thickness, r_max))
+        if lo > hi: break
+        edge_radii = wall_edges(dist, [lo, hi], radius_range, wall_thickness)
+    edge, support = edge_support(dist, radii)
+    return xc, yc, radii, residual, ex, ey, dist, edge, support
+
+########################################
+def fit_circle(x, y, edge=None):
+    '''
+    least squares circle of points (algebraic fit, Kasa)
+    returns (xc, yc, rc, rms of the distances of the points to the circle)
+
+    edge: the index of the edge of each point, for concentric circles (the
+    two edges of a wall), then rc is the list of the radii of the edges
+    '''
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    labels = np.zeros(len(x), dtype=np.intp) if edge is None else np.asarray(edge, dtype=np.intp)
+    n_edge = labels.max()+1 if len(labels) > 0 else 1
+    mx, my = x.mean(), y.mean() # centered, for the conditioning
+    x, y = x-mx, y-my
+    A = np.zeros((len(x), 2+n_edge))
+    A[:,0], A[:,1] = x, y
+    A[np.arange(len(x)), 2+labels] = 1
+    solution = np.linalg.lstsq(A, x**2 + y**2, rcond=-1)[0]
+    xc, yc = solution[0]/2., solution[1]/2.
+    squared = solution[2:] + xc**2 + yc**2
+    radii = np.where(squared > 0, np.sqrt(np.maximum(squared, 0)), np.nan)
+    residual = np.sqrt(np.mean( (np.sqrt((x-xc)**2 + (y-yc)**2) - radii[labels])**2 ))
+    rc = radii[0] if edge is None else list(radii)
+    return xc+mx, yc+my, rc, residual
+
+########################################
+def circle_from_three_points(p1, p2, p3):
+    '''
+    the circle passing through three points, returns (xc, yc, rc)
+    http://mathworld.wolfram.com/Circle.html
+    the radius is nan or inf if the points are collinear
+    '''
+    [x1,y1], [x2,y2], [x3,y3] = p1, p2, p3
+    a = np.array([ [x1,y1,1], [x2,y2,1], [x3,y3,1] ])
+    d = np.array([ [x1**2+y1**2,y1,1], [x2**2+y2**2,y2,1], [x3**2+y3**2,y3,1] ])
+    e = np.array([ [x1**2+y1**2,x1,1], [x2**2+y2**2,x2,1], [x3**2+y3**2,x3,1] ])
+    f = np.array([ [x1**2+y1**2,x1,y1], [x2**2+y2**2,x2,y2], [x3**2+y3**2,x3,y3] ])
+    a,d,e,f = np.linalg.det(a), -np.linalg.det(d), np.linalg.det(e), -np.linalg.det(f)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        xc, yc = -d/(2*a) , -e/(2*a)
+        rc = np.sqrt( ((d**2 + e**2)/ (4*(a**2))) - (f/a))
+    return xc, yc, rc
+
+########################################
+def radiography_source(image, setting=default_setting):
+    '''
+    returns the input image of the radiography, according to setting
+    '''
+    if setting['radiography source'] == 'origin':
+        return image
+    elif setting['radiography source'] == 'binary':
+        return binary_image(image,
+                            setting['binary thresholding'],
+                            setting['binary inverted'])
+    elif setting['radiography source'] == 'edge':
+        return edge_image(image, setting['canny setting'])
+    else:
+        raise (ValueError('unknown radiography source: '+str(setting['radiography source'])))
+
+################################################################################
+############################################################ trait file in/out
+################################################################################
+def traits_to_dict(traits, boundary=None):
+    '''
+    converting traits to a dictionary, in the format of the trait yaml files
+    traits: a TraitTable, or a list of trts.*Modified objects
+    boundary: [xMin, yMin, xMax, yMax], used for bounding the arrangement of infinit lines
+    '''
+    if not isinstance(traits, TraitTable):
+        traits = TraitTable.from_traits(traits)
+    return traits.to_dict(boundary)
+
+########################################
+def load_traits_from_file(file_name):
+    ''' returns a TraitTable of the traits in a yaml file '''
+    with open(file_name, 'r') as stream:
+        data = yaml.safe_load(stream)
+    return TraitTable.from_dict(data)
+
+########################################
+def image_boundary(image, margin=1):
+    '''
+    [xMin, yMin, xMax, yMax] of the image, same as MyMplCanvas.plotImage
+    '''
+    return [0-margin, 0-margin, image.shape[1]+margin, image.shape[0]+margin]
+
+########################################
+def map_info(image_name):
+    ''' resolution and origin of a map_server map, None for other maps (see tiledImage.ros_map_info) '''
+    return tiledImage.ros_map_info(image_name)
+
+########################################
+def traits_to_metric(traits, boundary, map_info):
+    '''
+    traits and boundary from pixel to metric coordinates of a map_server map
+
+    the origin of map_server is the pose of the lower-left corner of the map,
+    which after flipping the image is the corner of pixel (0,0), at (-.5,-.5)
+    '''
+    if not isinstance(traits, TraitTable):
+        traits = TraitTable.from_traits(traits)
+
+    resolution = float(map_info['resolution'])
+    [x0, y0, yaw] = [float(o) for o in map_info['origin']]
+    # p_metric = R(yaw) * resolution*(p+.5) + origin
+    offset = .5*resolution * np.array([np.cos(yaw)-np.sin(yaw), np.sin(yaw)+np.cos(yaw)])
+    translation = np.array([x0, y0]) + offset
+    metric = traits.transform(scale=resolution, rotation=yaw, translation=translation)
+
+    if boundary is not None:
+        [xMin, yMin, xMax, yMax] = boundary
+        corners = TraitTable()
+        corners.add_segments([[xMin, yMin, xMax, yMax], [xMin, yMax, xMax, yMin]])
+        boundary = corners.transform(resolution, yaw, translation).bounding_box()
+
+    return metric, boundary
+
+########################################
+def save_traits_to_file(file_name, trait_list, boundary=None, map_info=None):
+    '''
+    map_info: if not None (see map_info), traits are saved in metric
+    coordinates of the map_server map, and resolution and origin of the map
+    are saved along
+    '''
+    if map_info is not None:
+        trait_list, boundary = traits_to_metric(trait_list, boundary, map_info)
+
+    data = traits_to_dict(trait_list, boundary)
+    if map_info is not None:
+        data['resolution'] = float(map_info['resolution'])
+        data['origin'] = [float(o) for o in map_info['origin']]
+
+    with open(file_name, 'w') as yaml_file:
+        yaml.dump(data, yaml_file)
+
+################################################################################
+##################################################################### pipeline
+################################################################################
+def annotate_map(image_name, setting=default_setting):
+    '''
+    the chain of the "Load Map", "Auto detection" (dominant orientations)
+    and "detect lines with radiography" buttons of the annotation gui
+
+    returns (image, orientations, traits), or None if the image is not readable
+    '''
+    image = load_image(image_name)
+    if image is None:
+        return None
+
+    orientations = find_dominant_orientations(image, setting['number of orientations'])
+    source = radiography_source(image, setting)
+    if setting['orientation refinement'] is not None:
+        [window, budget] = setting['orientation refinement']
+        orientations = refine_orientations(source, orientations,
+                                           window=window*np.pi/180, time_budget=budget)
+    if setting['radiography segments'] is None:
+        traits = find_lines_with_radiography(source, orientations,
+                                             setting['sinogram peak detection'])
+    else:
+        [max_gap, min_length] = setting['radiography segments']
+        traits = find_segments_with_radiography(source, orientations,
+                                                setting['sinogram peak detection'],
+                                                max_gap=max_gap, min_length=min_length)
+
+    return image, orientations, traits
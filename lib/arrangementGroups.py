@@ -0,0 +1,278 @@
+'''
+Copyright (C) 2016 Saeed Gholami Shahbandi. All rights reserved.
+
+This program is free software: you can redistribute it and/or
+modify it under the terms of the GNU Lesser General Public License
+as published by the Free Software Foundation, either version 3 of
+the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public
+License along with this program. If not, see
+<http://www.gnu.org/licenses/>
+'''
+
+from __future__ import print_function
+
+import multiprocessing
+
+import numpy as np
+import scipy.sparse
+import scipy.sparse.csgraph
+
+# arrangement repo
+import arrangement.arrangement as arr
+
+################################################################################
+################################################################################
+################################################################################
+'''
+Spatially partitioned construction of arrangements.
+
+Traits whose bounding boxes (clipped to the boundary of the map) do not
+overlap, directly or through other traits, can not intersect. So the traits
+are split into groups (connected components of overlapping bounding boxes,
+and groups whose boxes overlap, e.g. nested rooms, are merged), the
+arrangement of each group is constructed separately in a process pool, and
+the arrangements are combined in an ArrangementGroup.
+
+Lines that are not axis-aligned span the whole boundary, so a single such line
+puts all the traits in one group (and the arrangement is constructed as before).
+'''
+
+########################################
+def clipped_boxes(traits, boundary=None):
+    '''
+    bounding boxes of the traits (see TraitTable.bounding_boxes), clipped to
+    the boundary [xMin, yMin, xMax, yMax]
+    boxes of traits outside the boundary are empty (min > max)
+    '''
+    boxes = traits.bounding_boxes().copy()
+    if boundary is not None:
+        xMin, yMin, xMax, yMax = boundary
+        boxes[:,:2] = np.maximum(boxes[:,:2], [xMin, yMin])
+        boxes[:,2:] = np.minimum(boxes[:,2:], [xMax, yMax])
+    return boxes
+
+########################################
+def overlapping_pairs(boxes):
+    '''
+    pairs of indices of overlapping boxes (touching counts as overlapping)
+    sweep along x: the boxes are sorted by xMin, and each box is only
+    compared with the boxes that start before it ends
+    '''
+    order = np.argsort(boxes[:,0], kind='mergesort')
+    xMin, yMin, xMax, yMax = boxes[order].T
+    ends = np.searchsorted(xMin, xMax, side='right')
+    empty = (xMin > xMax) | (yMin > yMax) # outside the boundary
+
+    rows, cols = [], []
+    for i in range(len(order)):
+        if empty[i]: continue
+        j = np.arange(i+1, ends[i])
+        j = j[ (yMin[j] <= yMax[i]) & (yMin[i] <= yMax[j]) & ~empty[j] ]
+        rows.append( np.full(len(j), i) )
+        cols.append( j )
+
+    if len(rows) == 0:
+        return np.zeros((0,2), dtype=int)
+    pairs = np.stack([np.concatenate(rows), np.concatenate(cols)], axis=1).astype(int)
+    return order[pairs]
+
+########################################
+def connected_groups(pairs, n):
+    ''' connected components of n items with the given pairs, as lists of indices '''
+    adjacency = scipy.sparse.coo_matrix((np.ones(len(pairs)), (pairs[:,0], pairs[:,1])), shape=(n,n))
+    n_groups, labels = scipy.sparse.csgraph.connected_components(adjacency, directed=False)
+    order = np.argsort(labels, kind='mergesort')
+    return np.split(order, np.flatnonzero(np.diff(labels[order])) + 1)
+
+########################################
+def group_boxes(groups, boxes):
+    ''' the box of each group, the union of the boxes of its traits inside the boundary '''
+    union = np.full((len(groups),4), np.nan)
+    for (idx, group) in enumerate(groups):
+        b = boxes[group]
+        b = b[(b[:,0] <= b[:,2]) & (b[:,1] <= b[:,3])]
+        if len(b) == 0: union[idx] = [1, 1, 0, 0] # empty, outside the boundary
+        else: union[idx] = np.concatenate([b[:,:2].min(axis=0), b[:,2:].max(axis=0)])
+    return union
+
+########################################
+def trait_groups(traits, boundary=None, frame=None):
+    '''
+    groups of trait indices (list of arrays), sorted from the largest group
+
+    traits are grouped by overlapping bounding boxes, and then groups whose
+    boxes (the union of the boxes of their traits) overlap are merged, until
+    no two boxes of groups overlap
+    the second step is for nested groups, e.g. the walls of a room inside an
+    enclosure, whose walls are separate segments with boxes that do not
+    overlap the room: the faces of the room and the enclosure overlap, so
+    they have to be in the same arrangement
+
+    frame: indices of the border segments of the boundary (see
+    TraitTable.clipped), they are left out of the grouping, since their box
+    contains all the others. The frame is the first group, with the groups
+    that reach the boundary (and could intersect the frame); the face of the
+    frame is then under the faces of the other groups (see ArrangementGroup)
+    '''
+    n = len(traits)
+    if n == 0: return []
+    frame = np.zeros(0, dtype=int) if frame is None else np.asarray(frame, dtype=int)
+    rows = np.setdiff1d(np.arange(n), frame)
+    if len(rows) == 0: return [frame]
+
+    boxes = clipped_boxes(traits, boundary)[rows]
+    groups = connected_groups(overlapping_pairs(boxes), len(rows))
+
+    while len(groups) > 1:
+        pairs = overlapping_pairs(group_boxes(groups, boxes))
+        if len(pairs) == 0: break
+        merged = connected_groups(pairs, len(groups))
+        groups = [np.sort(np.concatenate([groups[g] for g in m])) for m in merged]
+
+    groups = sorted([rows[g] for g in groups], key=len, reverse=True)
+    if len(frame) == 0:
+        return groups
+
+    # the groups that are not strictly inside the boundary go with the frame
+    xMin, yMin, xMax, yMax = boundary
+    union = group_boxes(groups, clipped_boxes(traits, boundary))
+    inside = (union[:,0] > xMin) & (union[:,1] > yMin) & (union[:,2] < xMax) & (union[:,3] < yMax)
+    framed = [frame] + [g for (g, i) in zip(groups, inside) if not i]
+    return [np.sort(np.concatenate(framed))] + [g for (g, i) in zip(groups, inside) if i]
+
+########################################
+def build_group(args):
+    ''' the arrangement of a group of traits, in a process of the pool '''
+    idx, traits, config = args
+    return idx, arr.Arrangement(traits.to_traits(), config)
+
+########################################
+def build_arrangement(traits, config, boundary=None, frame=None, progress=None):
+    '''
+    the arrangement of the traits (a TraitTable), constructed per group of
+    traits (see trait_groups, for boundary and frame) in a pool of
+    config['multi_processing'] processes
+
+    returns an arr.Arrangement if there is one group, otherwise an
+    ArrangementGroup of the arrangements of the groups
+    progress: a callback, see workers.Worker
+    '''
+    report = progress if progress is not None else lambda fraction, message='': None
+    report(0, 'grouping traits')
+    groups = trait_groups(traits, boundary, frame)
+
+    if len(groups) <= 1:
+        # the arrangement parallelizes the intersections of one group by itself
+        report(.1, 'intersections, graph and decomposition')
+        return arr.Arrangement(traits.to_traits(), config)
+
+    processes = config['multi_processing']
+    # pool processes are daemons and can not have their own pool
+    config = dict(config, multi_processing=1)
+    tasks = [(idx, traits.subset(group), config) for (idx, group) in enumerate(groups)]
+    arrangements = [None]*len(groups)
+    # largest groups first, so that they do not end up last on a busy pool
+    tasks = sorted(tasks, key=lambda task: len(task[1]), reverse=True)
+
+    pool = multiprocessing.Pool(processes=min(processes, len(groups)))
+    try:
+        for count, (idx, arrangement) in enumerate(pool.imap_unordered(build_group, tasks)):
+            arrangements[idx] = arrangement
+            report(.1 + .85*(count+1.)/len(groups),
+                   '{:d} of {:d} groups of traits'.format(count+1, len(groups)))
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+    return ArrangementGroup(arrangements, groups)
+
+################################################################################
+################################################################################
+################################################################################
+class ArrangementGroup(object):
+    '''
+    arrangements of spatially independent groups of traits, combined
+
+    faces are indexed globally (the faces of the first arrangement, then the
+    second, ...), so it is used as an arrangement for face selection and
+    merging (see decomposition and merge_faces)
+    graph is not combined, see arrangements_of() for iterating over the parts
+
+    the faces of the arrangements do not overlap, except for the first one
+    if it is the frame of the boundary (see trait_groups): later arrangements
+    are on top of the earlier ones, for find_face and for FaceLabelMap
+    '''
+
+    ########################################
+    def __init__(self, arrangements, groups):
+        self.arrangements = arrangements
+        self.groups = groups # the trait indices of each arrangement
+        self.decomposition = DecompositionGroup(self)
+
+    ########################################
+    def face_offsets(self):
+        ''' index of the first face of each arrangement, and the total '''
+        counts = [len(a.decomposition.faces) for a in self.arrangements]
+        return np.concatenate([[0], np.cumsum(counts)]).astype(int)
+
+    ########################################
+    def local_face(self, face_idx):
+        ''' (index of the arrangement, index of the face in that arrangement) '''
+        offsets = self.face_offsets()
+        part = int(np.searchsorted(offsets, face_idx, side='right')) - 1
+        return part, int(face_idx - offsets[part])
+
+    ########################################
+    def merge_faces(self, face_idx):
+        '''
+        merging faces (global indices), only faces of the same group could
+        be merged (faces of different groups are not adjacent)
+        '''
+        local = [self.local_face(idx) for idx in face_idx]
+        parts = set([part for (part, _) in local])
+        if len(parts) > 1:
+            print ('\t WARNING: faces of different groups of traits are not adjacent, not merged')
+            return
+        if len(parts) == 1:
+            part = parts.pop()
+            self.arrangements[part].merge_faces([idx for (_, idx) in local])
+
+########################################
+class DecompositionGroup(object):
+    ''' the decompositions of an ArrangementGroup, with global face indices '''
+
+    ########################################
+    def __init__(self, group):
+        self.group = group
+
+    ########################################
+    @property
+    def faces(self):
+        return [face for a in self.group.arrangements for face in a.decomposition.faces]
+
+    ########################################
+    def find_face(self, point):
+        ''' global index of the face that contains the point, None if there is none '''
+        offsets = self.group.face_offsets()
+        # the last arrangement is on top, see ArrangementGroup
+        for part in reversed(range(len(self.group.arrangements))):
+            arrangement = self.group.arrangements[part]
+            face_idx = arrangement.decomposition.find_face(point)
+            if face_idx is not None:
+                return int(offsets[part] + face_idx)
+        return None
+
+########################################
+def arrangements_of(arrangement):
+    ''' the arrangements of an ArrangementGroup, or [arrangement] '''
+    if isinstance(arrangement, ArrangementGroup):
+        return arrangement.arrangements
+    return [arrangement]
@@ -0,0 +1,163 @@
+'''
+Copyright (C) 2016 Saeed Gholami Shahbandi. All rights reserved.
+
+This program is free software: you can redistribute it and/or
+modify it under the terms of the GNU Lesser General Public License
+as published by the Free Software Foundation, either version 3 of
+the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public
+License along with this program. If not, see
+<http://www.gnu.org/licenses/>
+'''
+
+from __future__ import print_function
+
+import numpy as np
+import sympy as sym
+import scipy.ndimage
+
+################################################################################
+################################################################################
+################################################################################
+'''
+Picking the faces of an arrangement with a raster of face labels.
+
+All the faces are rasterized once (the label of a pixel is the index of the
+face that contains the center of the pixel, -1 if none), so finding the face
+of a point is an array index. Only on the pixels at the border of faces, the
+face is found exactly (decomposition.find_face).
+After merging faces, only the pixels of the merged faces are rasterized again.
+'''
+
+################################################################################
+class FaceLabelMap(object):
+    '''
+    the raster of the faces of an arrangement (or of an ArrangementGroup)
+    max_size: the number of pixels of the longer side of the raster
+    progress: a callback, see workers.Worker
+    '''
+
+    ########################################
+    def __init__(self, arrangement, max_size=2048, progress=None):
+        self.arrangement = arrangement
+        self.faces = list(arrangement.decomposition.faces)
+        paths = [face.get_punched_path() for face in self.faces]
+
+        if len(paths) == 0:
+            self.origin, self.pixel = np.zeros(2), 1.
+            self.labels = np.full((0,0), -1, dtype=np.int32)
+            self.ambiguous = np.zeros((0,0), dtype=bool)
+            return
+
+        boxes = np.array([path.get_extents().get_points().ravel() for path in paths]) # x0,y0,x1,y1
+        self.origin = boxes[:,:2].min(axis=0)
+        size = boxes[:,2:].max(axis=0) - self.origin
+        self.pixel = max(size.max() / float(max_size), np.finfo(float).eps)
+        shape = np.ceil(size[::-1] / self.pixel).astype(int) + 1
+        self.labels = np.full(shape, -1, dtype=np.int32)
+
+        for (idx, path) in enumerate(paths):
+            self.paint(idx, path)
+            if progress is not None and idx % 100 == 0:
+                progress(float(idx)/len(paths), 'rasterizing faces')
+
+        self.ambiguous = self.border_pixels(self.labels)
+
+    ########################################
+    def pixel_of(self, x, y):
+        ''' (row, column) of the pixel of a point, None if out of the raster '''
+        c = int(np.floor((x - self.origin[0]) / self.pixel))
+        r = int(np.floor((y - self.origin[1]) / self.pixel))
+        if 0 <= r < self.labels.shape[0] and 0 <= c < self.labels.shape[1]:
+            return r, c
+        return None
+
+    ########################################
+    def window_of(self, path, window=None):
+        ''' the slices of the pixels of a path (within a window of slices) '''
+        (x0, y0), (x1, y1) = path.get_extents().get_points()
+        c1, r1 = [int(np.floor((v - o) / self.pixel)) for (v, o) in zip((x0, y0), self.origin)]
+        c2, r2 = [int(np.floor((v - o) / self.pixel)) + 1 for (v, o) in zip((x1, y1), self.origin)]
+        (R1, R2), (C1, C2) = ((0, self.labels.shape[0]), (0, self.labels.shape[1])) if window is None else \
+                             ((window[0].start, window[0].stop), (window[1].start, window[1].stop))
+        return slice(max(r1, R1), min(r2, R2)), slice(max(c1, C1), min(c2, C2))
+
+    ########################################
+    def paint(self, idx, path, window=None, where=None):
+        '''
+        setting the label of the pixels (within the window) whose centers are in the path
+        where: a boolean mask of the pixels that could be painted (same shape as labels)
+        '''
+        rows, cols = self.window_of(path, window)
+        if rows.stop <= rows.start or cols.stop <= cols.start:
+            return
+        Y, X = np.mgrid[rows, cols]
+        centers = np.stack([X.ravel(), Y.ravel()], axis=1) * self.pixel + self.origin + self.pixel/2.
+        inside = path.contains_points(centers).reshape(X.shape)
+        if where is not None:
+            inside &= where[rows, cols]
+        self.labels[rows, cols][inside] = idx
+
+    ########################################
+    @staticmethod
+    def border_pixels(labels):
+        ''' pixels with a different label in their 3x3 neighborhood '''
+        if labels.size == 0:
+            return np.zeros(labels.shape, dtype=bool)
+        return ( scipy.ndimage.maximum_filter(labels, size=3, mode='nearest') !=
+                 scipy.ndimage.minimum_filter(labels, size=3, mode='nearest') )
+
+    ########################################
+    def find_face(self, x, y):
+        '''
+        index of the face that contains the point, None if there is none
+        exact (decomposition.find_face) only on the border of faces
+        '''
+        pixel = self.pixel_of(x, y)
+        if pixel is None:
+            return None
+        if self.ambiguous[pixel]:
+            return self.arrangement.decomposition.find_face(sym.Point(x, y))
+        label = self.labels[pixel]
+        return None if label < 0 else int(label)
+
+    ########################################
+    def update(self):
+        '''
+        updating the raster after faces are merged (or removed)
+        faces are matched by identity: the labels of the faces that are still
+        there are only renumbered, and the pixels of the faces that are gone
+        are rasterized again with the new faces
+        '''
+        faces = list(self.arrangement.decomposition.faces)
+        new_index = dict([(id(face), idx) for (idx, face) in enumerate(faces)])
+        old_ids = set([id(face) for face in self.faces])
+
+        # the last element is for the label -1 (no face)
+        remap = np.array([new_index.get(id(face), -2) for face in self.faces] + [-1], dtype=np.int32)
+        self.labels = remap[self.labels]
+        stale = self.labels == -2
+        self.faces = faces
+        if not np.any(stale):
+            return
+
+        rows, cols = np.nonzero(stale)
+        window = ( slice(rows.min(), rows.max()+1), slice(cols.min(), cols.max()+1) )
+        self.labels[stale] = -1
+        for (idx, face) in enumerate(faces):
+            if id(face) not in old_ids:
+                self.paint(idx, face.get_punched_path(), window, where=stale)
+
+        # border pixels only change in the window and 1 pixel around it
+        (H, W) = self.labels.shape
+        r1, r2 = max(window[0].start-1, 0), min(window[0].stop+1, H)
+        c1, c2 = max(window[1].start-1, 0), min(window[1].stop+1, W)
+        R1, C1 = max(r1-1, 0), max(c1-1, 0)
+        border = self.border_pixels(self.labels[R1:r2+1, C1:c2+1])
+        self.ambiguous[r1:r2, c1:c2] = border[r1-R1:r2-R1, c1-C1:c2-C1]
@@ -16,8 +16,8 @@ License along with this program. If not, see
 <http://www.gnu.org/licenses/>
 '''
 
+import cv2
 import numpy as np
-import sympy as sym
 import PySide
 
 # the address to the arrangement package is added to sys.path
@@ -30,13 +30,19 @@ matplotlib.rcParams['text.usetex']=True
 matplotlib.rcParams['text.latex.unicode']=True
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
+from matplotlib.collections import LineCollection
 from matplotlib.backends.backend_qt4agg import FigureCanvasQTAgg
 
 # there is conflict in importing matplotlib stuff both here and in arrangement.plotting
 # so, instead of importing the whole arrangement.plotting, I just import what I need.
 # import arrangement.plotting as aplt
 from  arrangement.plotting import plot_edges, plot_nodes
-import arrangement.geometricTraits as trts
+
+# this repo
+import tiledImage
+import traitTable
+import arrangementGroups
+import utilities
 
 ################################################################################
 ################################################################################
@@ -51,6 +57,9 @@ class MyMplCanvas(FigureCanvasQTAgg):
     def __init__(self, parent=None):#, width=5, height=4, dpi=100):
         ''' '''
 
+        # render_stats: number of artists added and of full canvas draws
+        self.render_stats = {'artists': 0, 'draws': 0}
+
         self.alpha = 1.0
         self.markers = [ 'ro','go','bo','ko',
                          'r*','g*','b*','k*',
@@ -64,26 +73,70 @@ class MyMplCanvas(FigureCanvasQTAgg):
         self.edge_plot_instances = []
         self.node_plot_instances = []
 
+        # border of the plot (see set_border), set by show_image or set_border
+        self.xMin, self.yMin, self.xMax, self.yMax = None, None, None, None
+
+        # retained scene (see show_image, set_trait_layer and refresh)
+        self.image_artist, self.image_source = None, None
+        self.layers = {}
+        self.dirty = False
+
+        # image pyramid (see show_image and update_image_level)
+        self.pyramids, self.max_pyramids = [], 3
+        self.image_levels, self.image_view = None, None
+
+        # overlay (see update_overlay), animated artists blitted over the cached background
+        self.overlay = {}
+        self.overlay_background = None
+
+        # sinograms and their peak markers (see plot_dominant_orientation_detection)
+        self.sinogram_plot = None
+
         FigureCanvasQTAgg.__init__(self, self.fig)
         self.setParent(parent)
         FigureCanvasQTAgg.setSizePolicy(self, PySide.QtGui.QSizePolicy.Expanding, PySide.QtGui.QSizePolicy.Expanding)
         FigureCanvasQTAgg.updateGeometry(self)
 
+        self.mpl_connect('draw_event', self.on_draw_event)
+        self.connect_axes_callbacks()
+
         self.draw()
 
     ########################################
-    def clear_axes(self):
+    def draw(self):
+        ''' FigureCanvasQTAgg.draw, counted in render_stats '''
+        self.render_stats['draws'] += 1
+        FigureCanvasQTAgg.draw(self)
+
+    ########################################
+    def reset_render_stats(self):
+        self.render_stats = {'artists': 0, 'draws': 0}
+
+    ########################################
+    def clear_axes(self, redraw=True):
         self.axes.cla()
         # self.axes.axis('off')
         self.axes.axis('equal')
-        self.draw()
+
+        # all the artists of the retained scene and the overlay are gone with cla()
+        self.image_artist, self.image_source = None, None
+        self.layers = {}
+        self.dirty = True
+        self.overlay, self.overlay_background = {}, None
+        self.face_plot_instances = []
+        self.sinogram_plot = None
+        self.connect_axes_callbacks()
+
+        if redraw: self.draw()
 
     ########################################
     def plot_arrangement(self, arrangement):
 
-        # plot edges and nodes
-        self.edge_plot_instances = plot_edges (self.axes, arrangement)
-        self.node_plot_instances = plot_nodes (self.axes, arrangement)
+        # plot edges and nodes (of each arrangement of a group, see arrangementGroups)
+        self.edge_plot_instances, self.node_plot_instances = [], []
+        for arrang in arrangementGroups.arrangements_of(arrangement):
+            self.edge_plot_instances.append( plot_edges (self.axes, arrang) )
+            self.node_plot_instances.append( plot_nodes (self.axes, arrang) )
         self.draw()
 
         # self.arrangement_canvas.fig.canvas.mpl_disconnect(self.cid_click)
@@ -92,12 +145,12 @@ class MyMplCanvas(FigureCanvasQTAgg):
 
     ########################################
     def highlight_face(self, arrangement, face_idx):
-        # plot edges and nodes
-        
+        ''' highlighting a face, on the overlay '''
+
         # drawing face via path-patch
         face = arrangement.decomposition.faces[ face_idx ]
         patch = mpatches.PathPatch(face.get_punched_path(),
-                                   facecolor='g', edgecolor='g', alpha=0.7)
+                                   facecolor='g', edgecolor='g', alpha=0.7, animated=True)
         # facecolor='r', edgecolor='k', alpha=0.5)
         self.face_plot_instances += [self.axes.add_patch(patch)]
 
@@ -106,84 +159,305 @@ class MyMplCanvas(FigureCanvasQTAgg):
         #                'face #'+str(face_idx),
         #                fontdict={'color':'m', 'size': 25})
 
-        self.draw()
-        
-        # self.arrangement_canvas.fig.canvas.mpl_disconnect(self.cid_click)
-        # del self.cid_click
+        self.update_overlay()
+
+    ########################################
+    def clear_face_highlights(self):
+        for patch in self.face_plot_instances:
+            patch.remove()
+        self.face_plot_instances = []
+        self.update_overlay()
 
     ################################################################################
-    def set_border(self, lst):
+    def set_border(self, traits, set_limits=False):
         '''
         in order to draw lines or rays, this class needs the border of the plot
         if the trait list is loaded before the image, this information is missing
-        hence, in such a case, the list of traits to be visualized are passed to this method
-        the "bLines" will be overwrittern if an image is loaded to gui and passed to this class
+        hence, in such a case, the table of traits to be visualized are passed to this method
+        the border will be overwrittern if an image is loaded to gui and passed to this class
         this method is called only if the traits are visualized and an image is not available
+        set_limits: if True, the limits of the axes are also set to the border
         '''
-          
-        X, Y = [], []
-        for trait in lst: 
-            if isinstance(trait, trts.SegmentModified):
-                X.append(trait.obj.p1.x)
-                X.append(trait.obj.p2.x)
-                Y.append(trait.obj.p1.y)
-                Y.append(trait.obj.p2.y)
-            elif isinstance(trait, trts.RayModified):
-                X.append(trait.obj.p1.x)
-                X.append(trait.obj.p2.x)
-                Y.append(trait.obj.p1.y)
-                Y.append(trait.obj.p2.y)
-            elif isinstance(trait, trts.LineModified):
-                X.append(trait.obj.p1.x)
-                X.append(trait.obj.p2.x)
-                Y.append(trait.obj.p1.y)
-                Y.append(trait.obj.p2.y)
-            elif isinstance(trait, trts.ArcModified):
-                xc, yc, rc = trait.obj.center.x, trait.obj.center.y, trait.obj.radius
-                X.append(xc+rc)
-                X.append(xc-rc)
-                Y.append(yc+rc)
-                Y.append(yc+rc)
-                
-            elif isinstance(trait, trts.CircleModified):
-                xc, yc, rc = trait.obj.center.x, trait.obj.center.y, trait.obj.radius
-                X.append(xc+rc)
-                X.append(xc-rc)
-                Y.append(yc+rc)
-                Y.append(yc+rc)
-
-        self.xMin, self.xMax = np.min(X), np.max(X)
-        self.yMin, self.yMax = np.min(Y), np.max(Y)
-
-        self.bLines  = [ sym.Line( (self.xMin,self.yMin),(self.xMax,self.yMin) ),
-                         sym.Line( (self.xMax,self.yMin),(self.xMax,self.yMax) ),
-                         sym.Line( (self.xMax,self.yMax),(self.xMin,self.yMax) ),
-                         sym.Line( (self.xMin,self.yMax),(self.xMin,self.yMin) ) ]
+        border = traits.bounding_box()
+        if set_limits and border != [self.xMin, self.yMin, self.xMax, self.yMax]:
+            self.axes.set_xlim([border[0], border[2]])
+            self.axes.set_ylim([border[1], border[3]])
+            self.dirty = True
+        [self.xMin, self.yMin, self.xMax, self.yMax] = border
 
 
     ################################################################################
-    def plotImage(self, image, oriented_gradients=None):
+    def plotImage(self, image, oriented_gradients=None, redraw=True):
         '''
+        redraw: if False, the canvas is not redrawn (e.g. traits will be drawn over it)
+        the image is shown through the image pyramid, see show_image
         '''
+        self.show_image(image)
 
-        self.xMin = 0
-        self.xMax = image.shape[1]
-        self.yMin = 0
-        self.yMax = image.shape[0]
-        self.bLines  = [ sym.Line( (self.xMin,self.yMin),(self.xMax,self.yMin) ),
-                         sym.Line( (self.xMax,self.yMin),(self.xMax,self.yMax) ),
-                         sym.Line( (self.xMax,self.yMax),(self.xMin,self.yMax) ),
-                         sym.Line( (self.xMin,self.yMax),(self.xMin,self.yMin) ) ]
-
-        self.axes.imshow(image, cmap = 'gray', interpolation='nearest')#, origin='lower')
-        
         if oriented_gradients!=None:
             self.plot_oriented_gradients(image, oriented_gradients)
-             
-        self.axes.set_xlim([0, np.shape(image)[1]])
-        self.axes.set_ylim([0, np.shape(image)[0]])
 
-        self.draw()
+        if redraw: self.draw()
+
+    ################################################################################
+    ################################################################# image pyramid
+    ################################################################################
+    '''
+    Big maps are not handed to imshow in full resolution. For every image a
+    pyramid is built once (each level half the size of the previous one), and
+    the image artist only holds the part of the level that is in the viewport.
+    The level is chosen so that an image pixel of the level is not smaller than
+    a pixel of the screen. On every change of the limits of the axes (zoom/pan)
+    the level and the crop are updated.
+    '''
+
+    ########################################
+    def image_pyramid(self, image, levels=None):
+        '''
+        levels of the image (see tiledImage.pyramid), memory-mapped and tiled
+        images are downsampled band by band
+        levels: if given (e.g. computed in a worker thread), they are only stored
+        pyramids are cached for the last few images (e.g. origin, binary and edge images)
+        '''
+        for (source, cached_levels) in self.pyramids:
+            if source is image: return cached_levels
+
+        if levels is None:
+            levels = tiledImage.pyramid(image)
+
+        self.pyramids = [(image, levels)] + self.pyramids[:self.max_pyramids-1]
+        return levels
+
+    ########################################
+    def connect_axes_callbacks(self):
+        ''' axes.cla() resets the callbacks of the axes, so this is called after every clear '''
+        self.axes.callbacks.connect('xlim_changed', self.on_limits_changed)
+        self.axes.callbacks.connect('ylim_changed', self.on_limits_changed)
+
+    ########################################
+    def on_limits_changed(self, axes):
+        ''' zoom/pan, the canvas is redrawn by the navigation toolbar '''
+        if self.image_artist is not None:
+            self.update_image_level()
+        for layer in self.layers.values():
+            if layer['artist'].get_visible():
+                self.cull_layer(layer)
+
+    ########################################
+    def update_image_level(self, margin=2):
+        '''
+        setting the level and the crop of the image pyramid for the current viewport
+        margin: number of extra pixels (of the level) around the viewport
+        '''
+        image, levels = self.image_source, self.image_levels
+        H, W = image.shape[:2]
+        (x1, x2), (y1, y2) = sorted(self.axes.get_xlim()), sorted(self.axes.get_ylim())
+
+        # image pixels per screen pixel
+        bbox = self.axes.bbox
+        ratio = min( (x2-x1) / max(bbox.width, 1), (y2-y1) / max(bbox.height, 1) )
+        level = int(np.floor(np.log2(ratio))) if ratio > 1 else 0
+        level = min(level, len(levels)-1)
+
+        h, w = levels[level].shape[:2]
+        fx, fy = float(W)/w, float(H)/h
+        c1 = int(np.clip(np.floor(x1/fx)-margin, 0, w-1))
+        c2 = int(np.clip(np.ceil(x2/fx)+margin, c1+1, w))
+        r1 = int(np.clip(np.floor(y1/fy)-margin, 0, h-1))
+        r2 = int(np.clip(np.ceil(y2/fy)+margin, r1+1, h))
+
+        view = (level, c1, c2, r1, r2)
+        if view == self.image_view: return
+        self.image_view = view
+
+        self.image_artist.set_data(levels[level][r1:r2, c1:c2])
+        # set_extent would otherwise autoscale the axes (and call this again)
+        self.axes.set_autoscale_on(False)
+        # same as the extent of the full resolution image, i.e. (-.5, W-.5, H-.5, -.5)
+        self.image_artist.set_extent( (c1*fx-.5, c2*fx-.5, r2*fy-.5, r1*fy-.5) )
+        self.dirty = True
+
+    ################################################################################
+    ################################################################ retained scene
+    ################################################################################
+    '''
+    Instead of clearing the axes and plotting everything again, the image and
+    the trait layers are persistent artists, that are updated (set_data,
+    set_segments), shown/hidden (set_visible) or restyled in place.
+    Every change marks the scene dirty, and refresh() draws the canvas only
+    if something has changed.
+    '''
+
+    ########################################
+    def show_image(self, image):
+        '''
+        showing the image as the base of the scene
+        if an image of the same size is already shown, only its data is replaced
+
+        only a level of the image pyramid (cropped to the viewport) is shown,
+        but the extent of the image artist is always in full resolution pixels
+        so the coordinates of traits and annotations are not affected
+        '''
+        if self.image_artist is not None and self.image_source is image:
+            return
+
+        new_size = self.image_source is None or self.image_source.shape != image.shape
+        self.image_source = image
+        self.image_levels = self.image_pyramid(image)
+        self.image_view = None
+
+        if self.image_artist is None:
+            self.image_artist = self.axes.imshow(image[:1,:1], cmap = 'gray', interpolation='nearest')
+            self.image_artist.set_zorder(0) # below the traits
+            self.render_stats['artists'] += 1
+        # gray levels of the whole image, from the smallest level if the image is not in memory
+        gray = image if type(image) is np.ndarray else self.image_levels[-1]
+        self.image_artist.set_clim(np.min(gray), np.max(gray))
+
+        if new_size:
+            self.xMin, self.xMax = 0, image.shape[1]
+            self.yMin, self.yMax = 0, image.shape[0]
+            self.axes.set_xlim([0, np.shape(image)[1]])
+            self.axes.set_ylim([0, np.shape(image)[0]])
+
+        self.update_image_level()
+        self.dirty = True
+
+    ########################################
+    def set_trait_layer(self, name, traits, kind, clr='b', line_style='-', visible=True):
+        '''
+        a retained layer of all the traits of a kind (or list of kinds) in a TraitTable
+
+        the polylines of the layer are only recomputed if the table (or its
+        version, or the border) has changed since the last call, otherwise
+        only the visibility and the style of the layer are updated
+        hidden layers are not recomputed until they are visible again
+
+        only the polylines in the viewport are handed to the artist (see cull_layer)
+        '''
+        layer = self.layers.get(name)
+
+        if not visible:
+            if layer is not None and layer['artist'].get_visible():
+                layer['artist'].set_visible(False)
+                self.dirty = True
+            return
+
+        if layer is None:
+            artist = LineCollection([], alpha=self.alpha)
+            self.axes.add_collection(artist, autolim=False)
+            layer = self.layers[name] = {'artist': artist, 'traits': None, 'key': None, 'style': None,
+                                         'polylines': [], 'boxes': np.zeros((0,4)), 'culled': None}
+            self.render_stats['artists'] += 1
+        artist = layer['artist']
+
+        key = (traits.version, self.xMin, self.yMin, self.xMax, self.yMax)
+        if layer['traits'] is not traits or layer['key'] != key:
+            polylines, rows = self.trait_polylines(traits, traits.select(kind), return_rows=True)
+            layer['polylines'], layer['boxes'] = polylines, traits.bounding_boxes()[rows]
+            layer['traits'], layer['key'], layer['culled'] = traits, key, None
+        self.cull_layer(layer) # the viewport might have changed while the layer was hidden
+
+        if layer['style'] != (clr, line_style):
+            artist.set_color(clr)
+            artist.set_linestyle(line_style)
+            layer['style'] = (clr, line_style)
+            self.dirty = True
+
+        if not artist.get_visible():
+            artist.set_visible(True)
+            self.dirty = True
+
+    ########################################
+    def cull_layer(self, layer):
+        '''
+        only the polylines of a layer whose bounding box overlaps the current
+        limits of the axes are kept in its artist, so the cost of a redraw
+        depends on what is on the screen, not on the size of the trait list
+        '''
+        (x1, x2), (y1, y2) = sorted(self.axes.get_xlim()), sorted(self.axes.get_ylim())
+        boxes = layer['boxes']
+        inside = np.flatnonzero( (boxes[:,0] <= x2) & (boxes[:,2] >= x1) &
+                                 (boxes[:,1] <= y2) & (boxes[:,3] >= y1) )
+
+        if layer['culled'] is not None and np.array_equal(layer['culled'], inside):
+            return
+        layer['culled'] = inside
+        layer['artist'].set_segments( [layer['polylines'][i] for i in inside] )
+        self.dirty = True
+
+    ########################################
+    def refresh(self):
+        ''' drawing the canvas, only if the scene has changed since the last refresh '''
+        if self.dirty:
+            self.dirty = False
+            self.draw()
+
+    ################################################################################
+    ####################################################################### overlay
+    ################################################################################
+    '''
+    Annotation points, highlights of selected traits and faces, and the preview
+    of the trait under construction are animated artists: they are excluded
+    from the normal draw, and blitted over a copy of the rendered canvas
+    (cached after every full draw), so updating them does not render the map
+    and the traits again.
+    '''
+
+    ########################################
+    def on_draw_event(self, event):
+        ''' after every full draw, the background is cached and the overlay is drawn over it '''
+        self.overlay_background = self.copy_from_bbox(self.fig.bbox)
+        self.draw_overlay_artists()
+
+    ########################################
+    def draw_overlay_artists(self):
+        for artist in list(self.overlay.values()) + self.face_plot_instances:
+            if artist.get_visible():
+                self.axes.draw_artist(artist)
+
+    ########################################
+    def update_overlay(self):
+        ''' blitting the overlay over the cached background (full draw if there is none) '''
+        if self.overlay_background is None:
+            self.draw()
+            return
+        self.restore_region(self.overlay_background)
+        self.draw_overlay_artists()
+        self.blit(self.fig.bbox)
+
+    ########################################
+    def _overlay_line(self, name, style, **kwargs):
+        ''' the Line2D of the overlay with the given name, created on the first call '''
+        if name not in self.overlay:
+            self.overlay[name], = self.axes.plot([], [], style, animated=True, **kwargs)
+            self.render_stats['artists'] += 1
+        return self.overlay[name]
+
+    ########################################
+    def set_points(self, points, marker='r.'):
+        ''' annotation points (n x [x,y]) on the overlay '''
+        pts = np.array(points, dtype=float).reshape(-1,2)
+        self._overlay_line('points', marker).set_data(pts[:,0], pts[:,1])
+        self.update_overlay()
+
+    ########################################
+    def set_preview(self, polyline, clr='r', line_style=':'):
+        ''' the preview (rubber band) of the trait under construction, n x [x,y] '''
+        pts = np.array(polyline, dtype=float).reshape(-1,2)
+        self._overlay_line('preview', clr+line_style).set_data(pts[:,0], pts[:,1])
+        self.update_overlay()
+
+    ########################################
+    def set_highlight(self, traits, indices, clr='r'):
+        ''' highlighting the rows "indices" of a TraitTable on the overlay '''
+        if 'highlight' not in self.overlay:
+            self.overlay['highlight'] = LineCollection([], linewidths=2, animated=True)
+            self.axes.add_collection(self.overlay['highlight'], autolim=False)
+            self.render_stats['artists'] += 1
+        self.overlay['highlight'].set_segments( self.trait_polylines(traits, indices) )
+        self.overlay['highlight'].set_color(clr)
+        self.update_overlay()
 
     ################################################################################
     def plot_oriented_gradients(self, image, vecfield):
@@ -210,141 +484,88 @@ class MyMplCanvas(FigureCanvasQTAgg):
         
 
     ################################################################################
-    def plot_points(self, points, idx=None, symbolID=1):
-        ''' '''
-        pts = np.array(points)
-        self.axes.plot(pts[:,0],pts[:,1] , 'r.') 
-        self.draw()
+    def clip_to_border(self, points, ray=False):
+        '''
+        clipping lines (or rays) to the border of the plot, all at once
+        points: n x [x1,y1,x2,y2], two points on each line (rays start from [x1,y1],
+        and only their end point is clipped)
+        returns (clipped, valid), see utilities.ClipToBox
+        '''
+        box = [self.xMin, self.yMin, self.xMax, self.yMax]
+        clipped, valid = utilities.ClipToBox(points, box, tMin=0 if ray else -np.inf)
+        if ray:
+            # rays are drawn from their starting point, even if it is outside of the border
+            clipped[valid,:2] = np.atleast_2d(points)[valid,:2]
+        return clipped, valid
 
     ################################################################################
-    def draw_trait_line(self, trait, clr='b', line_style='-'): 
-
-        # find the ending points on the bLines
-        ips = []
-        
-        for bl in self.bLines:
-            ips.extend( sym.intersection(trait.obj, bl) )
-
-        for i in range(len(ips)-1,-1,-1):
-            if not isinstance(ips[i], sym.Point):
-                ips.pop(i)
-            elif not ( (self.xMin <= ips[i].x <= self.xMax) and (self.yMin <= ips[i].y <= self.yMax) ):
-                ips.pop(i)
-                
-        # plot the Line
-        x = [np.float(ip.x.evalf()) for ip in ips]
-        y = [np.float(ip.y.evalf()) for ip in ips]
-        line = self.axes.plot (x, y, color=clr, linestyle=line_style, alpha=self.alpha)
-        # self.axes.plot([trait.obj.p1.x, trait.obj.p2.x], [trait.obj.p1.y, trait.obj.p2.y], 'r')
-        self.draw()
-        return line
-
-    ########################################
-    def draw_trait_ray(self, trait, clr='b', line_style='-'):
-
-        # find the ending point on one of the bLines
-        ips = []
-        for bl in self.bLines:
-            ips.extend( sym.intersection(trait.obj, bl) )
-
-        for i in range(len(ips)-1,-1,-1):
-            if not isinstance(ips[i], sym.Point):
-                ips.pop(i)
-            elif not ( (self.xMin <= ips[i].x <= self.xMax) and (self.yMin <= ips[i].y <= self.yMax) ):
-                ips.pop(i)
-
-        # plot the ray
-        x = np.float(trait.obj.p1.x.evalf())
-        y = np.float(trait.obj.p1.y.evalf())
-        dx = np.float(ips[0].x.evalf()) - np.float(trait.obj.p1.x.evalf())
-        dy = np.float(ips[0].y.evalf()) - np.float(trait.obj.p1.y.evalf())
-        ray = self.axes.arrow( np.float(x),np.float(y),
-                               np.float(dx),np.float(dy), # shape='right',
-                               # linewidth = 1, head_width = 0.1, head_length = 0.2,
-                               linestyle=line_style,
-                               fc=clr, ec=clr, alpha=self.alpha)
-        # self.axes.plot([trait.obj.p1.x, trait.obj.p2.x], [trait.obj.p1.y, trait.obj.p2.y], 'g')
-        self.draw()
-        return ray
-
-    ########################################
-    def draw_trait_segment(self, trait, clr='b', line_style='-'):
-        segment = self.axes.plot([trait.obj.p1.x, trait.obj.p2.x],
-                                 [trait.obj.p1.y, trait.obj.p2.y],
-                                 color=clr, linestyle=line_style, alpha=self.alpha)
-
-        self.draw()
-        return segment
-
-    ########################################
-    def draw_trait_circle(self, trait, clr='b', line_style='-'):
-        tStep = 90#360
-        theta = np.linspace(0, 2*np.pi, tStep, endpoint=True)
-        xc,yc,rc = trait.obj.center.x, trait.obj.center.y, trait.obj.radius
-        x = xc + rc * np.cos(theta)
-        y = yc + rc * np.sin(theta)
-        circle = self.axes.plot (x, y, color=clr, linestyle=line_style, alpha=self.alpha)
-        self.draw()
-        return circle
-
-    ########################################
-    def draw_trait_arc(self, trait, clr='b', line_style='-'):
-        t1,t2 = trait.t1 , trait.t2
-        tStep = max( [np.float(np.abs(t2-t1)*(180/np.pi)) ,2])
-        theta = np.linspace(np.float(t1), np.float(t2), tStep, endpoint=True)
-        xc, yc, rc = trait.obj.center.x , trait.obj.center.y , trait.obj.radius
-        x = xc + rc * np.cos(theta)
-        y = yc + rc * np.sin(theta)
-        arc = self.axes.plot (x, y, color=clr, linestyle=line_style, alpha=self.alpha)
-        self.draw()
-        return arc
+    def trait_polylines(self, traits, indices, return_rows=False):
+        '''
+        the rows "indices" of a TraitTable as polylines (list of k x 2 arrays),
+        circles with 90 samples, arcs with one per degree, lines and rays are
+        clipped to the border
+        traits that are not visible (lines outside of the border) are skipped
+        return_rows: if True, the rows of the polylines are also returned
+        '''
+        indices = np.asarray(indices, dtype=int)
+        kind = traits.kind[indices]
+        polylines, rows = [], []
+
+        # segments
+        rows.append( indices[kind==traitTable.SEGMENT] )
+        polylines.extend( traits.points[rows[-1]].reshape(-1,2,2) )
+
+        # lines and rays, clipped at once
+        for k in [traitTable.LINE, traitTable.RAY]:
+            clipped, valid = self.clip_to_border(traits.points[indices[kind==k]],
+                                                 ray=(k==traitTable.RAY))
+            rows.append( indices[kind==k][valid] )
+            polylines.extend( clipped[valid].reshape(-1,2,2) )
+
+        # circles
+        rows.append( indices[kind==traitTable.CIRCLE] )
+        theta = np.linspace(0, 2*np.pi, 90, endpoint=True)
+        X = traits.center[rows[-1],0:1] + traits.radius[rows[-1],np.newaxis] * np.cos(theta)
+        Y = traits.center[rows[-1],1:2] + traits.radius[rows[-1],np.newaxis] * np.sin(theta)
+        polylines.extend( np.stack([X,Y], axis=2) )
+
+        # arcs (different number of samples)
+        rows.append( indices[kind==traitTable.ARC] )
+        for idx in rows[-1]:
+            t1, t2 = traits.theta[idx]
+            theta = np.linspace(t1, t2, int(max([np.abs(t2-t1)*(180/np.pi), 2])), endpoint=True)
+            (xc,yc), rc = traits.center[idx], traits.radius[idx]
+            polylines.append( np.stack([xc + rc*np.cos(theta), yc + rc*np.sin(theta)], axis=1) )
+
+        if return_rows:
+            return polylines, np.concatenate(rows)
+        return polylines
 
     ################################################################################
-    def plot_dominant_orientation_detection(self, X, Y, GMMx, GMMy, bincenter, l, peakind):
-        ''' '''
-        histCol = 'b'
-        gmmCol = 'r'
-        roiCol, roiAlpha = 'k',0.7
-
-        xMin, xMax = X[0], X[-1]
-        yMin, yMax = np.min([np.min(Y),np.min(GMMy)]) , np.max([np.max(Y),np.max(GMMy)])
-
-        arrowHeadLength = 5#350
-        arrowHeadWidth = (yMax-yMin)/30.
-
-        # left side
-        self.axes.plot(X[:l], Y[:l], histCol+'-.', alpha=self.alpha)
-        self.axes.plot(GMMx[:l], GMMy[:l], gmmCol+'-.', alpha=self.alpha)
-        # centeral
-        self.axes.plot(X[l:-l], Y[l:-l], histCol, label='Original Histogram')
-        self.axes.plot(GMMx[l:-l], GMMy[l:-l], gmmCol , label='GMM')
-        # right side
-        self.axes.plot(X[-l:], Y[-l:], histCol+'-.', alpha=self.alpha)
-        self.axes.plot(GMMx[-l:], GMMy[-l:], gmmCol+'-.', alpha=self.alpha)
-        # resulting peaks from CWT over MMG
-        self.axes.plot(bincenter[peakind],GMMy[peakind], 'r^', label='Dominant Orientations')
-        
-        # region of interest
-        self.axes.plot([X[l],X[l]]   , [yMin, yMax], roiCol+'-', alpha=roiAlpha, linewidth=2)
-        self.axes.plot([X[-l],X[-l]] , [yMin, yMax], roiCol+'-', alpha=roiAlpha, linewidth=2)
-        self.axes.arrow(X[int(3.5*l)], np.mean([yMin, yMax]),
-                        X[int(1.5*l)]-X[0]-arrowHeadLength, 0,
-                        head_width=arrowHeadWidth, head_length=arrowHeadLength,
-                        alpha=roiAlpha, fc=roiCol,ec=roiCol)
-        self.axes.arrow(X[int(-3.5*l)], np.mean([yMin, yMax]),
-                        -(X[int(1.5*l)]-X[0]-arrowHeadLength), 0,
-                        head_width=arrowHeadWidth, head_length=arrowHeadLength,
-                        alpha=roiAlpha, fc=roiCol,ec=roiCol)
-
-        # axes configuration
-        self.axes.set_xlim([xMin, xMax])
-        self.axes.set_ylim([yMin, yMax])
-        # self.axes.spines['left'].set_visible(False)
-        # self.axes.spines['right'].set_visible(False)
-        # self.axes.spines['top'].set_visible(False)
-        self.axes.set_xticks([X[l],X[3*l],X[-l]])
-
-        self.axes.set_xticklabels(['$-\pi$/2', '0' ,'$\pi$/2'])
-        self.axes.yaxis.set_ticks([])
+    def plot_dominant_orientation_detection(self, sinograms, orientations, peaks):
+        '''
+        the sinograms of the radiography (one curve per orientation), and their peaks
+        (the detected lines) as markers
+
+        if the same sinograms are plotted again (e.g. with peaks of another
+        peak detection setting), only the markers are updated
+        '''
+        rho = np.arange(len(sinograms)) - len(sinograms)//2 # distance to the center of the image
+
+        if self.sinogram_plot is None or self.sinogram_plot['sinograms'] is not sinograms:
+            self.clear_axes(redraw=False)
+            self.axes.set_aspect('auto')
+            curves = self.axes.plot(rho, sinograms, alpha=self.alpha)
+            for curve, orientation in zip(curves, orientations):
+                curve.set_label('{:.2f} deg'.format(orientation*180/np.pi))
+            markers = [ self.axes.plot([], [], 'v', color=curve.get_color())[0] for curve in curves ]
+            self.axes.legend(loc='upper right')
+            self.axes.set_xlim([rho[0], rho[-1]])
+            self.axes.set_ylim([0, 1.05*np.max(sinograms)])
+            self.sinogram_plot = {'sinograms': sinograms, 'markers': markers}
+
+        for marker, sinogram, peakind in zip(self.sinogram_plot['markers'], sinograms.T, peaks):
+            peakind = np.asarray(peakind, dtype=int)
+            marker.set_data(rho[peakind], sinogram[peakind])
 
         self.draw()
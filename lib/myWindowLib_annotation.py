@@ -19,23 +19,22 @@ License along with this program. If not, see
 from __future__ import print_function
 
 import sys, os, platform, time
-import cv2
-import yaml
 import PySide
 
 import numpy as np
-import sympy as sym
-from numpy.linalg import det
-import skimage.transform # for radon
 
 # arrangement repo
-import arrangement.geometricTraits as trts
 import arrangement.utils as arr_utils
 
 # this repo
 import myCanvasLib
 import annotation_gui
-import utilities
+import annotationLib
+import tiledImage
+import productCache
+import workers
+import traitTable
+from traitTable import TraitTable
 
 #####################################################################
 #####################################################################
@@ -51,20 +50,32 @@ class MainWindow(PySide.QtGui.QMainWindow, annotation_gui.Ui_MainWindow):
 
         # todo: store everything non-relevant to the gui in this dictionary
         self.annotation = []
-        self.trait_buffer = []
-        self.trait_list = []
+        self.trait_buffer = TraitTable()
+        self.trait_list = TraitTable()
 
         # image processing informations - these are mutable from GUI 
         self.img_prc = {'canny setting': [50,150,3],
                         'binary thresholding': [120, 255],
-                        'sinogram peak detection': [10,15,.5]}
+                        'sinogram peak detection': [10,15,.5],
+                        'orientation refinement': [2., .5], # [window (degree), time budget (sec)] or None
+                        'radiography segments': None, # [max_gap, min_length] (pixel) or None (infinite lines)
+                        'circle detection': [5, 100, .3], # [min radius, max radius (pixel), min coverage]
+                        'trait reduction': [.5, 1.], # [angle (degree), distance (pixel)] tolerances or None
+                        'disk cache': False} # if True, derived products are also saved next to the map
+
+        # derived products of the map (binary, edges, gradients, sinograms, ...), see image_cache
+        self.product_cache = productCache.ProductCache(max_bytes=512*2**20)
 
         
         self.data = {'image_name': '',
+                     'map_key': None, # identity of the map file, for the product cache
+                     'map_info': None, # resolution and origin of map_server maps
                      'image': None,
                      'edges': None,
                      'binary': None,
                      'dominant_orientation': [],
+                     'refined_orientation': None, # (source, orientations) of the last refinement
+                     'sinograms': None, # (sinograms, orientations) of the last radiography
                      'traits': [] }
 
         #####################################################################
@@ -77,6 +88,7 @@ class MainWindow(PySide.QtGui.QMainWindow, annotation_gui.Ui_MainWindow):
         layout = PySide.QtGui.QVBoxLayout(traits_visualization_widget)
         layout.addWidget(self.traits_visualization_canvas)
         self.traits_visualization_canvas.mpl_connect('button_press_event', self.mouseClick_annotation)
+        self.traits_visualization_canvas.mpl_connect('motion_notify_event', self.mouseMove_annotation)
 
         #####################################################################
         #####################################################################
@@ -127,9 +139,16 @@ class MainWindow(PySide.QtGui.QMainWindow, annotation_gui.Ui_MainWindow):
 
         ### radiography:
         self.ui.pushButton_auto_detect_lines_radiography.clicked.connect(self.find_lines_with_radiography)
+        self.ui.textEdit_sinogram_peak_detection_setting.textChanged.connect(self.update_sinogram_peaks)
+        self.sinogram_canvas = None # a separate window, see show_sinograms
+
+        ### long steps (loading, detection) run in worker threads, with progress
+        # and a cancel button in the status bar (see workers.WorkerManager)
+        self.workers = workers.WorkerManager(self.statusBar())
 
         ### circle detection:
-        # self.ui.pushButton_auto_detect_circles.clicked.connect(self.detect_circles_auto)
+        self.ui.pushButton_auto_detect_circles.setEnabled(True)
+        self.ui.pushButton_auto_detect_circles.clicked.connect(self.detect_circles_auto)
 
 
     #########################################################################
@@ -143,14 +162,35 @@ class MainWindow(PySide.QtGui.QMainWindow, annotation_gui.Ui_MainWindow):
 
     def load_image(self):
 
-        # opening a dialog to load image address and loading image (grayscale)
+        # opening a dialog to load image address, the image is loaded in a worker thread
         image_name = PySide.QtGui.QFileDialog.getOpenFileName()[0]
-        image = np.flipud( cv2.imread( image_name, cv2.IMREAD_GRAYSCALE) )
+        if len(image_name) == 0: return
+        self.workers.start('loading the map', self.load_image_worker, self.set_image, image_name)
+
+    ########################################
+    def load_image_worker(self, image_name, progress=None):
+        ''' loading image (grayscale) and its pyramid for the canvas, in a worker thread '''
+        progress(0, 'reading '+image_name)
+        image = annotationLib.load_image(image_name)
+        if image is None: return None
+        progress(.5, 'image pyramid')
+        return image_name, image, tiledImage.pyramid(image)
+
+    ########################################
+    def set_image(self, result):
+        ''' the result of load_image_worker, in the gui thread '''
+        if result is None: return
+        image_name, image, levels = result
+        self.traits_visualization_canvas.image_pyramid(image, levels)
 
         self.data['image'] = image
         self.data['image_name'] = image_name
-        
-        # computing binary and edge image
+        self.data['map_info'] = annotationLib.map_info(image_name)
+        self.data['map_key'] = productCache.map_key(image_name)
+        self.data['refined_orientation'], self.data['sinograms'] = None, None
+        tiledImage.report_memory('loading the map')
+
+        # binary and edge image, computed tile by tile when accessed
         self.update_binary_image()
         self.update_edge_image()
                     
@@ -159,35 +199,63 @@ class MainWindow(PySide.QtGui.QMainWindow, annotation_gui.Ui_MainWindow):
         # this is because the former contains the latter.
         # it is useful if the trait list / buffer is filled before the image is loaded
         self.plot_traits_visualization_canvas()
+        tiledImage.report_memory('showing the map')
 
         self.ui.groupBox_manual_trait_detection.setEnabled(True)
         self.ui.groupBox_auto_trait_detection.setEnabled(True)
 
 
+    ########################################
+    def image_cache(self, *source):
+        '''
+        the product cache of the map, or of an image derived from it,
+        e.g. image_cache('binary', thresholding, inverted)
+        '''
+        directory = None
+        if self.img_prc['disk cache']:
+            directory = productCache.cache_dir(self.data['image_name'])
+        self.product_cache.use_disk = self.img_prc['disk cache']
+        return self.product_cache.bind(self.data['map_key'], *source, directory=directory)
+
+    ########################################
+    def binary_source(self):
+        ''' name and setting of the binary image, identifying it in the product cache '''
+        inverted = self.ui.checkBox_radiography_thresholding_inverted.isChecked()
+        return ('binary', self.img_prc['binary thresholding'], inverted)
+
+    def edge_source(self):
+        ''' name and setting of the edge image, identifying it in the product cache '''
+        return ('edges', self.img_prc['canny setting'])
+
     ########################################
     def update_binary_image(self):
-        [thr1, thr2] = self.img_prc['binary thresholding']
-        if self.ui.checkBox_radiography_thresholding_inverted.isChecked():
-            ret, self.data['binary'] = cv2.threshold(self.data['image'] , thr1,thr2 , cv2.THRESH_BINARY_INV)
-        else:
-            ret, self.data['binary'] = cv2.threshold(self.data['image'] , thr1,thr2 , cv2.THRESH_BINARY)
+        ''' the binary image for the current setting, computed tile by tile, and cached '''
+        name, thresholding, inverted = self.binary_source()
+        binary = lambda tile: annotationLib.binary_image(tile, thresholding, inverted)
+        self.data['binary'] = self.image_cache().get(name, [thresholding, inverted],
+                                                     lambda: tiledImage.TiledImage(self.data['image'], binary))
 
     ########################################
     def update_edge_image(self):
-        [thr1, thr2, apt_size] = self.img_prc['canny setting']
-        self.data['edges'] = cv2.Canny(self.data['image'], thr1, thr2, apt_size)
-        
+        ''' the edge image for the current setting, computed tile by tile, and cached '''
+        name, canny_setting = self.edge_source()
+        edges = lambda tile: annotationLib.edge_image(tile, canny_setting)
+        # the halo covers the aperture of the sobel in Canny
+        self.data['edges'] = self.image_cache().get(name, [canny_setting],
+                                                    lambda: tiledImage.TiledImage(self.data['image'],
+                                                                                  edges, halo=16))
 
     ########################################
     def plot_traits_visualization_canvas(self):
         '''
         this is like the starting point for visualization
+        the canvas keeps the image, trait layers and annotation points as a
+        retained scene, only the changed parts are updated, and the canvas is
+        drawn once, only if something has changed (see MyMplCanvas.refresh)
         '''
 
-        self.traits_visualization_canvas.clear_axes()
+        self.traits_visualization_canvas.reset_render_stats()
 
-        lst = self.trait_list + self.trait_buffer
-        
         # plot the map as the base
         if self.data['image'] is not None:
             if self.ui.radioButton_radiography_source_origin.isChecked():
@@ -196,43 +264,59 @@ class MainWindow(PySide.QtGui.QMainWindow, annotation_gui.Ui_MainWindow):
                 image = self.data['binary']    
             elif self.ui.radioButton_radiography_source_edge.isChecked():
                 image = self.data['edges']
-            self.traits_visualization_canvas.plotImage(image)
-        elif len(lst)>0:
+            self.traits_visualization_canvas.show_image(image)
+        elif len(self.trait_list)+len(self.trait_buffer)>0:
             # note that regardless of target list to be visualized,
             # border lines of the "traits_visualization_canvas" are initialized
             # with all available traits, in both buffer and main list
-            self.traits_visualization_canvas.set_border(lst)
+            self.traits_visualization_canvas.set_border(self.trait_list + self.trait_buffer,
+                                                        set_limits=True)
+
+        # trait layers of the specified lists
+        mode = self.ui.comboBox_draw_list_vs_buffer.currentText()
+        self.draw_a_list_of_traits('list', self.trait_list, clr='b', line_style='-',
+                                   visible = mode in ['draw all (buffer and list)', 'draw trait list'])
+        self.draw_a_list_of_traits('buffer', self.trait_buffer, clr='r', line_style='--',
+                                   visible = mode in ['draw all (buffer and list)', 'draw trait buffer'])
 
-        # draw specified lists
-        if self.ui.comboBox_draw_list_vs_buffer.currentText() == 'draw all (buffer and list)':
-            self.draw_a_list_of_traits(self.trait_list, clr='b', line_style='-')
-            self.draw_a_list_of_traits(self.trait_buffer, clr='r', line_style='--')
-        elif self.ui.comboBox_draw_list_vs_buffer.currentText() == 'draw trait list':
-            self.draw_a_list_of_traits(self.trait_list, clr='b', line_style='-')
-        elif self.ui.comboBox_draw_list_vs_buffer.currentText() == 'draw trait buffer':
-            self.draw_a_list_of_traits(self.trait_buffer, clr='r', line_style='--')
+        self.traits_visualization_canvas.refresh()
+
+        # annotation points and the preview of the trait under construction (on the overlay)
+        self.traits_visualization_canvas.set_points(self.annotation)
+        if len(self.annotation) == 0:
+            self.traits_visualization_canvas.set_preview([])
 
     ########################################
-    def draw_a_list_of_traits(self, lst, clr, line_style):
+    def draw_a_list_of_traits(self, name, traits, clr, line_style, visible=True):
+        '''
+        updating the layers of a trait list (one per trait type) on the canvas
+        only the layers whose traits or visibility have changed are touched
+        '''
 
-        for trait in lst: 
-            if isinstance(trait, trts.SegmentModified) and self.ui.checkBox_visualize_segments.isChecked():
-                self.traits_visualization_canvas.draw_trait_segment(trait, clr, line_style)
-            elif isinstance(trait, trts.RayModified) and self.ui.checkBox_visualize_rays.isChecked():
-                self.traits_visualization_canvas.draw_trait_ray(trait, clr, line_style)
-            elif isinstance(trait, trts.LineModified) and self.ui.checkBox_visualize_lines.isChecked():
-                self.traits_visualization_canvas.draw_trait_line(trait, clr, line_style)
-            elif isinstance(trait, trts.ArcModified) and self.ui.checkBox_visualize_arcs.isChecked():
-                self.traits_visualization_canvas.draw_trait_arc(trait, clr, line_style)
-            elif isinstance(trait, trts.CircleModified) and self.ui.checkBox_visualize_circles.isChecked():
-                self.traits_visualization_canvas.draw_trait_circle(trait, clr, line_style)
+        checkBoxes = [ (traitTable.SEGMENT, self.ui.checkBox_visualize_segments),
+                       (traitTable.RAY, self.ui.checkBox_visualize_rays),
+                       (traitTable.LINE, self.ui.checkBox_visualize_lines),
+                       (traitTable.ARC, self.ui.checkBox_visualize_arcs),
+                       (traitTable.CIRCLE, self.ui.checkBox_visualize_circles) ]
+
+        for (kind, checkBox) in checkBoxes:
+            self.traits_visualization_canvas.set_trait_layer(name+' '+traitTable.type_keys[kind],
+                                                             traits, kind, clr, line_style,
+                                                             visible = visible and checkBox.isChecked())
 
 
     ########################################
     ##### trait buffer and list manipulation
     ########################################
     def add_trait_buffer_to_trait_list(self):
-        self.trait_list.extend(self.trait_buffer)
+        # traits already in the list are not added, and near-duplicates are merged
+        n_traits = len(self.trait_list) + len(self.trait_buffer)
+        self.trait_list.extend(self.trait_buffer, unique=True)
+        if self.img_prc['trait reduction'] is not None:
+            [angle, distance] = self.img_prc['trait reduction']
+            self.trait_list, _ = self.trait_list.reduced(angle*np.pi/180, distance)
+        print ('\t '+traitTable.reduction_report(n_traits, len(self.trait_list)))
+
         self.update_trait_list_listWidget()
         self.reset_trait_buffer() # includes: self.plot_traits_visualization_canvas()
 
@@ -243,89 +327,28 @@ class MainWindow(PySide.QtGui.QMainWindow, annotation_gui.Ui_MainWindow):
 
         if idx!=-1:# and len(self.trait_list)>0:
             # only if an item is selected and the list is not empty
-            self.trait_list.pop(idx)
+            self.trait_list.delete([idx])
             self.update_trait_list_listWidget()
             self.plot_traits_visualization_canvas()
 
     ########################################
     def highlight_selected_list_item(self):
-
-        if len(self.trait_list)>0:
-            idx = self.ui.listWidget_traits_list.currentIndex().row()
-            trait = self.trait_list[idx]
+        ''' the selected trait is highlighted on the overlay of the canvas (no redraw) '''
+        idx = self.ui.listWidget_traits_list.currentIndex().row()
+        if 0 <= idx < len(self.trait_list):
+            self.traits_visualization_canvas.set_highlight(self.trait_list, [idx], clr='r')
         else:
-            trait = None
-        # todo: sometimes I get this error from the line above, not sure when exactly!
-        # IndexError: list index out of range
-        # add print (idx, len(self.trait_list)) to see what is going on
-
-        if isinstance(trait, trts.SegmentModified):
-            trait_plot = self.traits_visualization_canvas.draw_trait_segment(trait, clr = 'r')
-
-        elif isinstance(trait, trts.RayModified):
-            trait_plot = self.traits_visualization_canvas.draw_trait_ray(trait, clr = 'r')
-
-        elif isinstance(trait, trts.LineModified):
-            trait_plot = self.traits_visualization_canvas.draw_trait_line(trait, clr = 'r')
-            
-        elif isinstance(trait, trts.ArcModified):
-            trait_plot = self.traits_visualization_canvas.draw_trait_arc(trait, clr = 'r')
-            
-        elif isinstance(trait, trts.CircleModified):
-            trait_plot = self.traits_visualization_canvas.draw_trait_circle(trait, clr = 'r')
-
-        # oops!
-        # I don't know why it works better like this!
-        # things get worse when I try to sleep(), remove() and draw() 
-        # in this form, it just keeps it until next item is selected
-        # time.sleep(.5)
-        if 'trait_plot' in locals():
-            trait_plot[0].remove()
-        # self.traits_visualization_canvas.draw()
-        
+            self.traits_visualization_canvas.set_highlight(self.trait_list, [], clr='r')
 
     ########################################
     def update_trait_list_listWidget(self):
         
         self.ui.listWidget_traits_list.clear()
 
-        for trait in self.trait_list:
-            if isinstance(trait, trts.SegmentModified):
-                p1  = '(' + '{:.2f}'.format( float(trait.obj.p1.x) )
-                p1 += ',' + '{:.2f}'.format( float(trait.obj.p1.y) ) + ')'
-                p2  = '(' + '{:.2f}'.format( float(trait.obj.p2.x) )
-                p2 += ',' + '{:.2f}'.format( float(trait.obj.p2.y) ) + ')'
-                string = 'S: p1'+p1+', p2'+p2
-
-            elif isinstance(trait, trts.RayModified):
-                p1  = '(' + '{:.2f}'.format( float(trait.obj.p1.x) )
-                p1 += ',' + '{:.2f}'.format( float(trait.obj.p1.y) ) + ')'
-                p2  = '(' + '{:.2f}'.format( float(trait.obj.p2.x) )
-                p2 += ',' + '{:.2f}'.format( float(trait.obj.p2.y) ) + ')'
-                string = 'R: p1'+p1+', p2'+p2
-
-            elif isinstance(trait, trts.LineModified):
-                p1  = '(' + '{:.2f}'.format( float(trait.obj.p1.x) )
-                p1 += ',' + '{:.2f}'.format( float(trait.obj.p1.y) ) + ')'
-                p2  = '(' + '{:.2f}'.format( float(trait.obj.p2.x) )
-                p2 += ',' + '{:.2f}'.format( float(trait.obj.p2.y) ) + ')'
-                string = 'L: p1'+p1+', p2'+p2
-
-            elif isinstance(trait, trts.ArcModified):
-                c  = '(' + '{:.2f}'.format( float(trait.obj.center.x) )
-                c += ',' + '{:.2f}'.format( float(trait.obj.center.y) ) + ')'
-                r = '{:.2f}'.format( float(trait.obj.radius) )
-                t = '(' + '{:.2f}'.format( float(trait.t1) ) + ',' + '{:.2f}'.format( float(trait.t2) ) + ')'
-                string = 'A: c:'+c+', r:'+r + ', t:'+t
-
-            elif isinstance(trait, trts.CircleModified):
-                c  = '(' + '{:.2f}'.format( float(trait.obj.center.x) )
-                c += ',' + '{:.2f}'.format( float(trait.obj.center.y) ) + ')'
-                r = '{:.2f}'.format( float(trait.obj.radius) )
-                string = 'C: c'+c+', r'+r
+        for trait_idx in range(len(self.trait_list)):
+            string = self.trait_list.describe(trait_idx)
 
             idx = self.ui.listWidget_traits_list.count()
-            print (idx, string)
             self.ui.listWidget_traits_list.insertItem(idx, string)
 
     ########################################
@@ -335,12 +358,12 @@ class MainWindow(PySide.QtGui.QMainWindow, annotation_gui.Ui_MainWindow):
 
     ########################################
     def reset_trait_buffer(self):
-        self.trait_buffer = []
+        self.trait_buffer = TraitTable()
         self.plot_traits_visualization_canvas()
 
     ########################################
     def reset_trait_list(self):
-        self.trait_list = []
+        self.trait_list = TraitTable()
         self.update_trait_list_listWidget()
         self.plot_traits_visualization_canvas()
 
@@ -349,47 +372,14 @@ class MainWindow(PySide.QtGui.QMainWindow, annotation_gui.Ui_MainWindow):
     ########################################
 
     def find_dominant_orientations(self):
-        '''  '''
-
-        # flipud: why? I'm sure it won't work otherwise, but dont know why
-        # It should happen in both "find_dominant_orientations" & "find_grid_lines"
-        image = np.flipud(self.data['image'])
+        ''' computing orientations in a worker thread, see set_dominant_orientations '''
+        self.workers.start('dominant orientations',
+                           annotationLib.find_dominant_orientations, self.set_dominant_orientations,
+                           self.data['image'], cache=self.image_cache('origin'))
 
-        ### computing orientations
-        if image is None:
-            orientations = np.array([])
-
-        else:
-            ### smoothing
-            image = cv2.blur(image, (9,9))
-            image = cv2.GaussianBlur(image, (9,9),0)
-
-            ### oriented gradient of the image
-            # is it (dx - 1j*dy) or (dx + 1j*dy)
-            # this is related to "flipud" problem mentioned above
-            dx = cv2.Sobel(image, cv2.CV_64F, 1,0, ksize=9)
-            dy = cv2.Sobel(image, cv2.CV_64F, 0,1, ksize=9)
-            grd = dx - 1j*dy
-            
-            ### weighted histogram of oriented gradients (over the whole image)
-            hist, binc = utilities.wHOG (grd, NumBin=180*5, Extension=False)
-            hist = utilities.smooth(hist, window_len=21)
-
-
-            ### finding peaks in the histogram
-            orthogonal_orientations = True
-            if orthogonal_orientations:
-                print ('\t *** WARNING: currently auto-orientation detection assumes perpendicularity...')
-                # if dominant orientations are orthogonal, find only one and add pi/2 to it
-                peak_idx = np.argmax(hist)
-                orientations = [binc[peak_idx], binc[peak_idx]+np.pi/2]
-  
-            # shrinking the range to [-pi/2, pi/2]
-            for idx in range(len(orientations)):
-                if orientations[idx]< -np.pi/2:
-                    orientations[idx] += np.pi
-                elif np.pi/2 <= orientations[idx]:
-                    orientations[idx] -= np.pi
+    ########################################
+    def set_dominant_orientations(self, orientations):
+        ''' the result of find_dominant_orientations, in the gui thread '''
 
         ### setting orientations into places
         self.data['dominant_orientation'] = np.array(orientations)
@@ -440,90 +430,181 @@ class MainWindow(PySide.QtGui.QMainWindow, annotation_gui.Ui_MainWindow):
 
     ########################################
     def find_lines_with_radiography(self):
-        ''''''
+        '''
+        the setting is read here, the radiography runs in a worker thread
+        (see radiography_worker) and its result is set by set_radiography_result
+        '''
 
         ### get the appropriate input image
+        # derived images are cached by their setting, so they are only
+        # recomputed if the setting has changed since they were last used
         if self.ui.radioButton_radiography_source_origin.isChecked():
             # using original image
+            source = ('origin',)
             image = self.data['image']
 
         elif self.ui.radioButton_radiography_source_binary.isChecked():
             # thresholding to binary
             string = self.ui.textEdit_binary_thresholding.toPlainText()
-            [thr1, thr2] = [float(param) for param in string.split(',')]
-            if [thr1, thr2] != self.img_prc['binary thresholding']:
-                self.img_prc['binary thresholding'] = [thr1, thr2]
-                self.update_binary_image()
+            self.img_prc['binary thresholding'] = [float(param) for param in string.split(',')]
+            self.update_binary_image()
+            source = self.binary_source()
             image = self.data['binary']
     
         elif self.ui.radioButton_radiography_source_edge.isChecked():
             # using edge image
             string = self.ui.textEdit_canny_setting.toPlainText()
-            [thr1, thr2, apt_size] = [float(param) for param in string.split(',')]
-            if [thr1, thr2, apt_size] != self.img_prc['canny setting']:
-                self.update_edge_image()
+            self.img_prc['canny setting'] = [float(param) for param in string.split(',')]
+            self.update_edge_image()
+            source = self.edge_source()
             image = self.data['edges']
 
-        if len(self.data['dominant_orientation'])>0:
-
-            ### fetching setting for sinogram peak detection
-            string = self.ui.textEdit_sinogram_peak_detection_setting.toPlainText()
-            [refWin, minDist, minVal] = [float(param) for param in string.split(',')]
-
-            ### radiography
-            # flipud: why? I'm sure it won't work otherwise, but dont know why
-            # It should happen in both "find_dominant_orientations" & "find_grid_lines"
-            image = np.flipud(image)
-            imgcenter = (image.shape[1]/2, # cols == x
-                         image.shape[0]/2) # rows == y
-
-            orientations = self.data['dominant_orientation']
-            sinog_angles = orientations - np.pi/2 # in radian
-            sinograms = skimage.transform.radon(image, theta=sinog_angles*180/np.pi )#, circle=True)
-            sinogram_center = len(sinograms.T[0])/2
-
-
-            # ########## debug-mode
-            # row, col = 1,1
-            # fig, axes = plt.subplots(row, col, figsize=(20,12))
-            # for singo in sinograms.T:
-            #     axes.plot(singo)
-            # fig.show()
-            # ########## 
-
-            lines = []
-            for (orientation, sinog_angle, sinogram) in zip(orientations, sinog_angles, sinograms.T):
-                # Find peaks in sinogram:
-                peakind = utilities.FindPeaks(sinogram ,
-                                        CWT=False, cwt_range=(1,8,1),
-                                        Refine_win = int(refWin),
-                                        MinPeakDist = int(minDist),
-                                        MinPeakVal = minVal,
-                                        Polar=False)
-
-                # line's distance to the center of the image
-                dist = np.array(peakind) - sinogram_center
-                
-                pts_0 = [ ( imgcenter[0] + d*np.cos(sinog_angle),
-                            imgcenter[1] + d*np.sin(sinog_angle) )
-                          for d in dist]
-                
-                pts_1 = [ ( point[0] + np.cos(orientation) ,
-                            point[1] + np.sin(orientation) )
-                          for point in pts_0]
-                
-                lines += [trts.LineModified( args=( sym.Point(p0[0],p0[1]), sym.Point(p1[0],p1[1]) ) )
-                          for (p0,p1) in zip(pts_0,pts_1)]
-
-            self.trait_buffer = lines
-            # self.trait_buffer += lines
-            self.plot_traits_visualization_canvas()
-            print ('\t found {:d} lines'.format(len(lines)))
-        else:
+        if len(self.data['dominant_orientation']) == 0:
             print ('\t WARNING: no dominant orientation is available, so... goodluck')
-        
-        
-        
+            return
+
+        ### fetching setting for sinogram peak detection
+        string = self.ui.textEdit_sinogram_peak_detection_setting.toPlainText()
+        peak_detection = [float(param) for param in string.split(',')]
+
+        ### refining orientations (anytime, within the time budget)
+        # orientations that are already refined (on the same source) are not refined
+        # again, so that only peak detection runs when only its setting has changed
+        refined = self.data['refined_orientation']
+        already_refined = ( refined is not None and refined[0] == source and
+                            np.array_equal(refined[1], self.data['dominant_orientation']) )
+        refinement = None if already_refined else self.img_prc['orientation refinement']
+
+        self.workers.start('radiography', self.radiography_worker, self.set_radiography_result,
+                           source, image, self.image_cache(*source),
+                           self.data['dominant_orientation'], peak_detection,
+                           refinement, self.img_prc['radiography segments'])
+
+    ########################################
+    def radiography_worker(self, source, image, cache, orientations, peak_detection,
+                           refinement, segments, progress=None):
+        '''
+        orientation refinement and radiography, in a worker thread
+        everything is passed as argument, nothing of the window is touched here
+        '''
+        # radiography needs the whole image (all the tiles are computed)
+        progress(0, 'preparing the radiography source')
+        if source[0] != 'origin':
+            image = cache.get('array', [], lambda: np.asarray(image))
+        tiledImage.report_memory('preparing the radiography source')
+
+        refined = None
+        if refinement is not None:
+            [window, budget] = refinement
+            orientations = refined = annotationLib.refine_orientations(image, orientations,
+                                                                       window=window*np.pi/180,
+                                                                       time_budget=budget,
+                                                                       cache=cache,
+                                                                       progress=workers.sub_progress(progress, .1, .4))
+
+        ### radiography
+        step = workers.sub_progress(progress, .4, 1.)
+        if segments is None:
+            lines = annotationLib.find_lines_with_radiography(image, orientations, peak_detection,
+                                                              cache=cache, progress=step)
+        else:
+            # occupied runs of the lines, instead of infinite lines
+            [max_gap, min_length] = segments
+            lines = annotationLib.find_segments_with_radiography(image, orientations, peak_detection,
+                                                                 max_gap=max_gap,
+                                                                 min_length=min_length,
+                                                                 cache=cache, progress=step)
+
+        # sinograms are already in the cache
+        sinograms = annotationLib.sinograms(image, orientations, cache=cache)
+        return source, orientations, refined, lines, sinograms, peak_detection
+
+    ########################################
+    def set_radiography_result(self, result):
+        ''' the result of radiography_worker, in the gui thread '''
+        source, orientations, refined, lines, sinograms, peak_detection = result
+
+        self.data['dominant_orientation'] = orientations
+        if refined is not None:
+            self.data['refined_orientation'] = (source, refined)
+            string = ['{:.2f}'.format(a*180/np.pi) for a in self.data['dominant_orientation']]
+            self.ui.textEdit_dominant_orientations.setText(', '.join(string))
+
+        self.trait_buffer = lines
+        # self.trait_buffer += lines
+        self.plot_traits_visualization_canvas()
+        print ('\t found {:d} lines'.format(len(lines)))
+
+        self.data['sinograms'] = (sinograms, orientations)
+        self.show_sinograms(peak_detection)
+
+    ########################################
+    def show_sinograms(self, peak_detection):
+        ''' the sinograms of the last radiography and their peaks, in a separate window '''
+        if self.data['sinograms'] is None: return
+        if self.sinogram_canvas is None:
+            self.sinogram_canvas = myCanvasLib.MyMplCanvas()
+            self.sinogram_canvas.setWindowTitle('sinograms')
+
+        sinograms, orientations = self.data['sinograms']
+        peaks = annotationLib.sinogram_peaks(sinograms, peak_detection)
+        self.sinogram_canvas.plot_dominant_orientation_detection(sinograms, orientations, peaks)
+        self.sinogram_canvas.show()
+
+    ########################################
+    def update_sinogram_peaks(self):
+        '''
+        live update of the peaks on the sinogram window, while the peak detection
+        setting is edited (only if the window is open and the setting is complete)
+        '''
+        if self.sinogram_canvas is None or not self.sinogram_canvas.isVisible():
+            return
+        string = self.ui.textEdit_sinogram_peak_detection_setting.toPlainText()
+        try:
+            peak_detection = [float(param) for param in string.split(',')]
+        except ValueError:
+            return
+        if len(peak_detection) == 3:
+            self.show_sinograms(peak_detection)
+
+    ########################################
+    def detect_circles_auto(self):
+        '''
+        the setting is read here, the circles are detected in a worker thread
+        (see detect_circles_worker) and set by set_detected_circles
+        '''
+        if self.data['edges'] is None:
+            print ('\t WARNING: no edge image is available, load a map first')
+            return
+
+        self.workers.start('circle detection', self.detect_circles_worker, self.set_detected_circles,
+                           self.data['edges'], self.image_cache(*self.edge_source()),
+                           self.data['image'], self.img_prc['circle detection'])
+
+    ########################################
+    def detect_circles_worker(self, edges, cache, image, setting, progress=None):
+        '''
+        circle detection, in a worker thread
+        everything is passed as argument, nothing of the window is touched here
+        '''
+        # circle detection needs the whole edge image (all the tiles are computed)
+        progress(0, 'preparing the edge image')
+        edges = cache.get('array', [], lambda: np.asarray(edges))
+
+        [r_min, r_max, min_coverage] = setting
+        return annotationLib.find_circles(edges,
+                                          radius_range=[r_min, r_max],
+                                          min_coverage=min_coverage,
+                                          gradient_image=image,
+                                          progress=workers.sub_progress(progress, .2, 1.))
+
+    ########################################
+    def set_detected_circles(self, circles):
+        ''' the result of detect_circles_worker, in the gui thread '''
+        self.trait_buffer = circles
+        self.plot_traits_visualization_canvas()
+        print ('\t found {:d} circles and arcs'.format(len(circles)))
+
     ########################################
     ################# manual trait detection
     ########################################
@@ -535,13 +616,59 @@ class MainWindow(PySide.QtGui.QMainWindow, annotation_gui.Ui_MainWindow):
         if event.button == 1:
             self.annotation.append([event.xdata, event.ydata])
 
-            # drawing temp points
-            self.traits_visualization_canvas.plot_points([[event.xdata, event.ydata]])
+            # drawing temp points (on the overlay)
+            self.traits_visualization_canvas.set_points(self.annotation)
         
         elif event.button == 3:
             # print ( 'I could wrap up everything here, right?' )
             self.construct_trait_from_annotation()
 
+    ########################################
+    def mouseMove_annotation(self, event):
+        '''
+        the preview (rubber band) of the trait under construction, from the
+        annotation points and the mouse position, drawn on the overlay
+        '''
+        if len(self.annotation) == 0 or event.inaxes is None:
+            return
+
+        pts = self.annotation + [[event.xdata, event.ydata]]
+        p0, p1 = pts[-2], pts[-1]
+        preview = []
+
+        if self.ui.radioButton_man_annotate_segment.isChecked():
+            preview = [p0, p1]
+
+        elif self.ui.radioButton_man_annotate_line.isChecked() or self.ui.radioButton_man_annotate_ray.isChecked():
+            ray = self.ui.radioButton_man_annotate_ray.isChecked()
+            clipped, valid = self.traits_visualization_canvas.clip_to_border([p0+p1], ray=ray)
+            if valid[0]: preview = clipped.reshape(2,2)
+
+        elif self.ui.radioButton_man_annotate_circle.isChecked():
+            if len(pts) == 2:
+                # 1st is the center and 2nd is on the perimeter
+                xc, yc, rc = p0[0], p0[1], np.sqrt( (p0[0]-p1[0])**2 + (p0[1]-p1[1])**2 )
+            else:
+                xc, yc, rc = annotationLib.circle_from_three_points(*pts[-3:])
+            theta = np.linspace(0, 2*np.pi, 90, endpoint=True)
+            preview = np.stack([xc + rc*np.cos(theta), yc + rc*np.sin(theta)], axis=1)
+
+        elif self.ui.radioButton_man_annotate_arc.isChecked():
+            if len(pts) == 2:
+                preview = [p0, p1]
+            else:
+                # start, on the perimeter and end (CCW), same as construct_trait_from_annotation
+                [x1,y1], [x3,y3] = pts[0], pts[2]
+                xc, yc, rc = annotationLib.circle_from_three_points(*pts[:3])
+                t1,t2 = np.arctan2(y1-yc, x1-xc), np.arctan2(y3-yc, x3-xc)
+                if t1 > t2: t2 += 2*np.pi
+                theta = np.linspace(t1, t2, 90, endpoint=True)
+                preview = np.stack([xc + rc*np.cos(theta), yc + rc*np.sin(theta)], axis=1)
+
+        if not np.all(np.isfinite(preview)):
+            preview = [] # collinear points
+        self.traits_visualization_canvas.set_preview(preview)
+
     ########################################
     def construct_trait_from_annotation(self):
         ''' '''
@@ -557,11 +684,7 @@ class MainWindow(PySide.QtGui.QMainWindow, annotation_gui.Ui_MainWindow):
                     p1 = [p0[0]+np.cos(self.data['dominant_orientation'][0]),
                           p0[1]+np.sin(self.data['dominant_orientation'][0])]
                     # print (p0,self.data['dominant_orientation'][0],p1 )
-                    l_trait = trts.LineModified( args=(sym.Point(p0[0],p0[1]), 
-                                                       sym.Point(p1[0],p1[1])) )
-
-                    self.trait_buffer.append(l_trait)
-                    self.traits_visualization_canvas.draw_trait_line(l_trait,'r','--') 
+                    self.trait_buffer.add_lines([p0+p1])
                     self.reset_trait_annotation()
                    
             # print ('\t WARNING: not enough point for the selected trait class')
@@ -571,23 +694,17 @@ class MainWindow(PySide.QtGui.QMainWindow, annotation_gui.Ui_MainWindow):
         if self.ui.radioButton_man_annotate_line.isChecked():
             # considering only the last two elements of the annotation list
             p0, p1 = self.annotation[-2] , self.annotation[-1]
-            l_trait = trts.LineModified( args=(sym.Point(p0[0],p0[1]), sym.Point(p1[0],p1[1])) )
-            self.trait_buffer.append(l_trait)
-            self.traits_visualization_canvas.draw_trait_line(l_trait)
+            self.trait_buffer.add_lines([p0+p1])
             
         elif self.ui.radioButton_man_annotate_segment.isChecked():
             # considering only the last two elements of the annotation list
             p0, p1 = self.annotation[-2] , self.annotation[-1]
-            s_trait = trts.SegmentModified( args=(sym.Point(p0[0],p0[1]), sym.Point(p1[0],p1[1])) )
-            self.trait_buffer.append(s_trait)
-            self.traits_visualization_canvas.draw_trait_segment(s_trait)
+            self.trait_buffer.add_segments([p0+p1])
 
         elif self.ui.radioButton_man_annotate_ray.isChecked():
             # considering only the last two elements of the annotation list
             p0, p1 = self.annotation[-2] , self.annotation[-1]
-            r_trait = trts.RayModified( args=(sym.Point(p0[0],p0[1]), sym.Point(p1[0],p1[1])) )
-            self.trait_buffer.append(r_trait)
-            self.traits_visualization_canvas.draw_trait_ray(r_trait)
+            self.trait_buffer.add_rays([p0+p1])
 
         elif self.ui.radioButton_man_annotate_circle.isChecked():
 
@@ -597,19 +714,9 @@ class MainWindow(PySide.QtGui.QMainWindow, annotation_gui.Ui_MainWindow):
                 rc = np.sqrt( (xc-x1)**2 + (yc-y1)**2 )
             elif len(self.annotation) > 2:
                 # if 3 points are given, they are all considered on the perimeter
-                # http://mathworld.wolfram.com/Circle.html
-                [x1,y1], [x2,y2], [x3,y3] = self.annotation[-3] , self.annotation[-2], self.annotation[-1]
-                a = np.array([ [x1,y1,1], [x2,y2,1], [x3,y3,1] ])
-                d = np.array([ [x1**2+y1**2,y1,1], [x2**2+y2**2,y2,1], [x3**2+y3**2,y3,1] ])
-                e = np.array([ [x1**2+y1**2,x1,1], [x2**2+y2**2,x2,1], [x3**2+y3**2,x3,1] ])
-                f = np.array([ [x1**2+y1**2,x1,y1], [x2**2+y2**2,x2,y2], [x3**2+y3**2,x3,y3] ])
-                a,d,e,f = det(a), -det(d), det(e), -det(f)
-                xc, yc = -d/(2*a) , -e/(2*a)
-                rc = np.sqrt( ((d**2 + e**2)/ (4*(a**2))) - (f/a))
+                xc, yc, rc = annotationLib.circle_from_three_points(*self.annotation[-3:])
             
-            c_trait = trts.CircleModified( args=(sym.Point(xc,yc), rc) )
-            self.trait_buffer.append(c_trait)
-            self.traits_visualization_canvas.draw_trait_circle(c_trait)
+            self.trait_buffer.add_circles([[xc,yc]], [rc])
 
         elif self.ui.radioButton_man_annotate_arc.isChecked():
 
@@ -617,13 +724,7 @@ class MainWindow(PySide.QtGui.QMainWindow, annotation_gui.Ui_MainWindow):
                 print ('\t WARNING: need at least and only 3 points to estimate an arc')
             else:
                 [x1,y1], [x2,y2], [x3,y3] = self.annotation[0] , self.annotation[1], self.annotation[2]
-                a = np.array([ [x1,y1,1], [x2,y2,1], [x3,y3,1] ])
-                d = np.array([ [x1**2+y1**2,y1,1], [x2**2+y2**2,y2,1], [x3**2+y3**2,y3,1] ])
-                e = np.array([ [x1**2+y1**2,x1,1], [x2**2+y2**2,x2,1], [x3**2+y3**2,x3,1] ])
-                f = np.array([ [x1**2+y1**2,x1,y1], [x2**2+y2**2,x2,y2], [x3**2+y3**2,x3,y3] ])
-                a,d,e,f = det(a), -det(d), det(e), -det(f)
-                xc, yc = -d/(2*a) , -e/(2*a)
-                rc = np.sqrt( ((d**2 + e**2)/ (4*(a**2))) - (f/a))
+                xc, yc, rc = annotationLib.circle_from_three_points([x1,y1], [x2,y2], [x3,y3])
 
                 # screw_up : t1,t2 \in [-pi,pi] 
                 # in CCW order, the 1st pt is start, 2nd pt is on the perimeter and 3rd pt is the end
@@ -634,9 +735,7 @@ class MainWindow(PySide.QtGui.QMainWindow, annotation_gui.Ui_MainWindow):
                 if t1 > t2:
                     t2 += 2*np.pi # or t1 -= 2*np.pi ?
 
-                a_trait = trts.ArcModified( args=(sym.Point(xc,yc), rc, (t1,t2)) )
-                self.trait_buffer.append(a_trait)
-                self.traits_visualization_canvas.draw_trait_circle(a_trait)
+                self.trait_buffer.add_arcs([[xc,yc]], [rc], [[t1,t2]])
 
 
         self.reset_trait_annotation()
@@ -665,92 +764,40 @@ class MainWindow(PySide.QtGui.QMainWindow, annotation_gui.Ui_MainWindow):
             print ( '\t WARNING: only yaml and svg files are supported' )
             return None
             
+        self.workers.start('loading traits', self.load_traits_worker, self.set_loaded_traits, file_name)
+
+    ########################################
+    def load_traits_worker(self, file_name, progress=None):
+        ''' reading traits (and converting svg), in a worker thread '''
         # convert svg to yaml and load the yaml file
-        if file_ext in ['svg', 'SVG']:
+        if file_name.split('.')[-1] in ['svg', 'SVG']:
+            progress(0, 'converting svg to yaml')
             file_name = arr_utils.svg_to_ymal(file_name, convert_segment_2_infinite_line=False)
             print ( '\t NOTE: svg file converted to yaml, and the yaml file will be loaded' )
 
+        progress(.5, 'reading '+file_name)
+        return annotationLib.load_traits_from_file(file_name)
 
-
-        print ('todo: arrangement has a yaml loader, use that instead?')
-        stream = open(file_name, 'r')
-        data = yaml.load(stream)
-
-        traits = []
-        if 'lines' in data.keys():
-            for l in data['lines']:
-                if len(l) == 4: #[x1,y1,x2,y2]
-                    traits += [ trts.LineModified( args=( sym.Point(l[0],l[1]), sym.Point(l[2],l[3]) ) ) ]
-                elif len(l) == 3: #[x1,y1,slope]
-                    traits += [ trts.LineModified( args=( sym.Point(l[0],l[1]), l[2]) ) ]
-
-        if 'segments' in data.keys():
-            for s in data['segments']:
-                traits += [ trts.SegmentModified( args=( sym.Point(s[0],s[1]), sym.Point(s[2],s[3]))) ]
-
-        if 'rays' in data.keys():
-            for r in data['rays']:
-                traits += [ trts.RayModified( args=( sym.Point(r[0],r[1]), sym.Point(r[2],r[3]))) ]
-
-        if 'circles' in data.keys():
-            for c in data['circles']:
-                traits += [ trts.CircleModified( args=( sym.Point(c[0],c[1]), c[2]) ) ]
-
-        if 'arcs' in data.keys():
-            for a in data['arcs']:
-                traits += [ trts.ArcModified( args=( sym.Point(a[0],a[1]), a[2], (a[3],a[4])) ) ]
+    ########################################
+    def set_loaded_traits(self, traits):
+        ''' the result of load_traits_worker, in the gui thread '''
 
         # copying loaded data into self.trait_list
         if self.ui.radioButton_load_traits_overwrite.isChecked():
             self.trait_list = traits
         else:
-            self.trait_list.extend(traits)
+            self.trait_list.extend(traits, unique=True)
 
         # updating trait list listWidget
         self.update_trait_list_listWidget()
 
         # updating the canvas
-        self.traits_visualization_canvas.clear_axes()
         self.plot_traits_visualization_canvas()
 
 
     ########################################
     def save_traits_to_file(self):
 
-        # converting traits to a dictionary
-        data = {'segments':[], 'rays':[], 'lines':[], 'arcs':[], 'circles':[] }
-        for trait in self.trait_list:        
-            if isinstance(trait, trts.SegmentModified):
-                s = [trait.obj.p1.x, trait.obj.p1.y, trait.obj.p2.x, trait.obj.p2.y]
-                s = [np.float(i.evalf()) for i in s]
-                data['segments'].append(s)
-                
-            elif isinstance(trait, trts.RayModified):
-                r = [trait.obj.p1.x, trait.obj.p1.y, trait.obj.p2.x, trait.obj.p2.y]
-                r = [np.float(i.evalf()) for i in r]
-                data['rays'].append(r)
-                
-            elif isinstance(trait, trts.LineModified):
-                l = [trait.obj.p1.x, trait.obj.p1.y, trait.obj.p2.x, trait.obj.p2.y]
-                l = [np.float(i.evalf()) for i in l]
-                data['lines'].append(l)
-                
-            elif isinstance(trait, trts.ArcModified):
-                a = [trait.obj.center.x, trait.obj.center.y, trait.obj.radius, sym.Float(trait.t1), sym.Float(trait.t2)]
-                a = [np.float(i.evalf()) for i in a]
-                data['arcs'].append(a)
-                
-            elif isinstance(trait, trts.CircleModified):
-                c = [trait.obj.center.x, trait.obj.center.y, trait.obj.radius]
-                c = [np.float(i.evalf()) for i in c]
-                data['circles'].append(c)
-            
-        ### removing keys with empty fields from the dictionary
-        for key in data.keys():
-            if len(data[key])==0:
-                data.pop(key)
-
-
         ### adding the boundary information
         ### will be used for bounding the arrangement of infinit line        
         # the min-mix of x/y are already computed in the canvas class
@@ -761,7 +808,7 @@ class MainWindow(PySide.QtGui.QMainWindow, annotation_gui.Ui_MainWindow):
         yMin = self.traits_visualization_canvas.yMin -margin
         yMax = self.traits_visualization_canvas.yMax +margin
 
-        data['boundary'] = [xMin, yMin, xMax, yMax]
+        boundary = [xMin, yMin, xMax, yMax]
 
 
         ### the radiography could happen with different orientations
@@ -771,17 +818,27 @@ class MainWindow(PySide.QtGui.QMainWindow, annotation_gui.Ui_MainWindow):
         # data['orientations'] = self.data['dominant_orientation']
 
 
+        ### traits of a map_server map could be saved in metric coordinates
+        map_info = self.data['map_info']
+        if map_info is not None:
+            answer = PySide.QtGui.QMessageBox.question(self, 'Save File',
+                                                       'Save traits in metric coordinates of the map?',
+                                                       PySide.QtGui.QMessageBox.Yes | PySide.QtGui.QMessageBox.No)
+            if answer != PySide.QtGui.QMessageBox.Yes: map_info = None
+
         ### saving to file
         if self.data['image_name'] is not '':
             name_suggestion = self.data['image_name'].split('.')[0]+'.yaml'
+            if self.data['map_info'] is not None:
+                # not to overwrite the yaml file of the map
+                name_suggestion = self.data['image_name'].split('.')[0]+'_traits.yaml'
             trait_file_name = PySide.QtGui.QFileDialog.getSaveFileName(None, 'Save File',
                                                                        name_suggestion)[0]
         else:
             trait_file_name = PySide.QtGui.QFileDialog.getSaveFileName()[0]
 
         if trait_file_name is not u'':
-            with open(trait_file_name, 'w') as yaml_file:
-                yaml.dump(data, yaml_file)
+            annotationLib.save_traits_to_file(trait_file_name, self.trait_list, boundary, map_info)
         else:
             print ('\t WARNING: file was NOT saved, saving was aborted...')
 
@@ -17,6 +17,7 @@ License along with this program. If not, see
 '''
 
 import sys, os, platform, time
+import multiprocessing
 
 import cv2
 import yaml
@@ -28,10 +29,17 @@ from numpy.linalg import det
 # this repo
 import myCanvasLib
 import arrangement_gui
+import traitTable
+import tiledImage
+import workers
+import arrangementGroups
+import faceLabelMap
+from traitTable import TraitTable
 
 # arrangement repo
 import arrangement.arrangement as arr
 import arrangement.geometricTraits as trts
+import arrangement.utils as arr_utils
 # import arrangement.plotting as aplt
 
 #####################################################################
@@ -47,12 +55,17 @@ class MainWindow(PySide.QtGui.QMainWindow, arrangement_gui.Ui_MainWindow):
         self.ui.setupUi(self)
 
         self.annotation = []
-        self.trait_list = []
+        self.trait_list = TraitTable()
         self.selected_faces = []
+        self.face_labels = None # raster of the faces, for picking, see faceLabelMap
         self.data = {'image_name':'',
                      'image':None,
                      'arrangement': None,
-                     'arrang_config': {'multi_processing':4, 'end_point':False}}
+                     'boundary': None, # [xMin, yMin, xMax, yMax], from the trait file
+                     'clip_to_boundary': True, # lines and rays to segments, inside the boundary
+                     'trait_reduction': None, # [angle (degree), distance] tolerances, e.g. [.5, 1.]
+                     'arrang_config': {'multi_processing':multiprocessing.cpu_count(),
+                                       'end_point':False}}
 
         #####################################################################
         ############################## connecting graphicsViews to mpl canvas
@@ -65,6 +78,10 @@ class MainWindow(PySide.QtGui.QMainWindow, arrangement_gui.Ui_MainWindow):
         layout.addWidget(self.arrangement_canvas)
         self.arrangement_canvas.mpl_connect('button_press_event', self.mouseClick_face_selection)
 
+        ### the arrangement is constructed in a separate process, with progress
+        # and a cancel button in the status bar (see workers.run_in_process)
+        self.workers = workers.WorkerManager(self.statusBar())
+
         #####################################################################
         #####################################################################
         #####################################################################
@@ -101,7 +118,8 @@ class MainWindow(PySide.QtGui.QMainWindow, arrangement_gui.Ui_MainWindow):
         if len(image_name) > 3:
 
             # loading image: grayscale
-            image = np.flipud( cv2.imread( image_name, cv2.IMREAD_GRAYSCALE) )
+            image = tiledImage.load_map( image_name )
+            if image is None: return
             
             # plotting the image
             self.arrangement_canvas.plotImage( image )
@@ -124,44 +142,34 @@ class MainWindow(PySide.QtGui.QMainWindow, arrangement_gui.Ui_MainWindow):
             print ( '\t WARNING: only yaml and svg files are supported' )
             return None
             
+        self.workers.start('loading traits', self.load_traits_worker, self.set_loaded_traits, file_name)
+
+    ########################################
+    def load_traits_worker(self, file_name, progress=None):
+        ''' reading traits and boundary (and converting svg), in a worker thread '''
         # convert svg to yaml and load the yaml file
-        if file_ext in ['svg', 'SVG']:
-            file_name = mSGVp.svg_to_ymal(file_name, convert_segment_2_infinite_line=False)
+        if file_name.split('.')[-1] in ['svg', 'SVG']:
+            progress(0, 'converting svg to yaml')
+            file_name = arr_utils.svg_to_ymal(file_name, convert_segment_2_infinite_line=False)
             print ( '\t NOTE: svg file converted to yaml, and the yaml file will be loaded' )
-        
-        stream = open(file_name, 'r')
-        data = yaml.load(stream)
-
-        traits = []
-        
-        if 'lines' in data.keys():
-            for l in data['lines']:
-                if len(l) == 4: #[x1,y1,x2,y2]
-                    traits += [ trts.LineModified( args=( sym.Point(l[0],l[1]), sym.Point(l[2],l[3]) ) ) ]
-                elif len(l) == 3: #[x1,y1,slope]
-                    traits += [ trts.LineModified( args=( sym.Point(l[0],l[1]), l[2]) ) ]
-
-        if 'segments' in data.keys():
-            for s in data['segments']:
-                traits += [ trts.SegmentModified( args=( sym.Point(s[0],s[1]), sym.Point(s[2],s[3]))) ]
 
-        if 'rays' in data.keys():
-            for r in data['rays']:
-                traits += [ trts.RayModified( args=( sym.Point(r[0],r[1]), sym.Point(r[2],r[3]))) ]
+        progress(.5, 'reading '+file_name)
+        with open(file_name, 'r') as stream:
+            data = yaml.safe_load(stream)
+        return TraitTable.from_dict(data), data.get('boundary')
 
-        if 'circles' in data.keys():
-            for c in data['circles']:
-                traits += [ trts.CircleModified( args=( sym.Point(c[0],c[1]), c[2]) ) ]
-
-        if 'arcs' in data.keys():
-            for a in data['arcs']:
-                traits += [ trts.ArcModified( args=( sym.Point(a[0],a[1]), a[2], (a[3],a[4])) ) ]
+    ########################################
+    def set_loaded_traits(self, result):
+        ''' the result of load_traits_worker, in the gui thread '''
+        traits, boundary = result
+        if boundary is not None:
+            self.data['boundary'] = boundary
 
         # copying loaded data into self.trait_list
         if self.ui.radioButton_load_traits_overwrite.isChecked():
             self.trait_list = traits
         else:
-            self.trait_list.extend(traits)
+            self.trait_list.extend(traits, unique=True)
 
         # updating the canvas with traits
         self.plot_traits()
@@ -170,46 +178,102 @@ class MainWindow(PySide.QtGui.QMainWindow, arrangement_gui.Ui_MainWindow):
     ########################################
     def plot_traits(self):
         
-        if self.ui.checkBox_visualize_traits.isChecked():
-            for trait in self.trait_list:
-                if isinstance(trait, trts.SegmentModified):
-                    self.arrangement_canvas.draw_trait_segment(trait)
-                elif isinstance(trait, trts.RayModified):
-                    self.arrangement_canvas.draw_trait_ray(trait)
-                elif isinstance(trait, trts.LineModified):
-                    self.arrangement_canvas.draw_trait_line(trait)
-                elif isinstance(trait, trts.ArcModified):
-                    self.arrangement_canvas.draw_trait_arc(trait)
-                elif isinstance(trait, trts.CircleModified):
-                    self.arrangement_canvas.draw_trait_circle(trait)
-        else:
-            pass
-            # for trait_plot in self.arrangement_canvas.trait_plots:
-            #     trait_plot.remove()
+        # all the traits in one retained layer, hidden if not visualized
+        if self.arrangement_canvas.image_source is None and len(self.trait_list)>0:
+            self.arrangement_canvas.set_border(self.trait_list, set_limits=True)
+
+        all_kinds = [traitTable.SEGMENT, traitTable.RAY, traitTable.LINE, traitTable.ARC, traitTable.CIRCLE]
+        self.arrangement_canvas.set_trait_layer('traits', self.trait_list, all_kinds,
+                                                visible=self.ui.checkBox_visualize_traits.isChecked())
+        self.arrangement_canvas.refresh()
             
 
     ########################################
     def construct_arrangement (self):
 
         if len(self.trait_list) >0:            
-            arrang = arr.Arrangement(self.trait_list, self.data['arrang_config'])
-
-            self.data['arrangement'] = arrang
-            self.data['trait'] = self.trait_list
-
-            self.set_textEdit_arrangment_attribute_count()
-            self.arrangement_canvas.plot_arrangement(self.data['arrangement'])
+            # a copy, the trait list could change while the arrangement is constructed
+            traits = self.trait_list.copy()
+            trait_list = traits
+
+            # lines and rays are clipped to the boundary (and the boundary is
+            # added, after the reduction), so there are no unbounded faces nor
+            # intersections out of the map
+            clip = self.data['clip_to_boundary'] and self.data['boundary'] is not None
+            if clip:
+                trait_list = trait_list.clipped(self.data['boundary'], border=False)
+            elif self.data['clip_to_boundary'] and len(trait_list.select([traitTable.RAY, traitTable.LINE])) > 0:
+                print ('\t WARNING: no boundary in the trait file, lines and rays are not clipped')
+
+            # near-duplicate traits are merged (see TraitTable.reduced), each of
+            # them would multiply the intersections to resolve
+            if self.data['trait_reduction'] is not None:
+                n_traits = len(trait_list)
+                [angle, distance] = self.data['trait_reduction']
+                trait_list, _ = trait_list.reduced(angle*np.pi/180, distance)
+                print ('\t '+traitTable.reduction_report(n_traits, len(trait_list)))
+
+            # the border segments (the frame) are the last rows, they are not
+            # grouped with the traits, see arrangementGroups.trait_groups
+            frame = None
+            if clip:
+                n_traits = len(trait_list)
+                trait_list = trait_list.clipped(self.data['boundary'])
+                frame = np.arange(n_traits, len(trait_list))
+
+            # groups of traits that do not overlap are constructed in parallel
+            tic = time.time()
+            self.workers.start('arrangement', workers.run_in_process,
+                               lambda arrang: self.set_arrangement(arrang, traits, len(trait_list), tic),
+                               arrangementGroups.build_arrangement,
+                               trait_list, self.data['arrang_config'], self.data['boundary'], frame)
 
         else:
             print 'trait list is empty'
 
+    ########################################
+    def set_arrangement(self, arrang, traits, n_traits, tic):
+        '''
+        the result of build_arrangement, in the gui thread
+        traits: the trait list (as shown) the arrangement is constructed from,
+        n_traits: the number of traits after the clipping and the reduction
+        '''
+        print ('\t arrangement of {:d} traits constructed in {:.1f} sec'.format(n_traits, time.time()-tic))
+        self.data['arrangement'] = arrang
+        self.data['trait'] = traits
+
+        # faces of the previous arrangement are not valid anymore
+        self.reset_face_selection()
+        self.rasterize_faces()
+        self.set_textEdit_arrangment_attribute_count()
+        self.arrangement_canvas.plot_arrangement(self.data['arrangement'])
+
+    ########################################
+    def rasterize_faces(self):
+        '''
+        the raster of face labels is computed in a worker thread, faces are
+        picked exactly (decomposition.find_face) until it is set, and are
+        not merged (see merge_selected_faces)
+        '''
+        self.face_labels = None
+        self.workers.start('face labels', faceLabelMap.FaceLabelMap, self.set_face_labels,
+                           self.data['arrangement'])
+
+    ########################################
+    def set_face_labels(self, face_labels):
+        ''' the result of rasterize_faces, in the gui thread '''
+        if face_labels.arrangement is self.data['arrangement']:
+            self.face_labels = face_labels
+
     ########################################
     def set_textEdit_arrangment_attribute_count(self):
+        # the arrangement might be a group of arrangements, see arrangementGroups
+        arrangs = arrangementGroups.arrangements_of(self.data['arrangement'])
         n_faces = str(len(self.data['arrangement'].decomposition.faces))
-        n_nodes = str(len(self.data['arrangement'].graph.nodes()))
+        n_nodes = str(sum([len(a.graph.nodes()) for a in arrangs]))
         # len(arrang.graph.edges()) is the number of half-edges
-        n_edges = str( len(self.data['arrangement'].graph.edges())/2 )
-        n_subgraphs = str(len(self.data['arrangement']._subDecompositions))
+        n_edges = str( sum([len(a.graph.edges()) for a in arrangs])/2 )
+        n_subgraphs = str(sum([len(a._subDecompositions) for a in arrangs]))
         self.ui.textEdit_arrangement_num_faces.setText( n_faces )
         self.ui.textEdit_arrangement_num_nodes.setText( n_nodes )
         self.ui.textEdit_arrangement_num_edges.setText( n_edges )
@@ -228,9 +292,13 @@ class MainWindow(PySide.QtGui.QMainWindow, arrangement_gui.Ui_MainWindow):
 
         if event.button == 1:
 
-            if self.data['arrangement'] != None:
-                point = sym.Point(event.xdata, event.ydata)
-                face_idx = self.data['arrangement'].decomposition.find_face(point)
+            if self.data['arrangement'] != None and event.xdata is not None:
+                # an array index in the raster of face labels (exact on the border of faces)
+                if self.face_labels is not None:
+                    face_idx = self.face_labels.find_face(event.xdata, event.ydata)
+                else:
+                    point = sym.Point(event.xdata, event.ydata)
+                    face_idx = self.data['arrangement'].decomposition.find_face(point)
 
                 if face_idx != None:                    
                     self.selected_faces.append(face_idx)
@@ -245,8 +313,20 @@ class MainWindow(PySide.QtGui.QMainWindow, arrangement_gui.Ui_MainWindow):
 
     ######################################## 
     def merge_selected_faces (self):
+        # the faces of the arrangement are being rasterized in a worker
+        # thread, they are not changed until it is done (see set_face_labels)
+        if self.workers.running('face labels'):
+            print ('\t WARNING: faces are being rasterized, merge them when it is done')
+            return
+
         self.data['arrangement'].merge_faces(self.selected_faces)
 
+        # only the pixels of the merged faces are rasterized again
+        if self.face_labels is not None:
+            self.face_labels.update()
+        else:
+            self.rasterize_faces()
+
         self.reset_face_selection()
         self.set_textEdit_arrangment_attribute_count()
 
@@ -265,9 +345,7 @@ class MainWindow(PySide.QtGui.QMainWindow, arrangement_gui.Ui_MainWindow):
         self.set_textEdit_face_selection_list()
 
         # because faces are highlighted
-        for f in self.arrangement_canvas.face_plot_instances:
-            f.remove()
-        self.arrangement_canvas.draw()
+        self.arrangement_canvas.clear_face_highlights()
 
     #########################################################################
     #################################################################### MISC
@@ -0,0 +1,203 @@
+'''
+Copyright (C) 2016 Saeed Gholami Shahbandi. All rights reserved.
+
+This program is free software: you can redistribute it and/or
+modify it under the terms of the GNU Lesser General Public License
+as published by the Free Software Foundation, either version 3 of
+the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public
+License along with this program. If not, see
+<http://www.gnu.org/licenses/>
+'''
+
+from __future__ import print_function
+
+import os
+import hashlib
+import threading
+import collections
+
+import numpy as np
+
+################################################################################
+################################################################################
+################################################################################
+'''
+A cache of the products derived from a map (binary and edge images, gradients,
+histogram of oriented gradients, sinograms, ...).
+
+Products are keyed by the identity of the map (file name, size and
+modification time), the source image (e.g. binary, with its thresholds) and
+the exact parameters of the product. The cache is an LRU, bounded in bytes.
+Optionally, products that are arrays (or tuples of arrays) are also saved to a
+directory next to the map, so reopening the map or going back to the old
+parameters does not recompute them.
+The cache could be used from worker threads (see workers.py), products are
+computed out of the lock, so the same product might be computed twice.
+'''
+
+########################################
+def map_key(file_name):
+    ''' the identity of a map file, changes if the file changes '''
+    stat = os.stat(file_name)
+    return (os.path.basename(file_name), stat.st_size, int(stat.st_mtime))
+
+########################################
+def cache_dir(file_name):
+    ''' the directory of the disk tier of a map, next to the map '''
+    return os.path.splitext(file_name)[0] + '.cache'
+
+########################################
+def normalize(params):
+    ''' parameters to a hashable, exact and stable representation (numpy to python) '''
+    if isinstance(params, np.ndarray):
+        return tuple([normalize(p) for p in params.tolist()])
+    if isinstance(params, (list, tuple)):
+        return tuple([normalize(p) for p in params])
+    if isinstance(params, np.generic):
+        return params.item()
+    return params
+
+########################################
+def nbytes(value):
+    ''' size of a product in memory (products without nbytes are counted zero) '''
+    if isinstance(value, (list, tuple)):
+        return sum([nbytes(v) for v in value])
+    return getattr(value, 'nbytes', 0)
+
+################################################################################
+class ProductCache(object):
+    '''
+    LRU cache of products, bounded to max_bytes in memory
+    products larger than max_bytes are not kept in memory (only on disk)
+
+    use_disk: if True, array products are also saved (npz) in the cache
+    directory given to get(), and are loaded from there on a miss
+    '''
+
+    ########################################
+    def __init__(self, max_bytes=512*2**20, use_disk=False):
+        self.max_bytes = max_bytes
+        self.use_disk = use_disk
+        self.products = collections.OrderedDict()
+        self.stats = {'hits': 0, 'disk hits': 0, 'misses': 0}
+        self.lock = threading.RLock()
+
+    ########################################
+    def __len__(self):
+        return len(self.products)
+
+    ########################################
+    def nbytes(self):
+        with self.lock:
+            return sum([nbytes(value) for value in list(self.products.values())])
+
+    ########################################
+    def clear(self):
+        with self.lock:
+            self.products = collections.OrderedDict()
+
+    ########################################
+    def get(self, key, compute, directory=None):
+        '''
+        the product of the key, compute() is only called on a miss
+        key: a hashable (see normalize), e.g. (map_key, source, name, params)
+        directory: the disk tier for this product (see cache_dir), or None
+        '''
+        key = normalize(key)
+
+        with self.lock:
+            if key in self.products:
+                self.stats['hits'] += 1
+                self.products[key] = self.products.pop(key) # most recently used
+                return self.products[key]
+
+        value = None
+        disk = self.use_disk and directory is not None
+        file_name = None
+        if disk:
+            file_name = os.path.join(directory, hashlib.sha1(repr(key).encode('utf-8')).hexdigest()+'.npz')
+            value = self.load(file_name)
+
+        if value is not None:
+            self.stats['disk hits'] += 1
+        else:
+            value = compute()
+            self.stats['misses'] += 1
+            if disk: self.save(file_name, value)
+
+        self.insert(key, value)
+        return value
+
+    ########################################
+    def insert(self, key, value):
+        ''' inserting a product, and dropping the least recently used ones to fit max_bytes '''
+        if nbytes(value) > self.max_bytes:
+            return
+        with self.lock:
+            self.products[key] = value
+            while self.nbytes() > self.max_bytes and len(self.products) > 1:
+                self.products.popitem(last=False)
+
+    ########################################
+    def save(self, file_name, value):
+        ''' saving an array, or a tuple of arrays, to the disk tier (other products are not saved) '''
+        is_tuple = isinstance(value, (list, tuple))
+        arrays = list(value) if is_tuple else [value]
+        if not all([isinstance(a, np.ndarray) for a in arrays]):
+            return
+        try:
+            directory = os.path.dirname(file_name)
+            if not os.path.isdir(directory): os.makedirs(directory)
+            with open(file_name, 'wb') as f:
+                np.savez(f, *arrays, is_tuple=is_tuple)
+        except (IOError, OSError) as e:
+            print ('\t WARNING: disk cache disabled, could not write {:s}: {:s}'.format(file_name, str(e)))
+            self.use_disk = False
+
+    ########################################
+    def load(self, file_name):
+        ''' a product from the disk tier, None if not available '''
+        if not os.path.isfile(file_name):
+            return None
+        try:
+            with np.load(file_name) as data:
+                arrays = [data['arr_{:d}'.format(i)] for i in range(len(data.files)-1)]
+                return tuple(arrays) if bool(data['is_tuple']) else arrays[0]
+        except (IOError, OSError, ValueError, KeyError):
+            return None
+
+    ########################################
+    def bind(self, *prefix, **kwargs):
+        ''' an ImageCache, for the products of one source image (see ImageCache) '''
+        return ImageCache(self, prefix, kwargs.get('directory'))
+
+################################################################################
+class ImageCache(object):
+    '''
+    the view of a ProductCache for one source image, e.g.
+    ProductCache.bind(map_key, 'binary', thresholds, inverted)
+    the functions of annotationLib take it as their "cache" argument
+    '''
+
+    ########################################
+    def __init__(self, cache, prefix, directory=None):
+        self.cache = cache
+        self.prefix = normalize(prefix)
+        self.directory = directory
+
+    ########################################
+    def get(self, name, params, compute):
+        ''' the product "name" of the source image, with the given parameters '''
+        return self.cache.get(self.prefix + (name, normalize(params)), compute, self.directory)
+
+    ########################################
+    def bind(self, *prefix):
+        ''' an ImageCache for an image derived from this one (e.g. its edges) '''
+        return ImageCache(self.cache, self.prefix + normalize(prefix), self.directory)
@@ -0,0 +1,306 @@
+'''
+Copyright (C) 2016 Saeed Gholami Shahbandi. All rights reserved.
+
+This program is free software: you can redistribute it and/or
+modify it under the terms of the GNU Lesser General Public License
+as published by the Free Software Foundation, either version 3 of
+the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public
+License along with this program. If not, see
+<http://www.gnu.org/licenses/>
+'''
+
+from __future__ import print_function
+
+import os, sys
+import threading
+import collections
+
+import cv2
+import yaml
+import numpy as np
+
+try:
+    import resource # peak memory, not available on windows
+except ImportError:
+    resource = None
+
+################################################################################
+################################################################################
+################################################################################
+'''
+Loading and processing of very large maps.
+
+Maps in PGM (binary, P5) and NPY format are memory-mapped instead of read, so
+only the parts of the map that are accessed are in memory. Maps of ROS
+map_server (a yaml file pointing to the image, with resolution and origin)
+are loaded through their yaml file. Derived images
+(binary, edges, ...) are TiledImage objects, computed tile by tile only when a
+region of them is accessed.
+'''
+
+mmap_extensions = ['pgm', 'PGM', 'npy', 'NPY']
+yaml_extensions = ['yaml', 'YAML', 'yml', 'YML']
+
+########################################
+def memory_usage():
+    '''
+    current and peak resident memory of the process (MB)
+    nan if not available on the platform
+    '''
+    current, peak = np.nan, np.nan
+    try:
+        with open('/proc/self/statm') as f:
+            current = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2.**20
+    except (IOError, OSError, ValueError):
+        pass
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on linux, bytes on mac
+        peak = peak / 2.**20 if sys.platform == 'darwin' else peak / 2.**10
+    return current, peak
+
+########################################
+def report_memory(stage):
+    ''' printing the memory usage after a stage (e.g. loading the map) '''
+    current, peak = memory_usage()
+    print ('\t memory after {:s}: {:.0f} MB (peak {:.0f} MB)'.format(stage, current, peak))
+
+########################################
+def read_pgm_header(file_name):
+    '''
+    width, height, maxval and the offset of the pixels in a binary (P5) pgm file
+    returns None if the file is not a binary pgm (e.g. ascii P2)
+    '''
+    with open(file_name, 'rb') as f:
+        header = f.read(1024)
+
+    fields, idx = [], 0
+    while len(fields) < 4:
+        # skipping white spaces and comments
+        while idx < len(header) and header[idx:idx+1].isspace(): idx += 1
+        if header[idx:idx+1] == b'#':
+            while idx < len(header) and header[idx:idx+1] not in [b'\n', b'\r']: idx += 1
+            continue
+        start = idx
+        while idx < len(header) and not header[idx:idx+1].isspace(): idx += 1
+        if start == idx: return None
+        fields.append(header[start:idx])
+
+    if fields[0] != b'P5': return None
+    width, height, maxval = [int(field) for field in fields[1:]]
+    return width, height, maxval, idx+1 # a single white space after maxval
+
+########################################
+def memmap_image(file_name, shape=None, dtype=np.uint8):
+    '''
+    memory-mapping a map (read only)
+    pgm (binary) and npy files are supported, headerless raw files only if shape is given
+    returns None if the file could not be memory-mapped
+    '''
+    ext = file_name.split('.')[-1]
+
+    if ext in ['npy', 'NPY']:
+        image = np.load(file_name, mmap_mode='r')
+
+    elif ext in ['pgm', 'PGM']:
+        header = read_pgm_header(file_name)
+        if header is None: return None
+        width, height, maxval, offset = header
+        dtype = np.uint8 if maxval < 256 else np.dtype('>u2') # 16 bit pgm is big endian
+        image = np.memmap(file_name, dtype=dtype, mode='r', offset=offset, shape=(height,width))
+
+    elif shape is not None:
+        image = np.memmap(file_name, dtype=dtype, mode='r', shape=tuple(shape))
+
+    else:
+        return None
+
+    return image if image.ndim == 2 else None
+
+########################################
+def read_ros_map_yaml(file_name):
+    '''
+    the content of a map_server yaml file (image, resolution, origin, negate,
+    occupied_thresh, free_thresh), the address of the image is made absolute
+    returns None if the file is not a map_server yaml file
+    '''
+    try:
+        with open(file_name, 'r') as f:
+            info = yaml.safe_load(f)
+    except (IOError, yaml.YAMLError):
+        return None
+
+    if not isinstance(info, dict) or not all([k in info for k in ['image', 'resolution', 'origin']]):
+        return None
+    info['image'] = os.path.join(os.path.dirname(os.path.abspath(file_name)), info['image'])
+    return info
+
+########################################
+def ros_map_info(file_name):
+    '''
+    the map_server information of a map, if file_name is a map_server yaml
+    file, or an image next to a yaml file (same name) that points to it
+    returns None otherwise
+    '''
+    if file_name.split('.')[-1] in yaml_extensions:
+        return read_ros_map_yaml(file_name)
+
+    for ext in yaml_extensions:
+        yaml_name = os.path.splitext(file_name)[0] + '.' + ext
+        if os.path.isfile(yaml_name):
+            info = read_ros_map_yaml(yaml_name)
+            if info is not None and os.path.abspath(info['image']) == os.path.abspath(file_name):
+                return info
+    return None
+
+########################################
+def load_map(file_name):
+    '''
+    loading a map (grayscale), flipped upside down
+    see "known bugs" in docs/HOWTO_annotation_GUI.md for the flipping
+
+    pgm and npy maps are memory-mapped (the flipped map is a view, not a copy),
+    other formats are read with opencv
+    if file_name is a map_server yaml file, the image it points to is loaded
+    (the pixels are not negated or thresholded, see ros_map_info)
+    '''
+    if file_name.split('.')[-1] in yaml_extensions:
+        info = read_ros_map_yaml(file_name)
+        if info is None:
+            print ('\t WARNING: not a map_server yaml file: {:s}'.format(file_name))
+            return None
+        file_name = info['image']
+
+    image = None
+    if file_name.split('.')[-1] in mmap_extensions:
+        image = memmap_image(file_name)
+    if image is None:
+        image = cv2.imread( file_name, cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        print ('\t WARNING: could not read image: {:s}'.format(file_name))
+        return None
+    return np.flipud( image )
+
+########################################
+def downsample(image, band=1024):
+    '''
+    half size of an image (area interpolation), computed band by band (of rows)
+    so that a memory-mapped or tiled image is never loaded as a whole
+    '''
+    h, w = image.shape[:2]
+    size = ((w+1)//2, (h+1)//2)
+    if isinstance(image, np.ndarray) and not isinstance(image, np.memmap):
+        return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+    bands = []
+    for r in range(0, h, 2*band):
+        rows = np.ascontiguousarray( image[r:r+2*band, :] )
+        bands.append( cv2.resize(rows, (size[0], (rows.shape[0]+1)//2), interpolation=cv2.INTER_AREA) )
+    return np.concatenate(bands, axis=0)
+
+########################################
+def pyramid(image, min_size=256):
+    ''' levels of the image, from full resolution down to min_size (pixels of the smaller side) '''
+    levels = [image]
+    while min(levels[-1].shape[:2]) > min_size:
+        # area interpolation: thin walls fade to gray instead of disappearing
+        levels.append( downsample(levels[-1]) )
+    return levels
+
+################################################################################
+################################################################################
+################################################################################
+class TiledImage(object):
+    '''
+    an image derived from a source image, by a function that is applied to
+    tiles of the source, only when a region of the image is accessed
+
+    It behaves like a read-only 2d array for slicing (e.g. image[r1:r2, c1:c2])
+    and np.asarray (which computes all the tiles).
+    The computed tiles are cached (least recently used are discarded).
+
+    halo: number of extra pixels around each tile, given to the function, for
+    functions that are not pixel-wise (e.g. Canny). Note that Canny's
+    hysteresis is not local, so edges might slightly differ at tile borders.
+    '''
+
+    ########################################
+    def __init__(self, source, function, tile_size=1024, halo=0, max_tiles=64):
+        self.source = source
+        self.function = function
+        self.tile_size = tile_size
+        self.halo = halo
+        self.max_tiles = max_tiles
+        self.tiles = collections.OrderedDict()
+        self.lock = threading.RLock() # tiles might be accessed from worker threads
+
+        self.shape = tuple(source.shape[:2])
+        self.ndim = 2
+        self.dtype = function( np.ascontiguousarray(source[:8,:8]) ).dtype
+
+    ########################################
+    def __len__(self):
+        return self.shape[0]
+
+    ########################################
+    @property
+    def nbytes(self):
+        ''' memory of the computed tiles (not of the whole image) '''
+        with self.lock:
+            return sum([tile.nbytes for tile in self.tiles.values()])
+
+    ########################################
+    def tile(self, i, j):
+        ''' the tile at the i-th row and the j-th column of tiles '''
+        with self.lock:
+            if (i,j) in self.tiles:
+                self.tiles[(i,j)] = self.tiles.pop((i,j)) # most recently used
+                return self.tiles[(i,j)]
+
+        (H, W), s, h = self.shape, self.tile_size, self.halo
+        r1, c1 = max(i*s-h, 0), max(j*s-h, 0)
+        r2, c2 = min((i+1)*s+h, H), min((j+1)*s+h, W)
+        result = self.function( np.ascontiguousarray(self.source[r1:r2, c1:c2]) )
+        result = result[i*s-r1 : i*s-r1+s, j*s-c1 : j*s-c1+s]
+
+        with self.lock:
+            self.tiles[(i,j)] = result
+            if len(self.tiles) > self.max_tiles:
+                self.tiles.popitem(last=False)
+        return result
+
+    ########################################
+    def __getitem__(self, key):
+        ''' only slices are supported, e.g. image[r1:r2], image[r1:r2, c1:c2:step] '''
+        if not isinstance(key, tuple): key = (key,)
+        key = key + (slice(None),) * (2-len(key))
+        if not all([isinstance(k, slice) for k in key]):
+            raise TypeError('TiledImage only supports slicing')
+
+        (r1, r2, rs), (c1, c2, cs) = [k.indices(n) for (k,n) in zip(key, self.shape)]
+        if rs < 0 or cs < 0:
+            raise TypeError('TiledImage does not support negative steps')
+        r2, c2 = max(r1, r2), max(c1, c2)
+        region = np.zeros((r2-r1, c2-c1), dtype=self.dtype)
+
+        s = self.tile_size
+        for i in range(r1//s, (r2-1)//s+1 if r2>r1 else r1//s):
+            for j in range(c1//s, (c2-1)//s+1 if c2>c1 else c1//s):
+                tile = self.tile(i, j)
+                tr1, tr2 = max(r1, i*s), min(r2, (i+1)*s)
+                tc1, tc2 = max(c1, j*s), min(c2, (j+1)*s)
+                region[tr1-r1:tr2-r1, tc1-c1:tc2-c1] = tile[tr1-i*s:tr2-i*s, tc1-j*s:tc2-j*s]
+
+        return region[::rs, ::cs]
+
+    ########################################
+    def __array__(self, dtype=None, copy=None):
+        image = self[:, :]
+        return image if dtype is None else image.astype(dtype)
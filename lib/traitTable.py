@@ -0,0 +1,649 @@
+'''
+Copyright (C) 2016 Saeed Gholami Shahbandi. All rights reserved.
+
+This program is free software: you can redistribute it and/or
+modify it under the terms of the GNU Lesser General Public License
+as published by the Free Software Foundation, either version 3 of
+the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public
+License along with this program. If not, see
+<http://www.gnu.org/licenses/>
+'''
+
+from __future__ import print_function
+
+import numpy as np
+import scipy.spatial
+
+################################################################################
+################################################################################
+################################################################################
+'''
+A numpy-backed table of traits.
+Traits are kept as rows of arrays (type, end points, center, radius, t1/t2),
+so that bulk operations (drawing, bounding box, saving) are array operations.
+The sympy based trts.*Modified objects are only built (and cached) on demand,
+e.g. when the traits are handed to arrangement.Arrangement.
+The arrangement repo (and sympy) are only imported there, so the table (e.g.
+in the batch annotation) does not need them.
+'''
+
+# trait types, the order is the same as the yaml keys
+SEGMENT, RAY, LINE, ARC, CIRCLE = range(5)
+type_keys = ['segments', 'rays', 'lines', 'arcs', 'circles']
+type_initials = ['S', 'R', 'L', 'A', 'C']
+
+########################################
+def cluster_labels(coords, ids=None):
+    '''
+    the seed of the cluster of every point (n x d)
+
+    points are visited in order, a point that is not in a cluster yet is the
+    seed of a new cluster, of all the points closer than 1 to it in every
+    coordinate (chebyshev distance) that are not in a cluster yet
+    so every point is within the tolerances of its seed (no chaining),
+    coordinates are expected to be scaled by the tolerances
+
+    ids: the point that each row of coords stands for, if a point has more
+    than one row (e.g. mirrored copies), default: every row is a point
+    '''
+    ids = np.arange(len(coords)) if ids is None else np.asarray(ids)
+    n = ids.max()+1 if len(ids) > 0 else 0
+    labels = np.full(n, -1, dtype=int)
+    if n == 0: return labels
+
+    tree = scipy.spatial.cKDTree(coords)
+    rows_of = [[] for _ in range(n)]
+    for (row, point) in enumerate(ids): rows_of[point].append(row)
+
+    for point in range(n):
+        if labels[point] >= 0: continue
+        labels[point] = point
+        for neighbors in tree.query_ball_point(coords[rows_of[point]], 1., p=np.inf):
+            neighbors = ids[neighbors]
+            neighbors = neighbors[labels[neighbors] < 0]
+            labels[neighbors] = point
+    return labels
+
+########################################
+def reduction_report(n_before, n_after):
+    '''
+    the number of removed traits, and the saving in the arrangement
+    construction, estimated by the number of pairs of traits to intersect
+    '''
+    pairs = lambda n: n*(n-1)/2.
+    saving = 100. * (1 - pairs(n_after)/pairs(n_before)) if n_before > 1 else 0.
+    return 'removed {:d} of {:d} traits ({:.0f}% fewer pairs of traits to intersect)'.format(
+        n_before-n_after, n_before, saving)
+
+########################################
+class TraitTable(object):
+    '''
+    columns:
+    kind: trait type (SEGMENT, RAY, LINE, ARC, CIRCLE)
+    points: [x1,y1,x2,y2], for segments, rays and lines (nan otherwise)
+    center: [xc,yc], for arcs and circles (nan otherwise)
+    radius: for arcs and circles (nan otherwise)
+    theta: [t1,t2], for arcs (nan otherwise)
+
+    version is incremented on every change of the rows, so that the views of
+    the table (e.g. the trait layers of MyMplCanvas) know when to update
+    '''
+
+    ########################################
+    def __init__(self):
+        self.kind = np.zeros(0, dtype=np.int8)
+        self.points = np.zeros((0,4))
+        self.center = np.zeros((0,2))
+        self.radius = np.zeros(0)
+        self.theta = np.zeros((0,2))
+        self._traits = [] # cache of trts objects, None if not built yet
+        self.version = 0
+        self._boxes = None # cache of bounding_boxes, (version, boxes)
+        self._index = None # hash index of the rows, (version, {key: row}), see keys()
+
+    ########################################
+    def __len__(self):
+        return len(self.kind)
+
+    ########################################
+    def __add__(self, other):
+        table = self.copy()
+        table.extend(other)
+        return table
+
+    ########################################
+    def copy(self):
+        table = TraitTable()
+        table.kind = self.kind.copy()
+        table.points = self.points.copy()
+        table.center = self.center.copy()
+        table.radius = self.radius.copy()
+        table.theta = self.theta.copy()
+        table._traits = list(self._traits)
+        table.version = self.version
+        return table
+
+    ########################################
+    def _add_rows(self, kind, points=None, center=None, radius=None, theta=None):
+        ''' appending n rows of the same kind, missing columns are nan '''
+        if points is not None: n = len(points)
+        elif center is not None: n = len(center)
+        else: n = 0
+
+        def column(values, width):
+            if values is None:
+                return np.full((n,width), np.nan) if width>1 else np.full(n, np.nan)
+            values = np.asarray(values, dtype=float)
+            return values.reshape((n,width)) if width>1 else values.reshape(n)
+
+        self.kind = np.concatenate([self.kind, np.full(n, kind, dtype=np.int8)])
+        self.points = np.concatenate([self.points, column(points,4)])
+        self.center = np.concatenate([self.center, column(center,2)])
+        self.radius = np.concatenate([self.radius, column(radius,1)])
+        self.theta = np.concatenate([self.theta, column(theta,2)])
+        self._traits.extend([None]*n)
+        self.version += 1
+
+    ########################################
+    def add_segments(self, points):
+        ''' points: n x [x1,y1,x2,y2] '''
+        self._add_rows(SEGMENT, points=points)
+
+    def add_rays(self, points):
+        ''' points: n x [x1,y1,x2,y2], from [x1,y1] toward [x2,y2] '''
+        self._add_rows(RAY, points=points)
+
+    def add_lines(self, points):
+        ''' points: n x [x1,y1,x2,y2], two points on each line '''
+        self._add_rows(LINE, points=points)
+
+    def add_circles(self, center, radius):
+        ''' center: n x [xc,yc] - radius: n '''
+        self._add_rows(CIRCLE, center=center, radius=radius)
+
+    def add_arcs(self, center, radius, theta):
+        ''' center: n x [xc,yc] - radius: n - theta: n x [t1,t2] (radian) '''
+        self._add_rows(ARC, center=center, radius=radius, theta=theta)
+
+    ########################################
+    def append(self, trait):
+        ''' appending a trts.*Modified object, it is also cached '''
+        self.extend([trait])
+
+    ########################################
+    def extend(self, other, unique=False):
+        '''
+        other: a TraitTable or a list of trts.*Modified objects
+        unique: if True, traits that are already in the table (or repeated in
+        other) are not appended, checked in O(1) per trait with a hash index
+        '''
+        if not isinstance(other, TraitTable):
+            other = TraitTable.from_traits(other)
+
+        if unique:
+            index = self.index()
+            keep = []
+            for (row, key) in enumerate(other.keys()):
+                if key not in index:
+                    index[key] = len(self) + len(keep)
+                    keep.append(row)
+            if len(keep) < len(other):
+                other = other.subset(keep)
+
+        self.kind = np.concatenate([self.kind, other.kind])
+        self.points = np.concatenate([self.points, other.points])
+        self.center = np.concatenate([self.center, other.center])
+        self.radius = np.concatenate([self.radius, other.radius])
+        self.theta = np.concatenate([self.theta, other.theta])
+        self._traits.extend(other._traits)
+        self.version += 1
+        if unique: self._index = (self.version, index)
+
+    ########################################
+    def clipped(self, boundary, border=True):
+        '''
+        a new table, where lines and rays are clipped to the boundary
+        [xMin, yMin, xMax, yMax] and turned into segments (Liang-Barsky),
+        lines and rays that do not cross the boundary are removed
+        border: if True, the four sides of the boundary are added as segments
+        other traits are not changed
+        '''
+        xMin, yMin, xMax, yMax = [float(b) for b in boundary]
+        rows = np.flatnonzero(np.isin(self.kind, [RAY, LINE]))
+        x1,y1,x2,y2 = self.points[rows].T
+        p, d = np.stack([x1,y1], axis=1), np.stack([x2-x1,y2-y1], axis=1)
+
+        # the parameter t of p + t*d, for the part inside the boundary
+        t_min = np.where(self.kind[rows]==RAY, 0., -np.inf)
+        t_max = np.full(len(rows), np.inf)
+        inside = np.ones(len(rows), dtype=bool)
+        for axis, (lo, hi) in enumerate([(xMin, xMax), (yMin, yMax)]):
+            moving = d[:,axis] != 0
+            with np.errstate(divide='ignore', invalid='ignore'):
+                t_lo, t_hi = (lo - p[:,axis]) / d[:,axis], (hi - p[:,axis]) / d[:,axis]
+            t_min = np.where(moving, np.maximum(t_min, np.minimum(t_lo, t_hi)), t_min)
+            t_max = np.where(moving, np.minimum(t_max, np.maximum(t_lo, t_hi)), t_max)
+            inside &= moving | ((lo <= p[:,axis]) & (p[:,axis] <= hi))
+        inside &= (t_min < t_max) & np.any(d != 0, axis=1) # degenerate traits are removed
+
+        t_min, t_max = t_min[inside,np.newaxis], t_max[inside,np.newaxis]
+        points = np.concatenate([p[inside] + t_min*d[inside], p[inside] + t_max*d[inside]], axis=1)
+        # end points exactly on the border, so that they meet the border segments
+        tol = 1e-9 * max(xMax-xMin, yMax-yMin, 1.)
+        for (column, value) in [(0,xMin), (0,xMax), (1,yMin), (1,yMax)]:
+            for c in [column, column+2]:
+                points[:,c] = np.where(np.abs(points[:,c]-value) < tol, value, points[:,c])
+
+        table = self.copy()
+        table.points[rows[inside]] = points
+        table.kind[rows[inside]] = SEGMENT
+        for row in rows[inside]: table._traits[row] = None
+        table.version += 1
+        table = table.subset( np.setdiff1d(np.arange(len(self)), rows[~inside]) )
+
+        if border:
+            table.add_segments([[xMin,yMin,xMax,yMin], [xMax,yMin,xMax,yMax],
+                                [xMax,yMax,xMin,yMax], [xMin,yMax,xMin,yMin]])
+        return table
+
+    ########################################
+    def keys(self):
+        '''
+        a hashable key of every row, equal for equal traits: the two points of
+        a line do not matter (normal angle and distance to the origin), nor the
+        order of the end points of a segment
+        values are rounded (6 decimals), near-duplicates are found by reduced()
+        '''
+        values = np.zeros((len(self),5)) # not nan, nan keys would never be equal
+
+        rows = self.kind==SEGMENT
+        p, q = self.points[rows,:2], self.points[rows,2:]
+        swap = (p[:,0] > q[:,0]) | ((p[:,0] == q[:,0]) & (p[:,1] > q[:,1]))
+        values[rows,:4] = np.where(swap[:,np.newaxis], np.concatenate([q,p],axis=1), self.points[rows])
+
+        rows = self.kind==RAY
+        x1,y1,x2,y2 = self.points[rows].T
+        values[rows,:3] = np.stack([x1, y1, np.arctan2(y2-y1, x2-x1)], axis=1)
+
+        rows = self.kind==LINE
+        values[rows,:2] = np.stack(self.normal_form(rows), axis=1)
+
+        rows = np.isin(self.kind, [ARC, CIRCLE])
+        values[rows,:3] = np.concatenate([self.center[rows], self.radius[rows,np.newaxis]], axis=1)
+        rows = self.kind==ARC
+        values[rows,3:] = self.theta[rows]
+
+        values = np.round(values, 6) + 0. # +0. turns -0. into 0.
+        return [(k,) + tuple(v) for (k,v) in zip(self.kind.tolist(), values.tolist())]
+
+    ########################################
+    def index(self):
+        ''' {key: row} of the rows (see keys), cached until the rows change '''
+        if self._index is None or self._index[0] != self.version:
+            index = {}
+            for (row, key) in enumerate(self.keys()):
+                index.setdefault(key, row)
+            self._index = (self.version, index)
+        return self._index[1]
+
+    ########################################
+    def normal_form(self, rows, origin=(0,0)):
+        '''
+        the angle of the normal (in [0,pi)) and the signed distance (rho) from
+        the origin, of the lines supporting the rows (segments, rays and lines)
+        '''
+        x1,y1,x2,y2 = self.points[rows].T
+        theta = np.mod(np.arctan2(y2-y1, x2-x1) + np.pi/2, np.pi)
+        rho = (x1-origin[0])*np.cos(theta) + (y1-origin[1])*np.sin(theta)
+        return theta, rho
+
+    ########################################
+    def reduced(self, angle_tolerance=.5*np.pi/180, distance_tolerance=1.):
+        '''
+        a new table, without near-duplicate traits, and the number of removed traits
+
+        lines are clustered by (theta, rho) (see normal_form), rays by their
+        start point and direction, circles and arcs by their center, radius
+        (and end angles), within the tolerances (radian, and units of the map)
+        the first trait of each cluster is kept, and all the traits of a
+        cluster are within the tolerances of it (see cluster_labels)
+        segments are clustered by their supporting lines, and collinear
+        segments that overlap (or are closer than distance_tolerance) are
+        merged into one, in the place of the first of them
+        segments, rays and lines of zero length are removed
+        '''
+        if len(self) == 0: return self.copy(), 0
+
+        # rho is measured from the center of the traits, so that angle_tolerance
+        # is not amplified by the distance of the traits from the origin
+        boxes = self.bounding_boxes()
+        with np.errstate(invalid='ignore'): # -inf+inf of lines
+            centers = np.stack([(boxes[:,0]+boxes[:,2])/2., (boxes[:,1]+boxes[:,3])/2.], axis=1)
+        origin = [np.mean(c[np.isfinite(c)]) if np.any(np.isfinite(c)) else 0. for c in centers.T]
+        a, d = float(angle_tolerance), float(distance_tolerance)
+
+        labels = np.arange(len(self)) # a trait is its own cluster, unless clustered below
+        points = self.points.copy()
+
+        # segments, rays and lines without a direction (two equal points) are removed
+        x1,y1,x2,y2 = self.points.T
+        degenerate = np.isin(self.kind, [SEGMENT, RAY, LINE]) & (x1==x2) & (y1==y2)
+        labels[degenerate] = -1
+
+        for k in [SEGMENT, LINE]:
+            rows = np.flatnonzero((self.kind==k) & ~degenerate)
+            if len(rows) < 2: continue
+            theta, rho = self.normal_form(rows, origin)
+            coords = np.stack([theta/a, rho/d], axis=1)
+            # theta close to pi is close to 0 (with rho of the opposite sign)
+            wrap = np.flatnonzero(theta > np.pi-a)
+            coords = np.concatenate([coords, np.stack([(theta[wrap]-np.pi)/a, -rho[wrap]/d], axis=1)])
+            clusters = cluster_labels(coords, ids=np.concatenate([np.arange(len(rows)), wrap]))
+
+            if k == LINE:
+                labels[rows] = rows[clusters]
+            else:
+                labels[rows], points[rows] = self.merged_segments(rows, clusters, d)
+
+        rows = np.flatnonzero((self.kind==RAY) & ~degenerate)
+        if len(rows) > 1:
+            x1,y1,x2,y2 = self.points[rows].T
+            t = np.arctan2(y2-y1, x2-x1)
+            coords = np.stack([x1/d, y1/d, np.cos(t)/a, np.sin(t)/a], axis=1)
+            labels[rows] = rows[cluster_labels(coords)]
+
+        for k in [CIRCLE, ARC]:
+            rows = np.flatnonzero(self.kind==k)
+            if len(rows) < 2: continue
+            coords = np.concatenate([self.center[rows]/d, self.radius[rows,np.newaxis]/d], axis=1)
+            if k == ARC:
+                t = self.theta[rows]
+                coords = np.concatenate([coords, np.cos(t)/a, np.sin(t)/a], axis=1)
+            labels[rows] = rows[cluster_labels(coords)]
+
+        keep = np.flatnonzero(labels == np.arange(len(self)))
+        table = self.copy()
+        table.points = points
+        table._traits = [t if np.array_equal(points[i], self.points[i], equal_nan=True) else None
+                         for (i,t) in enumerate(self._traits)]
+        table.version += 1
+        table = table.subset(keep)
+        return table, len(self)-len(table)
+
+    ########################################
+    def merged_segments(self, rows, clusters, gap):
+        '''
+        for each segment (rows), the segment it is merged into and the new end
+        points; collinear segments (same cluster) are merged if they overlap
+        or are closer than gap, along the seed of the cluster (see cluster_labels)
+        '''
+        labels, points = np.array(rows), self.points[rows].copy()
+        for cluster in np.unique(clusters):
+            members = np.flatnonzero(clusters==cluster)
+            if len(members) < 2: continue
+
+            # intervals of the segments, projected on the seed (not degenerate)
+            p0 = self.points[rows[cluster],:2]
+            direction = self.points[rows[cluster],2:] - p0
+            direction = direction / np.linalg.norm(direction)
+            t1 = (self.points[rows[members],:2] - p0).dot(direction)
+            t2 = (self.points[rows[members],2:] - p0).dot(direction)
+            start, end = np.minimum(t1,t2), np.maximum(t1,t2)
+
+            # sweeping the intervals, sorted by start
+            order = np.argsort(start, kind='mergesort')
+            run = [order[0]]
+            for (i, j) in zip(order[:-1], order[1:]):
+                if start[j] > end[run].max() + gap:
+                    self._merge_run(rows, members, run, start, end, p0, direction, labels, points)
+                    run = []
+                run.append(j)
+            self._merge_run(rows, members, run, start, end, p0, direction, labels, points)
+
+        return labels, points
+
+    ########################################
+    def _merge_run(self, rows, members, run, start, end, p0, direction, labels, points):
+        ''' merging a run of overlapping segments into the first of them (in the order of rows) '''
+        if len(run) < 2: return
+        first = min(run)
+        labels[members[run]] = rows[members[first]]
+        t1, t2 = start[run].min(), end[run].max()
+        points[members[first]] = np.concatenate([p0 + t1*direction, p0 + t2*direction])
+
+    ########################################
+    def subset(self, indices):
+        ''' a new table of the given rows (in the given order) '''
+        indices = np.asarray(indices, dtype=int)
+        table = TraitTable()
+        table.kind = self.kind[indices]
+        table.points = self.points[indices]
+        table.center = self.center[indices]
+        table.radius = self.radius[indices]
+        table.theta = self.theta[indices]
+        table._traits = [self._traits[idx] for idx in indices]
+        table.version = self.version
+        return table
+
+    ########################################
+    def delete(self, indices):
+        ''' removing rows '''
+        keep = np.ones(len(self), dtype=bool)
+        keep[indices] = False
+        self.kind = self.kind[keep]
+        self.points = self.points[keep]
+        self.center = self.center[keep]
+        self.radius = self.radius[keep]
+        self.theta = self.theta[keep]
+        self._traits = [t for (t,k) in zip(self._traits, keep) if k]
+        self.version += 1
+
+    ########################################
+    def pop(self, idx):
+        ''' removing a row, and returning it as a trts object '''
+        trait = self.trait(idx)
+        self.delete([idx])
+        return trait
+
+    ########################################
+    def transform(self, scale=1., rotation=0., translation=(0,0)):
+        '''
+        a new table of the traits, scaled, then rotated (radian, around the
+        origin) and then translated: p' = R(rotation) * scale*p + translation
+        '''
+        R = np.array([[np.cos(rotation), -np.sin(rotation)],
+                      [np.sin(rotation),  np.cos(rotation)]])
+        move = lambda p: (scale*p).dot(R.T) + np.asarray(translation, dtype=float)
+
+        table = self.copy()
+        table.points = move(self.points.reshape(-1,2)).reshape(-1,4)
+        table.center = move(self.center)
+        table.radius = scale * self.radius
+        table.theta = self.theta + rotation
+        table._traits = [None]*len(self)
+        table.version += 1
+        return table
+
+    ########################################
+    def select(self, kind):
+        ''' indices of the rows of the given kind (or list of kinds) '''
+        return np.flatnonzero( np.isin(self.kind, kind) )
+
+    ########################################
+    def bounding_box(self):
+        '''
+        [xMin, yMin, xMax, yMax] of all traits, for lines and rays the two
+        points are considered, and for arcs the whole circle
+        '''
+        X = np.concatenate([ self.points[:,0], self.points[:,2],
+                             self.center[:,0]-self.radius, self.center[:,0]+self.radius ])
+        Y = np.concatenate([ self.points[:,1], self.points[:,3],
+                             self.center[:,1]-self.radius, self.center[:,1]+self.radius ])
+        return [np.nanmin(X), np.nanmin(Y), np.nanmax(X), np.nanmax(Y)]
+
+    ########################################
+    def bounding_boxes(self):
+        '''
+        [xMin, yMin, xMax, yMax] of every row (n x 4), cached until the rows change
+        arcs are bounded by their whole circle, lines are unbounded (except
+        for vertical and horizontal ones), and rays are unbounded only in the
+        direction they extend to
+        '''
+        if self._boxes is not None and self._boxes[0] == self.version:
+            return self._boxes[1]
+
+        boxes = np.full((len(self),4), np.nan)
+
+        rows = self.kind==SEGMENT
+        x1,y1,x2,y2 = self.points[rows].T
+        boxes[rows] = np.stack([np.minimum(x1,x2), np.minimum(y1,y2),
+                                np.maximum(x1,x2), np.maximum(y1,y2)], axis=1)
+
+        for k in [RAY, LINE]:
+            rows = self.kind==k
+            x1,y1,x2,y2 = self.points[rows].T
+            dx, dy = x2-x1, y2-y1
+            if k == RAY:
+                boxes[rows] = np.stack([np.where(dx<0, -np.inf, x1), np.where(dy<0, -np.inf, y1),
+                                        np.where(dx>0, np.inf, x1), np.where(dy>0, np.inf, y1)], axis=1)
+            else:
+                boxes[rows] = np.stack([np.where(dx!=0, -np.inf, x1), np.where(dy!=0, -np.inf, y1),
+                                        np.where(dx!=0, np.inf, x1), np.where(dy!=0, np.inf, y1)], axis=1)
+
+        rows = np.isin(self.kind, [ARC, CIRCLE])
+        c, r = self.center[rows], self.radius[rows,np.newaxis]
+        boxes[rows] = np.concatenate([c-r, c+r], axis=1)
+
+        self._boxes = (self.version, boxes)
+        return boxes
+
+    ########################################
+    def describe(self, idx):
+        ''' a one line description of a trait, used in the trait list widget '''
+        k = self.kind[idx]
+        if k in [SEGMENT, RAY, LINE]:
+            x1,y1,x2,y2 = self.points[idx]
+            return '{:s}: p1({:.2f},{:.2f}), p2({:.2f},{:.2f})'.format(type_initials[k], x1,y1,x2,y2)
+        elif k == ARC:
+            (xc,yc), r, (t1,t2) = self.center[idx], self.radius[idx], self.theta[idx]
+            return 'A: c:({:.2f},{:.2f}), r:{:.2f}, t:({:.2f},{:.2f})'.format(xc,yc,r,t1,t2)
+        elif k == CIRCLE:
+            (xc,yc), r = self.center[idx], self.radius[idx]
+            return 'C: c({:.2f},{:.2f}), r{:.2f}'.format(xc,yc,r)
+
+    ########################################
+    def trait(self, idx):
+        ''' the trts object of a row, built on the first call '''
+        if self._traits[idx] is None:
+            import sympy as sym
+            import arrangement.geometricTraits as trts
+            k = self.kind[idx]
+            if k in [SEGMENT, RAY, LINE]:
+                x1,y1,x2,y2 = self.points[idx]
+                args = (sym.Point(x1,y1), sym.Point(x2,y2))
+                if k == SEGMENT: self._traits[idx] = trts.SegmentModified(args=args)
+                elif k == RAY: self._traits[idx] = trts.RayModified(args=args)
+                elif k == LINE: self._traits[idx] = trts.LineModified(args=args)
+            elif k == ARC:
+                (xc,yc), r, (t1,t2) = self.center[idx], self.radius[idx], self.theta[idx]
+                self._traits[idx] = trts.ArcModified( args=(sym.Point(xc,yc), r, (t1,t2)) )
+            elif k == CIRCLE:
+                (xc,yc), r = self.center[idx], self.radius[idx]
+                self._traits[idx] = trts.CircleModified( args=(sym.Point(xc,yc), r) )
+        return self._traits[idx]
+
+    ########################################
+    def to_traits(self):
+        ''' list of trts objects of all rows, e.g. for arrangement.Arrangement '''
+        return [self.trait(idx) for idx in range(len(self))]
+
+    ########################################
+    @staticmethod
+    def from_traits(trait_list):
+        ''' a table from a list of trts.*Modified objects '''
+        import arrangement.geometricTraits as trts
+        table = TraitTable()
+        for trait in trait_list:
+            # note: ArcModified is checked before CircleModified (it might be a subclass)
+            if isinstance(trait, (trts.SegmentModified, trts.RayModified, trts.LineModified)):
+                p = [trait.obj.p1.x, trait.obj.p1.y, trait.obj.p2.x, trait.obj.p2.y]
+                p = [[float(i.evalf()) for i in p]]
+                if isinstance(trait, trts.SegmentModified): table.add_segments(p)
+                elif isinstance(trait, trts.RayModified): table.add_rays(p)
+                else: table.add_lines(p)
+
+            elif isinstance(trait, trts.ArcModified):
+                c = [[float(trait.obj.center.x.evalf()), float(trait.obj.center.y.evalf())]]
+                table.add_arcs(c, [float(trait.obj.radius.evalf())], [[float(trait.t1), float(trait.t2)]])
+
+            elif isinstance(trait, trts.CircleModified):
+                c = [[float(trait.obj.center.x.evalf()), float(trait.obj.center.y.evalf())]]
+                table.add_circles(c, [float(trait.obj.radius.evalf())])
+
+            else:
+                continue
+            table._traits[-1] = trait
+        return table
+
+    ########################################
+    @staticmethod
+    def from_dict(data):
+        ''' a table from a dictionary in the format of the trait yaml files '''
+        table = TraitTable()
+
+        if 'lines' in data.keys():
+            lines = []
+            for l in data['lines']:
+                if len(l) == 4: #[x1,y1,x2,y2]
+                    lines.append(l)
+                elif len(l) == 3: #[x1,y1,slope]
+                    lines.append([l[0], l[1], l[0]+1, l[1]+l[2]])
+            table.add_lines( np.array(lines).reshape(-1,4) )
+
+        if 'segments' in data.keys():
+            table.add_segments( np.array(data['segments']).reshape(-1,4) )
+
+        if 'rays' in data.keys():
+            table.add_rays( np.array(data['rays']).reshape(-1,4) )
+
+        if 'circles' in data.keys():
+            c = np.array(data['circles']).reshape(-1,3)
+            table.add_circles(c[:,:2], c[:,2])
+
+        if 'arcs' in data.keys():
+            a = np.array(data['arcs']).reshape(-1,5)
+            table.add_arcs(a[:,:2], a[:,2], a[:,3:])
+
+        return table
+
+    ########################################
+    def to_dict(self, boundary=None):
+        '''
+        converting traits to a dictionary, in the format of the trait yaml files
+        boundary: [xMin, yMin, xMax, yMax], used for bounding the arrangement of infinit lines
+        '''
+        data = {}
+        for k in [SEGMENT, RAY, LINE]:
+            rows = self.points[self.kind==k]
+            if len(rows) > 0: data[type_keys[k]] = rows.tolist()
+
+        rows = self.kind==ARC
+        if np.any(rows):
+            data['arcs'] = np.concatenate([ self.center[rows], self.radius[rows,np.newaxis],
+                                            self.theta[rows] ], axis=1).tolist()
+        rows = self.kind==CIRCLE
+        if np.any(rows):
+            data['circles'] = np.concatenate([ self.center[rows], self.radius[rows,np.newaxis] ],
+                                             axis=1).tolist()
+
+        if boundary is not None:
+            data['boundary'] = [float(b) for b in boundary]
+
+        return data
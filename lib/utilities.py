@@ -15,8 +15,12 @@ You should have received a copy of the GNU Lesser General Public
 License along with this program. If not, see
 <http://www.gnu.org/licenses/>
 '''
+import threading
+import collections
+
 import numpy as np
 import scipy.signal
+import scipy.ndimage
 
 ############################################################
 ############################################################
@@ -98,6 +102,152 @@ def FindPeaks (signal,
 
     return peakind
 
+############################################################
+def FindPeaksVectorized (signals,
+                         Refine_win=1 , MinPeakDist = 1 , MinPeakVal=np.spacing(1),
+                         Polar=False):
+    '''
+    Same as FindPeaks (with CWT=False), but for a batch of signals at once.
+    The result of each signal is identical to that of FindPeaks.
+
+    signals: a 2D array, each row is one signal (e.g. sinograms.T)
+    returns: a list of arrays, peak indices of each signal
+
+    2_ Refine_win: the refinement of all samples of all signals is one argmax
+       over a strided view of sliding windows [i-Refine_win, i+Refine_win)
+    3_ MinPeakDist: refined indices are non-decreasing, and repeated indices
+       are all but one discarded by FindPeaks, hence only the unique indices
+       are kept. Since distinct refined indices are more than Refine_win apart,
+       the sequential elimination of FindPeaks only runs over the (few) pairs
+       closer than MinPeakDist
+    4_ MinPeakVal: boolean mask
+    '''
+
+    signals = np.atleast_2d(np.asarray(signals, dtype=float))
+    nsig, nsmp = signals.shape
+
+    # 2_ Refine_win
+    # padding with -inf, so that the windows are clipped at the borders of the signals
+    win = int(Refine_win)
+    padded = np.full((nsig, nsmp+2*win), -np.inf)
+    padded[:, win:win+nsmp] = signals
+    windows = np.lib.stride_tricks.as_strided(padded, shape=(nsig, nsmp, 2*win),
+                                              strides=(padded.strides[0],
+                                                       padded.strides[1],
+                                                       padded.strides[1]))
+    refined = np.arange(nsmp) - win + np.argmax(windows, axis=2)
+
+    # only the first of each repeated index survives 3_ (unless MinPeakDist<=0)
+    first = np.ones(refined.shape, dtype=bool)
+    if MinPeakDist > 0:
+        first[:, 1:] = refined[:, 1:] != refined[:, :-1]
+
+    peaks = []
+    for signal, ref, fst in zip(signals, refined, first):
+        peakind = ref[fst]
+        peakval = signal[peakind]
+
+        # 3_ MinPeakDist
+        keep = _min_peak_distance(peakind, peakval, MinPeakDist, Polar)
+
+        if Polar and keep.sum() > 0:
+            survivors = np.flatnonzero(keep)
+            f, l = survivors[0], survivors[-1]
+            if polar_distance(peakind[f],  peakind[l]) < MinPeakDist:
+                if (peakval[f] < peakval[l]):
+                    keep[f] = False
+                else:
+                    keep[l] = False
+
+        # 4_ MinPeakVal
+        keep &= peakval >= MinPeakVal * np.max(signal)
+
+        peaks.append( peakind[keep] )
+
+    return peaks
+
+def _min_peak_distance(peakind, peakval, MinPeakDist, Polar):
+    '''
+    The sequential elimination of step 3_ in FindPeaks, returns a boolean mask
+    scanning from right to left, "s" is the closest surviving peak on the right
+    '''
+    keep = np.ones(peakind.shape, dtype=bool)
+    if peakind.shape[0] < 2:
+        return keep
+
+    if Polar:
+        dist = polar_distance(peakind[:-1], peakind[1:])
+    else:
+        dist = np.diff(peakind)
+
+    close = np.flatnonzero(dist < MinPeakDist)
+    if close.shape[0] == 0:
+        return keep
+
+    if Polar:
+        # the polar distance to a far survivor could be shorter, scan all
+        scan = np.arange(peakind.shape[0]-2, -1, -1)
+    else:
+        # peaks farther than MinPeakDist from their right neighbor are never
+        # removed, and they become the new survivor; scan only the close pairs
+        scan = close[::-1]
+
+    s = scan[0]+1
+    for i in scan:
+        if not Polar and i+1 != s and keep[i+1]:
+            # the previous close pair is not adjacent, start a new survivor
+            s = i+1
+
+        if Polar:
+            d = polar_distance(peakind[i],  peakind[s])
+        else:
+            d = peakind[s] - peakind[i]
+
+        if d < MinPeakDist:
+            if (peakval[i] > peakval[s]):
+                keep[s] = False
+                s = i
+            else:
+                keep[i] = False
+        else:
+            s = i
+
+    return keep
+
+############################################################
+def FindPeaksCircular (signal, MinPeakDist=1, MinPeakVal=np.spacing(1), NumPeaks=None):
+    '''
+    Peaks of a circular signal (e.g. a histogram of orientations), where the
+    first and last samples are neighbors.
+
+    MinPeakDist: minimum (circular) distance between peaks, in samples
+    MinPeakVal: peaks smaller than MinPeakVal * max(signal) are rejected
+    NumPeaks: maximum number of peaks to return (None: all)
+
+    returns the indices of peaks, sorted from the strongest to the weakest
+    '''
+    signal = np.asarray(signal, dtype=float)
+    n = signal.shape[0]
+
+    # local maxima, with circular neighbors (first sample of a plateau)
+    is_peak = (signal > np.roll(signal, 1)) & (signal >= np.roll(signal, -1))
+    is_peak &= signal >= MinPeakVal * np.max(signal)
+    candidates = np.flatnonzero(is_peak)
+    candidates = candidates[ np.argsort(-signal[candidates], kind='mergesort') ]
+
+    # greedy suppression of the weaker peaks that are too close to a stronger one
+    peakind = []
+    for c in candidates:
+        if len(peakind) > 0:
+            d = np.abs(np.array(peakind) - c)
+            if np.min( np.minimum(d, n-d) ) < MinPeakDist:
+                continue
+        peakind.append(c)
+        if NumPeaks is not None and len(peakind) == NumPeaks:
+            break
+
+    return np.array(peakind, dtype=int)
+
 ############################################################
 ############################################################
 ############################################################
@@ -129,42 +279,205 @@ def Gauss1D(x, mu, s):
     y = np.exp(- (x-mu)**2 /(2.0 * s**2))
     return coefficient * y
 
+############################################################
+# kernels are cached per (Size, Sigma, Order/Normalize), since they are
+# rebuilt with the same parameters over and over. cached kernels are read-only
+# the cache keeps the most recently used kernels (kernels might be large, and
+# the parameters might change, e.g. scanning Sigma), and might be used from
+# worker threads
+_kernel_cache = collections.OrderedDict()
+_kernel_cache_size = 32
+_kernel_cache_lock = threading.Lock()
+
+def _cached_kernel(name, key, builder):
+    key = (name,) + key
+    with _kernel_cache_lock:
+        if key in _kernel_cache:
+            _kernel_cache[key] = _kernel_cache.pop(key) # most recently used
+            return _kernel_cache[key]
+
+    kernel = builder()
+    kernel.setflags(write=False)
+
+    with _kernel_cache_lock:
+        _kernel_cache[key] = kernel
+        while len(_kernel_cache) > _kernel_cache_size:
+            _kernel_cache.popitem(last=False)
+    return kernel
+
 ############################################################
 def Gauss2DNormal(Size, Sigma = 0.7, Normalize = '/sum'):
     # borrowed from: https://gist.github.com/andrewgiessel 
     # fwhm: full width at half maximum
     # fwhm = 2 * (sqrt(2*(ln(2)))) * sigma
+    def builder():
+        x = np.arange(0, Size, 1, float)
+        y = x[:,np.newaxis]
 
-    x = np.arange(0, Size, 1, float)
-    y = x[:,np.newaxis]
-
-    x0 = y0 = Size // 2
+        x0 = y0 = Size // 2
     
-    gauss = np.exp(-((x-x0)**2 + (y-y0)**2) / (2*(Sigma**2)) )
+        gauss = np.exp(-((x-x0)**2 + (y-y0)**2) / (2*(Sigma**2)) )
     
-    if Normalize == '/sum':
-        gauss = gauss / np.sum(gauss)
-    elif Normalize == '/2*pi*sigma**2':
-        gauss = gauss / (2*np.pi*(Sigma**2))
+        if Normalize == '/sum':
+            gauss = gauss / np.sum(gauss)
+        elif Normalize == '/2*pi*sigma**2':
+            gauss = gauss / (2*np.pi*(Sigma**2))
 
-    return gauss
+        return gauss
 
-############################################################
-def GammaFilter (Size=3, Sigma=0.7, Order=1):
-    GaussKernel = Gauss2DNormal(Size, Sigma, '/2*pi*sigma**2')
+    return _cached_kernel('Gauss2DNormal', (Size, Sigma, Normalize), builder)
 
+############################################################
+def _gamma_dx(Size):
     # TODO, Question: which direction is correct for dx? Actually why, since I know which direction!
-
     dx = np.arange(Size/2, -Size/2, -1, float)
     dx = np.arange(-Size/2, Size/2, 1, float) + 1
-    dy = dx[:,np.newaxis]
+    return dx
+
+def GammaFilter (Size=3, Sigma=0.7, Order=1):
+    def builder():
+        GaussKernel = Gauss2DNormal(Size, Sigma, '/2*pi*sigma**2')
+
+        dx = _gamma_dx(Size)
+        dy = dx[:,np.newaxis]
     
-    MN = (-(dx + np.sign(Order)*1j*dy) / Sigma**2)** np.abs(Order)
+        MN = (-(dx + np.sign(Order)*1j*dy) / Sigma**2)** np.abs(Order)
+
+        return MN * GaussKernel
+
+    return _cached_kernel('GammaFilter', (Size, Sigma, Order), builder)
 
-    return MN * GaussKernel
 ############################################################
+def SeparableGammaFilter (Size=3, Sigma=0.7, Order=1):
+    '''
+    The GammaFilter of order 1 (or -1) is the sum of two separable kernels:
+    GammaFilter = outer(g, dg) + sign(Order) * 1j * outer(dg, g)
+    where (g, dg) are 1D kernels, and outer(a,b)[row,col] = a[row]*b[col]
+
+    returns (g, dg)
+    '''
+    if np.abs(Order) != 1:
+        raise (ValueError('only GammaFilter of order 1 or -1 is separable'))
+
+    def builder():
+        x = np.arange(0, Size, 1, float)
+        x0 = Size // 2
+        g = np.exp(-(x-x0)**2 / (2*(Sigma**2)) )
+        # all constants of GammaFilter go to dg
+        dg = -_gamma_dx(Size) * g / (Sigma**2) / (2*np.pi*(Sigma**2))
+        return np.stack([g, dg])
+
+    return _cached_kernel('SeparableGammaFilter', (Size, Sigma), builder)
+
+############################################################
+def _convolve1d(Image, kernel, axis, ConvMode):
+    '''
+    1D convolution along an axis, with the same output as
+    scipy.signal.convolve2d(..., mode=ConvMode, boundary='fill', fillvalue=0)
+    '''
+    n, k = Image.shape[axis], kernel.shape[0]
+    # zero padding (k-1) on both sides, so that the "full" convolution is computed
+    pad = [(0,0), (0,0)]
+    pad[axis] = (k-1, k-1)
+    full = scipy.ndimage.convolve1d(np.pad(Image, pad, mode='constant'), kernel,
+                                    axis=axis, mode='constant', cval=0)
+    # the full convolution starts at (k-1)//2 of the padded output
+    start = (k-1)//2
+    if ConvMode == 'full':
+        idx = slice(start, start + n+k-1)
+    elif ConvMode == 'valid':
+        idx = slice(start + k-1, start + n)
+    elif ConvMode == 'same':
+        idx = slice(start + (k-1)//2, start + (k-1)//2 + n)
+    sl = [slice(None), slice(None)]
+    sl[axis] = idx
+    return full[tuple(sl)]
+
+def _separable_convolve(Image, col_kernel, row_kernel, ConvMode):
+    '''
+    2D convolution with the separable kernel outer(col_kernel, row_kernel)
+    (zero fill boundary), as a convolution along rows and then along columns
+    '''
+    tmp = _convolve1d(Image, row_kernel, 1, ConvMode)
+    return _convolve1d(tmp, col_kernel, 0, ConvMode)
+
+def _zero_windows(Image, KernelSize, ConvMode):
+    '''
+    True for the outputs of the convolution (see _convolve1d for ConvMode)
+    whose KernelSize x KernelSize window of the zero filled image is all zero
+    '''
+    k = KernelSize
+    padded = np.pad(np.abs(Image), k-1, mode='constant')
+    # the window starting at i is centered at i + k//2 for scipy.ndimage
+    window_max = scipy.ndimage.maximum_filter(padded, size=k, mode='constant', cval=0)
+    n_full = [s+k-1 for s in Image.shape]
+    zero = (window_max == 0)[k//2:k//2+n_full[0], k//2:k//2+n_full[1]]
+    if ConvMode == 'valid':
+        return zero[k-1:Image.shape[0], k-1:Image.shape[1]]
+    elif ConvMode == 'same':
+        start = (k-1)//2
+        return zero[start:start+Image.shape[0], start:start+Image.shape[1]]
+    return zero
+
+def OriGradientConvolution (Image, KernelSize=7, KernelSigma=1, ConvMode='valid',
+                            Engine='auto', Complex64=False):
+    '''
+    The convolution of the Image with the GammaFilter (order 1), that is the
+    core of OriGradient.
+
+    Engine:
+    'direct': scipy.signal.convolve2d with the dense complex GammaFilter
+    'separable': two separable real kernels (see SeparableGammaFilter),
+    each as a 1D convolution along rows and then columns; O(KernelSize) per pixel
+    'fft': scipy.signal.fftconvolve with the dense GammaFilter; O(log(N)) per pixel
+    'auto': 'fft' for large kernels, otherwise 'separable'
+
+    Complex64: if True, the computation is in single precision, and the output
+    is complex64 instead of complex128, i.e. half of the memory
+
+    The output of all engines are equal to that of 'direct', up to round-off:
+    the difference is below 1e-6 of the largest magnitude of the output
+    (1e-5 with Complex64), but not relative to each pixel, the round-off of
+    'fft' is spread over the whole image
+    '''
+
+    if Engine == 'auto':
+        # separable: 4 real 1D passes, O(KernelSize) per pixel
+        # fft: O(log(N)) per pixel, for N pixels of the padded image
+        # the crossover is about KernelSize == 2*log2(N) (e.g. 45 for 2000x2000)
+        padded_size = (Image.shape[0]+KernelSize) * (Image.shape[1]+KernelSize)
+        Engine = 'separable' if KernelSize <= 2*np.log2(padded_size) else 'fft'
+
+    real_dtype = np.float32 if Complex64 else np.float64
+    complex_dtype = np.complex64 if Complex64 else np.complex128
+    Image = np.asarray(Image, dtype=real_dtype)
+
+    if Engine == 'direct':
+        kernel = GammaFilter(KernelSize, KernelSigma, Order=1).astype(complex_dtype)
+        oriented_grad = scipy.signal.convolve2d(Image, kernel, mode=ConvMode,
+                                                boundary='fill', fillvalue=0)
+
+    elif Engine == 'separable':
+        g, dg = SeparableGammaFilter(KernelSize, KernelSigma, Order=1).astype(real_dtype)
+        oriented_grad = _separable_convolve(Image, g, dg, ConvMode) + \
+                        1j * _separable_convolve(Image, dg, g, ConvMode)
+
+    elif Engine == 'fft':
+        kernel = GammaFilter(KernelSize, KernelSigma, Order=1).astype(complex_dtype)
+        oriented_grad = scipy.signal.fftconvolve(Image, kernel, mode=ConvMode)
+        # fft round-off turns exact zeros (flat regions) into tiny noise,
+        # which would have a random angle, the output is set to zero where
+        # the image is zero under the kernel (as for the other engines)
+        oriented_grad[_zero_windows(Image, KernelSize, ConvMode)] = 0
 
-def OriGradient (Image, KernelSize=7, KernelSigma=1, AngleMode='full', ConvMode='valid', Gamma=.5):
+    else:
+        raise (ValueError('unknown convolution engine: '+str(Engine)))
+
+    return oriented_grad.astype(complex_dtype, copy=False)
+
+############################################################
+def OriGradient (Image, KernelSize=7, KernelSigma=1, AngleMode='full', ConvMode='valid', Gamma=.5,
+                 Engine='auto', Complex64=False):
     """
     A function to calculate the "Oriented Gradients" of an input image.
     
@@ -176,11 +489,11 @@ def OriGradient (Image, KernelSize=7, KernelSigma=1, AngleMode='full', ConvMode=
     KernelSize and KernelSigma, define the derivative kernel.
     AngleModel controls the angular interval of the output, full=[-pi,pi], half=[-pi/2,pi/2]
 
+    Engine and Complex64 are passed to OriGradientConvolution.
     """
 
-    gammafilter = GammaFilter (KernelSize, KernelSigma, Order=1)
-    oriented_grad = scipy.signal.convolve2d(Image, gammafilter, mode=ConvMode,
-                                            boundary='fill', fillvalue=0)
+    oriented_grad = OriGradientConvolution(Image, KernelSize, KernelSigma, ConvMode,
+                                           Engine, Complex64)
     
     magnitude = np.abs(oriented_grad)**Gamma
 
@@ -189,7 +502,7 @@ def OriGradient (Image, KernelSize=7, KernelSigma=1, AngleMode='full', ConvMode=
     elif (AngleMode == 'half'):
         angle = np.angle( np.exp(2*1j*np.angle(oriented_grad)) ) / 2.0
         
-    return magnitude * np.exp(1j * angle)
+    return (magnitude * np.exp(1j * angle)).astype(oriented_grad.dtype, copy=False)
 
 ############################################################
 def wHOG (OrientedGradient, NumBin = 180*5, Extension = True):
@@ -233,6 +546,154 @@ def wHOG (OrientedGradient, NumBin = 180*5, Extension = True):
 
     return hist, bincenter
 
+############################################################
+def wHOGBincount (dx, dy, NumBin = 180*5, MinMagnitude = 0, Axial = True):
+    '''
+    Weighted Histogram of Oriented Gradient, similar to wHOG, but:
+    - it takes the two components of the gradient (dx, dy) instead of a complex
+    image, and only the pixels with magnitude above MinMagnitude are counted.
+    The angle is only computed for those pixels.
+    - the histogram is a magnitude-weighted np.bincount over fixed bins
+    - if Axial, the angles are folded into [-pi/2, pi/2), i.e. the gradients
+    at theta and theta+pi fall in the same bin. Otherwise [-pi, pi).
+
+    The output is normalized as a density (like wHOG), and the bins are
+    consecutive over the circle, i.e. the histogram is circular.
+    '''
+
+    dx = np.asarray(dx).ravel()
+    dy = np.asarray(dy).ravel()
+    magnitude = np.sqrt(dx**2 + dy**2)
+    idx = np.flatnonzero(magnitude > MinMagnitude)
+
+    angle = np.arctan2(dy[idx], dx[idx])
+    period = np.pi if Axial else 2*np.pi
+    angle = np.mod(angle + period/2, period) # in [0, period)
+
+    binwidth = period / NumBin
+    binidx = np.minimum( (angle / binwidth).astype(int), NumBin-1 )
+    hist = np.bincount(binidx, weights=magnitude[idx], minlength=NumBin).astype(float)
+
+    if hist.sum() > 0:
+        hist /= hist.sum() * binwidth
+    bincenter = -period/2 + (np.arange(NumBin) + .5) * binwidth
+
+    return hist, bincenter
+
+################################################################################
+def SparseRadon (image, theta):
+    '''
+    Radon transform (sinograms) of the image at the given angles (degree),
+    interchangeable with skimage.transform.radon(image, theta, circle=False):
+    same padding, center, orientation and scaling (integer images are
+    scaled to [0,1], like skimage's convert_to_float)
+
+    Instead of rotating and summing the whole (padded) image per angle, only
+    the nonzero pixels are projected: each pixel contributes its value to the
+    (fractional) rho bin of its projection, split linearly between the two
+    neighboring bins (np.bincount). Hence the cost is O(number of nonzero
+    pixels) per angle, not O(image area).
+
+    The result is equal to that of skimage, up to the interpolation; skimage
+    interpolates the rotated image bilinearly, here each pixel is splatted
+    linearly on the projection axis.
+    '''
+
+    points = SparseRadonPoints(image)
+    return SparseRadonProjection(points, theta)
+
+def SparseRadonPoints (image):
+    '''
+    The nonzero pixels of the image, in the padded frame of SparseRadon.
+    It is separated from the projection, so that the projections of the same
+    image at many angles (e.g. orientation refinement) share it.
+
+    returns (X, Y, weights, size)
+    X, Y: coordinates of nonzero pixels w.r.t. the center of the padded image
+    weights: values of nonzero pixels
+    size: the size of the (square) padded image, i.e. the length of sinograms
+    '''
+    image = np.asarray(image)
+    if np.issubdtype(image.dtype, np.integer):
+        scale = 1. / np.iinfo(image.dtype).max
+    else:
+        scale = 1.
+
+    # padded geometry of skimage.transform.radon (circle=False)
+    diagonal = np.sqrt(2) * max(image.shape)
+    pad = [int(np.ceil(diagonal - sh)) for sh in image.shape]
+    new_center = [(sh + p) // 2 for sh, p in zip(image.shape, pad)]
+    old_center = [sh // 2 for sh in image.shape]
+    pad_before = [nc - oc for oc, nc in zip(old_center, new_center)]
+    size = image.shape[0] + pad[0]
+    center = size // 2
+
+    # coordinates (w.r.t. the center of the padded image) and value of nonzero pixels
+    rows, cols = np.nonzero(image)
+    weights = image[rows, cols].astype(float) * scale
+    X = cols + pad_before[1] - center
+    Y = rows + pad_before[0] - center
+
+    return X, Y, weights, size
+
+def SparseRadonProjection (points, theta):
+    '''
+    sinograms of the points (from SparseRadonPoints) at angles theta (degree)
+    '''
+    X, Y, weights, size = points
+    center = size // 2
+
+    sinograms = np.zeros((size, len(theta)))
+    for i, angle in enumerate(np.deg2rad(theta)):
+        # rho: the column of the pixel after the rotation of skimage.transform.radon
+        rho = center + np.cos(angle)*X - np.sin(angle)*Y
+        rho0 = np.floor(rho)
+        frac = rho - rho0
+        rho0 = rho0.astype(int)
+        sinograms[:, i] = np.bincount(rho0, weights=weights*(1-frac), minlength=size+1)[:size]
+        sinograms[:, i] += np.bincount(rho0+1, weights=weights*frac, minlength=size+1)[:size]
+
+    return sinograms
+
+################################################################################
+def ClipToBox (points, box, tMin=-np.inf, tMax=np.inf):
+    '''
+    Liang-Barsky clipping of many parametric lines to an axis aligned box, at once
+
+    points: n x [x1,y1,x2,y2], each line is p(t) = p1 + t*(p2-p1)
+    box: [xMin, yMin, xMax, yMax]
+    tMin, tMax: the range of t before clipping, scalar or n array
+    (lines: -inf,inf - rays: 0,inf - segments: 0,1)
+
+    returns (clipped, valid)
+    clipped: n x [x1,y1,x2,y2], the end points of the clipped lines
+    valid: n bool, False for lines not crossing the box (their clipped is nan)
+    '''
+    points = np.atleast_2d(np.asarray(points, dtype=float))
+    x, y = points[:,0], points[:,1]
+    dx, dy = points[:,2]-x, points[:,3]-y
+    [xMin, yMin, xMax, yMax] = box
+
+    t0 = np.full(len(points), tMin, dtype=float)
+    t1 = np.full(len(points), tMax, dtype=float)
+    valid = np.ones(len(points), dtype=bool)
+
+    # the four borders: left, right, bottom, top -> p*t <= q
+    for (p, q) in [(-dx, x-xMin), (dx, xMax-x), (-dy, y-yMin), (dy, yMax-y)]:
+        parallel = (p == 0)
+        valid &= ~(parallel & (q < 0)) # parallel and outside
+        with np.errstate(divide='ignore', invalid='ignore'):
+            r = q / p
+        entering, leaving = (p < 0), (p > 0)
+        t0[entering] = np.maximum(t0[entering], r[entering])
+        t1[leaving] = np.minimum(t1[leaving], r[leaving])
+
+    valid &= (t0 <= t1) & np.isfinite(t0) & np.isfinite(t1)
+    clipped = np.stack([x+t0*dx, y+t0*dy, x+t1*dx, y+t1*dy], axis=1)
+    clipped[~valid] = np.nan
+
+    return clipped, valid
+
 ################################################################################
 def smooth(x, window_len=11, window='hanning'):
     """
@@ -291,3 +752,27 @@ def smooth(x, window_len=11, window='hanning'):
     y = y[dsb:-dse]
 
     return y
+
+################################################################################
+def smooth_circular(x, window_len=11, window='hanning'):
+    """
+    same as smooth, but the signal is considered circular (e.g. a histogram
+    of orientations); i.e. the padding at both ends is wrapped around,
+    instead of reflected, and the output has the same length as the input.
+    """
+
+    if window_len < 3:  return x
+
+    if x.ndim != 1: raise (ValueError('smooth_circular only accepts 1 dimension arrays.'))
+    if x.size < window_len:  raise (ValueError('Input vector needs to be bigger than window size.'))
+    win_type = ['flat', 'hanning', 'hamming', 'bartlett', 'blackman']
+    if window not in win_type: raise( ValueError( 'Window type is unknown'))
+
+    if window == 'flat': #moving average
+        w=np.ones(window_len,'d')
+    else:
+        w=getattr(np, window)(window_len)
+
+    half = window_len//2
+    s = np.r_[x[-half:], x, x[:window_len-1-half]]
+    return np.convolve(w/w.sum(), s, mode='valid')
@@ -0,0 +1,272 @@
+'''
+Copyright (C) 2016 Saeed Gholami Shahbandi. All rights reserved.
+
+This program is free software: you can redistribute it and/or
+modify it under the terms of the GNU Lesser General Public License
+as published by the Free Software Foundation, either version 3 of
+the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public
+License along with this program. If not, see
+<http://www.gnu.org/licenses/>
+'''
+
+from __future__ import print_function
+
+import sys
+import signal
+import threading
+import traceback
+import multiprocessing
+
+import PySide
+from PySide import QtCore
+
+################################################################################
+################################################################################
+################################################################################
+'''
+Running the long steps of the GUIs (loading maps, detection, ...) in the
+threads of a QThreadPool, so the GUI stays responsive.
+
+The function of a Worker is called with a "progress" keyword argument, a
+callable progress(fraction, message) that reports the progress to the GUI and
+raises Cancelled if the worker is cancelled (cooperative cancellation, the
+function is only interrupted where it reports its progress).
+The result (or the error) is delivered by signals, hence in the GUI thread.
+
+Steps that hold the GIL for long (e.g. the construction of an arrangement)
+run in a separate process, see run_in_process. Such steps are really
+interrupted when cancelled (the process is terminated).
+'''
+
+########################################
+class Cancelled(Exception):
+    ''' raised by the progress callback of a cancelled worker '''
+    pass
+
+########################################
+class WorkerSignals(QtCore.QObject):
+    '''
+    QRunnable is not a QObject, so the signals of a Worker are here
+    progress: (fraction in [0,1], message)
+    finished: result of the function
+    failed: the error message (and traceback)
+    cancelled: the worker was cancelled
+    '''
+    progress = QtCore.Signal(float, str)
+    finished = QtCore.Signal(object)
+    failed = QtCore.Signal(str)
+    cancelled = QtCore.Signal()
+
+########################################
+class Worker(QtCore.QRunnable):
+    ''' a function, run in a thread of the pool, see the module docstring '''
+
+    ########################################
+    def __init__(self, function, *args, **kwargs):
+        super(Worker, self).__init__()
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = WorkerSignals()
+        self.cancel_event = threading.Event()
+        self.setAutoDelete(False) # the worker is kept by the window until it is done
+
+    ########################################
+    def cancel(self):
+        self.cancel_event.set()
+
+    ########################################
+    def is_cancelled(self):
+        return self.cancel_event.is_set()
+
+    ########################################
+    def progress(self, fraction=None, message=''):
+        '''
+        the progress callback that is given to the function
+        without a fraction, it only checks whether the worker is cancelled
+        '''
+        if self.is_cancelled():
+            raise Cancelled()
+        if fraction is not None:
+            self.signals.progress.emit(float(fraction), message)
+
+    ########################################
+    def run(self):
+        try:
+            result = self.function(*self.args, progress=self.progress, **self.kwargs)
+        except Cancelled:
+            self.signals.cancelled.emit()
+        except Exception as e:
+            self.signals.failed.emit(str(e) + '\n' + traceback.format_exc())
+        else:
+            # a worker that is cancelled after its last progress report is still cancelled
+            if self.is_cancelled():
+                self.signals.cancelled.emit()
+            else:
+                self.signals.finished.emit(result)
+
+################################################################################
+def sub_progress(progress, start, end):
+    '''
+    the progress callback of a sub-step, covering [start, end] of the progress
+    e.g. refine_orientations(..., progress=sub_progress(progress, .1, .6))
+    '''
+    if progress is None:
+        return None
+    return lambda fraction, message='': progress(start + fraction*(end-start), message)
+
+################################################################################
+def process_main(connection, function, args, kwargs):
+    ''' the main of the process of run_in_process, messages are sent to the worker '''
+    # terminating the process (cancelling) raises SystemExit in the function,
+    # so that the function could clean up (e.g. terminate its own pool)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(1))
+    progress = lambda fraction, message='': connection.send(('progress', fraction, message))
+    try:
+        result = function(*args, progress=progress, **kwargs)
+        connection.send(('finished', result))
+    except Exception as e:
+        connection.send(('failed', str(e) + '\n' + traceback.format_exc()))
+    finally:
+        connection.close()
+
+########################################
+def run_in_process(function, *args, **kwargs):
+    '''
+    running function(*args, progress=..., **kwargs) in a separate process,
+    from a worker, e.g. manager.start(name, run_in_process, on_result, function, *args)
+
+    the progress of the process is forwarded to the worker, and the process
+    is terminated if the worker is cancelled
+    function must be defined at the top level of a module, and its arguments
+    and its result must be picklable
+    '''
+    progress = kwargs.pop('progress')
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    # not a daemon, the function might use a multiprocessing pool itself
+    process = multiprocessing.Process(target=process_main, args=(sender, function, args, kwargs))
+    process.start()
+    sender.close()
+
+    try:
+        while True:
+            progress() # raises Cancelled if cancelled
+            if not receiver.poll(.1):
+                continue
+            try:
+                message = receiver.recv()
+            except EOFError:
+                process.join()
+                raise RuntimeError('the process exited unexpectedly (exit code {:s})'.format(str(process.exitcode)))
+
+            if message[0] == 'progress':
+                progress(*message[1:])
+            elif message[0] == 'finished':
+                return message[1]
+            else:
+                raise RuntimeError(message[1])
+
+    finally:
+        receiver.close()
+        if process.is_alive():
+            process.terminate()
+        process.join()
+
+################################################################################
+class WorkerManager(QtCore.QObject):
+    '''
+    runs workers on the global QThreadPool, at most one per name (starting a
+    worker cancels the running one of the same name), and shows their
+    progress in the status bar of a window, with a button to cancel them
+    '''
+
+    ########################################
+    def __init__(self, status_bar):
+        super(WorkerManager, self).__init__()
+        self.pool = QtCore.QThreadPool.globalInstance()
+        self.workers = {}
+
+        self.status_bar = status_bar
+        self.progress_bar = PySide.QtGui.QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setMaximumWidth(200)
+        self.cancel_button = PySide.QtGui.QPushButton('cancel')
+        self.cancel_button.clicked.connect(self.cancel_all)
+        self.status_bar.addPermanentWidget(self.progress_bar)
+        self.status_bar.addPermanentWidget(self.cancel_button)
+        self.update_status_bar()
+
+    ########################################
+    def start(self, name, function, on_result, *args, **kwargs):
+        '''
+        running function(*args, progress=..., **kwargs) in the pool
+        on_result(result) is called in the GUI thread, if the worker is not cancelled
+        '''
+        if name in self.workers:
+            self.workers[name].cancel()
+
+        worker = Worker(function, *args, **kwargs)
+        worker.signals.progress.connect(lambda fraction, message: self.on_progress(name, fraction, message))
+        worker.signals.finished.connect(lambda result: self.on_finished(name, worker, on_result, result))
+        worker.signals.failed.connect(lambda error: self.on_failed(name, worker, error))
+        worker.signals.cancelled.connect(lambda: self.on_cancelled(name, worker))
+
+        self.workers[name] = worker
+        self.update_status_bar()
+        self.pool.start(worker)
+        return worker
+
+    ########################################
+    def running(self, name):
+        ''' True if a worker of this name is started and not done yet '''
+        return name in self.workers
+
+    ########################################
+    def cancel_all(self):
+        for worker in self.workers.values():
+            worker.cancel()
+        self.status_bar.showMessage('cancelling...')
+
+    ########################################
+    def forget(self, name, worker):
+        ''' removing a done worker (if it is not replaced by a newer one of the same name) '''
+        if self.workers.get(name) is worker:
+            del self.workers[name]
+        self.update_status_bar()
+
+    ########################################
+    def on_progress(self, name, fraction, message):
+        self.progress_bar.setValue(int(100*fraction))
+        self.status_bar.showMessage('{:s}: {:s}'.format(name, message))
+
+    ########################################
+    def on_finished(self, name, worker, on_result, result):
+        self.forget(name, worker)
+        self.status_bar.showMessage('{:s}: done'.format(name), 3000)
+        on_result(result)
+
+    ########################################
+    def on_failed(self, name, worker, error):
+        self.forget(name, worker)
+        self.status_bar.showMessage('{:s}: failed'.format(name), 3000)
+        print ('\t WARNING: {:s} failed: {:s}'.format(name, error))
+
+    ########################################
+    def on_cancelled(self, name, worker):
+        self.forget(name, worker)
+        self.status_bar.showMessage('{:s}: cancelled'.format(name), 3000)
+        print ('\t {:s} cancelled'.format(name))
+
+    ########################################
+    def update_status_bar(self):
+        busy = len(self.workers) > 0
+        self.progress_bar.setVisible(busy)
+        self.cancel_button.setVisible(busy)
+        if not busy: self.progress_bar.setValue(0)
@@ -0,0 +1,144 @@
+'''
+Copyright (C) 2016 Saeed Gholami Shahbandi. All rights reserved.
+
+This program is free software: you can redistribute it and/or
+modify it under the terms of the GNU Lesser General Public License
+as published by the Free Software Foundation, either version 3 of
+the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+Lesser General Public License for more details.
+
+You should have received a copy of the GNU Lesser General Public
+License along with this program. If not, see
+<http://www.gnu.org/licenses/>
+'''
+
+from __future__ import print_function
+
+import sys, os, time
+import argparse
+import multiprocessing
+
+sys.path.append('gui/')
+sys.path.append('lib/')
+sys.path.append('../arrangement/')
+
+import annotationLib
+
+__version__ = '0.1'
+
+image_extensions = ['png', 'PNG', 'jpg', 'JPG', 'jpeg', 'bmp', 'BMP', 'pgm', 'PGM', 'tif', 'tiff']
+
+################################################################################
+def annotate_and_save(args):
+    '''
+    the task of each worker in the pool: annotate one map and save the traits
+    it is a module-level function, so that it could be pickled by the pool
+    '''
+    image_name, output_dir, setting, metric = args
+
+    tic = time.time()
+    # one bad map (or map yaml, or output file) should not stop the whole batch
+    try:
+        result = annotationLib.annotate_map(image_name, setting)
+        if result is None:
+            return image_name, None, time.time()-tic
+        image, orientations, traits = result
+
+        # maps of ROS map_server come with a yaml file of the same name, not to be overwritten
+        map_info = annotationLib.map_info(image_name)
+        base_name = os.path.splitext(os.path.basename(image_name))[0]
+        if map_info is not None: base_name += '_traits'
+        trait_file_name = os.path.join(output_dir, base_name+'.yaml')
+        annotationLib.save_traits_to_file(trait_file_name, traits,
+                                          annotationLib.image_boundary(image),
+                                          map_info if metric else None)
+    except Exception as e:
+        print ('\t WARNING: annotation of {:s} failed: {:s}'.format(image_name, str(e)))
+        return image_name, None, time.time()-tic
+
+    return image_name, len(traits), time.time()-tic
+
+################################################################################
+def parse_setting(string, n):
+    ''' comma separated values, same as the text boxes of the annotation gui '''
+    values = [float(param) for param in string.split(',') if len(param)>0]
+    if len(values) != n:
+        raise argparse.ArgumentTypeError('expected {:d} comma separated values'.format(n))
+    return values
+
+################################################################################
+if __name__ == '__main__':
+    '''
+    headless annotation of all the maps in a directory
+    for each map, the dominant orientations are detected, and lines are found
+    with radiography, traits of each map are saved to <output_dir>/<map_name>.yaml
+
+    example:
+    python runMe_batch_annotation.py example/ --source binary --processes 4
+    '''
+    default = annotationLib.default_setting
+    parser = argparse.ArgumentParser(description='headless batch annotation of maps')
+    parser.add_argument('input_dir', help='directory of map bitmaps')
+    parser.add_argument('-o', '--output_dir', default=None,
+                        help='directory to save trait yaml files (default: input_dir)')
+    parser.add_argument('--source', default=default['radiography source'],
+                        choices=['origin', 'binary', 'edge'],
+                        help='source image for radiography')
+    parser.add_argument('--binary_thresholding', default=default['binary thresholding'],
+                        type=lambda s: parse_setting(s,2), help='maxVal, param2')
+    parser.add_argument('--not_inverted', action='store_true',
+                        help='binary thresholding is not inverted')
+    parser.add_argument('--canny_setting', default=default['canny setting'],
+                        type=lambda s: parse_setting(s,3), help='thr1, thr2, apt_size')
+    parser.add_argument('--peak_detection', default=default['sinogram peak detection'],
+                        type=lambda s: parse_setting(s,3), help='refWin, minDist, minVal')
+    parser.add_argument('--num_orientations', default=default['number of orientations'], type=int,
+                        help='maximum number of dominant orientations')
+    parser.add_argument('--refinement', default=default['orientation refinement'],
+                        type=lambda s: None if s=='none' else parse_setting(s,2),
+                        help='orientation refinement: window (degree), time budget (sec), or none')
+    parser.add_argument('--segments', default=default['radiography segments'],
+                        type=lambda s: None if s=='none' else parse_setting(s,2),
+                        help='occupied segments instead of lines: max_gap, min_length (pixel), or none')
+    parser.add_argument('--metric', action='store_true',
+                        help='traits of ROS map_server maps (pgm + yaml) are saved in metric coordinates')
+    parser.add_argument('-p', '--processes', default=multiprocessing.cpu_count(), type=int,
+                        help='number of worker processes (default: number of cores)')
+    args = parser.parse_args()
+
+    setting = {'radiography source': args.source,
+               'binary thresholding': args.binary_thresholding,
+               'binary inverted': not(args.not_inverted),
+               'canny setting': args.canny_setting,
+               'sinogram peak detection': args.peak_detection,
+               'number of orientations': args.num_orientations,
+               'orientation refinement': args.refinement,
+               'radiography segments': args.segments}
+
+    output_dir = args.input_dir if args.output_dir is None else args.output_dir
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+
+    image_names = sorted([ os.path.join(args.input_dir, file_name)
+                           for file_name in os.listdir(args.input_dir)
+                           if file_name.split('.')[-1] in image_extensions ])
+    print ('\t {:d} maps found in {:s}'.format(len(image_names), args.input_dir))
+
+    tic = time.time()
+    tasks = [(image_name, output_dir, setting, args.metric) for image_name in image_names]
+    pool = multiprocessing.Pool(processes=args.processes)
+    try:
+        for image_name, n_traits, elapsed in pool.imap_unordered(annotate_and_save, tasks):
+            if n_traits is None:
+                print ('\t WARNING: {:s} skipped'.format(image_name))
+            else:
+                print ('\t {:s}: {:d} traits ({:.2f} sec)'.format(image_name, n_traits, elapsed))
+    finally:
+        pool.close()
+        pool.join()
+
+    print ('\t done: {:d} maps in {:.2f} sec'.format(len(image_names), time.time()-tic))
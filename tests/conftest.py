@@ -0,0 +1,6 @@
+'''
+the modules of this repo are flat modules in lib/ (see runMe_*.py)
+'''
+import os, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib'))
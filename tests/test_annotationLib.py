@@ -0,0 +1,248 @@
+from __future__ import print_function
+
+import os
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip('cv2')
+import annotationLib
+from traitTable import TraitTable, ARC, CIRCLE
+
+
+########################################
+def synthetic_map(walls=False):
+    ''' a full circle, a half circle (arc) and a small circle, walls 4 pixels thick '''
+    image = np.full((600,1200), 255, np.uint8)
+    cv2.circle(image, (800,400), 80, 0, 4)
+    cv2.ellipse(image, (300,300), (60,60), 0, 0, 180, 0, 4)
+    cv2.circle(image, (500,150), 40, 0, 4)
+    if walls:
+        # walls crossing the small circle through its center, and an enclosure
+        cv2.line(image, (0,150), (1199,150), 0, 4)
+        cv2.line(image, (500,0), (500,599), 0, 4)
+        cv2.rectangle(image, (50,50), (1150,550), 0, 5)
+    return image
+
+########################################
+def match(traits, xc, yc, rc):
+    ''' index of the trait with the nearest center, and its distance '''
+    dist = np.sqrt(((traits.center - [xc,yc])**2).sum(axis=1)) + np.abs(traits.radius - rc)
+    return np.argmin(dist), np.min(dist)
+
+########################################
+@pytest.mark.parametrize('walls', [False, True])
+@pytest.mark.parametrize('with_gradient_image', [True, False])
+def test_find_circles_synthetic(walls, with_gradient_image):
+    image = synthetic_map(walls)
+    edges = cv2.Canny(image, 50, 150)
+    gradient_image = image if with_gradient_image else None
+    traits = annotationLib.find_circles(edges, [5,100], gradient_image=gradient_image)
+
+    # one trait per circle, no fragments and no spurious arcs
+    assert len(traits) == 3
+
+    for (xc, yc, rc, kind) in [(800,400,80,CIRCLE), (500,150,40,CIRCLE), (300,300,60,ARC)]:
+        idx, _ = match(traits, xc, yc, rc)
+        assert traits.kind[idx] == kind
+        assert np.hypot(traits.center[idx,0]-xc, traits.center[idx,1]-yc) < 1.5
+        assert abs(traits.radius[idx] - rc) < 1.5
+
+    # the half circle, from 0 to pi (y is downward in the image)
+    idx, _ = match(traits, 300, 300, 60)
+    assert np.allclose(traits.theta[idx], [0, np.pi], atol=.1)
+
+########################################
+def test_find_circles_split_circle_gives_two_arcs():
+    # a circle with two openings (e.g. doors) is two arcs of the same circle
+    image = np.full((300,300), 255, np.uint8)
+    cv2.ellipse(image, (150,150), (70,70), 0, 10, 170, 0, 4)
+    cv2.ellipse(image, (150,150), (70,70), 0, 190, 350, 0, 4)
+    traits = annotationLib.find_circles(cv2.Canny(image, 50, 150), [5,100], gradient_image=image)
+    assert len(traits) == 2
+    assert np.all(traits.kind == ARC)
+    assert np.allclose(traits.center, [150,150], atol=1.)
+    assert np.allclose(traits.radius, 70, atol=1.)
+
+########################################
+def test_fit_circle_concentric_edges():
+    t = np.linspace(0, np.pi, 50)
+    x = np.concatenate([10+38*np.cos(t), 10+42*np.cos(t)])
+    y = np.concatenate([20+38*np.sin(t), 20+42*np.sin(t)])
+    xc, yc, radii, residual = annotationLib.fit_circle(x, y, np.repeat([0,1], 50))
+    assert np.allclose([xc, yc], [10, 20])
+    assert np.allclose(radii, [38, 42])
+    assert residual < 1e-6
+
+########################################
+def test_traits_file_round_trip(tmp_path):
+    traits = TraitTable()
+    traits.add_segments([[0,0,10,0]])
+    traits.add_lines([[0,0,1,1]])
+    traits.add_circles([[5,5]], [2])
+    traits.add_arcs([[1,2]], [3], [[0,np.pi/2]])
+    file_name = str(tmp_path / 'traits.yaml')
+    annotationLib.save_traits_to_file(file_name, traits, boundary=[0,0,20,20])
+    loaded = annotationLib.load_traits_from_file(file_name)
+    assert len(loaded) == len(traits)
+    assert sorted(loaded.kind.tolist()) == sorted(traits.kind.tolist())
+
+########################################
+def test_refine_orientations_does_not_drift_on_a_filled_binary_map():
+    image_name = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                              'example', 'octagon_BW_deformed_noisy.png')
+    image = annotationLib.load_image(image_name)
+    setting = dict(annotationLib.default_setting, **{'radiography source': 'binary'})
+    source = annotationLib.radiography_source(image, setting)
+    orientations = annotationLib.find_dominant_orientations(image, 2)
+    refined = annotationLib.refine_orientations(source, orientations, window=2*np.pi/180)
+    # the walls of the example are at about -50 and 85 degrees
+    assert np.allclose(np.sort(refined)*180/np.pi, [-50, 85], atol=.5)
+
+########################################
+def test_refine_orientations_stays_in_the_window():
+    # walls at 0 and 90 degrees, the search starts 5 degrees away with a window of 1 degree
+    image = np.zeros((200,200), np.uint8)
+    image[50:150:20, 20:180] = 255
+    image[20:180, 50:150:20] = 255
+    orientations = np.array([5., 85.]) * np.pi/180
+    window = 1*np.pi/180
+    refined = annotationLib.refine_orientations(image, orientations, window=window)
+    assert np.all(np.abs(refined - orientations) <= window + 1e-9)
+
+########################################
+def test_refine_circle_from_an_offset_center():
+    # the two edges of a wall 4 pixels thick, around (100, 80)
+    t = np.linspace(-np.pi, np.pi, 400, endpoint=False)
+    r = np.repeat([48., 52.], len(t))
+    x, y = 100 + r*np.tile(np.cos(t), 2), 80 + r*np.tile(np.sin(t), 2)
+    pixels = (x, y, np.tile(np.cos(t), 2), np.tile(np.sin(t), 2), np.ones(len(x), dtype=bool))
+    xc, yc, radii, residual = annotationLib.refine_circle(pixels, 101, 79, [5,100])[:4]
+    assert np.allclose([xc, yc], [100, 80], atol=1e-6)
+    assert np.allclose(sorted(radii), [48, 52], atol=1e-6)
+    assert residual < 1e-6
+
+########################################
+class DictCache(object):
+    ''' the interface of productCache for cached() '''
+    def __init__(self):
+        self.products = {}
+    def get(self, name, params, compute):
+        if name not in self.products:
+            self.products[name] = compute()
+        return self.products[name]
+
+########################################
+def test_dominant_orientations_tiled_gradients_match_the_whole_image():
+    image_name = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                              'example', 'octagon_BW_deformed_noisy.png')
+    image = annotationLib.load_image(image_name)
+
+    # the histogram of the gradients of the whole (flipped) image
+    smoothed = cv2.GaussianBlur(cv2.blur(np.flipud(image), (9,9)), (9,9),0)
+    dx = cv2.Sobel(smoothed, cv2.CV_64F, 1,0, ksize=9)
+    dy = -cv2.Sobel(smoothed, cv2.CV_64F, 0,1, ksize=9)
+    hist, _ = annotationLib.utilities.wHOGBincount(dx, dy, MinMagnitude=.1*np.sqrt(np.max(dx**2+dy**2)))
+    expected = annotationLib.utilities.smooth_circular(hist, window_len=21)
+
+    for tile_size in [1024, 100, 37]:
+        cache = DictCache()
+        orientations = annotationLib.find_dominant_orientations(image, 2, tile_size=tile_size, cache=cache)
+        assert np.allclose(cache.products['wHOG'][0], expected, atol=1e-3*expected.max()) # float32 gradients
+        assert np.allclose(np.sort(orientations)*180/np.pi, [-50.1, 85.1], atol=.01)
+
+########################################
+def test_dominant_orientations_need_not_be_perpendicular():
+    # walls at 30 degrees, and vertical walls
+    image = np.full((400,400), 255, np.uint8)
+    for k in range(-300, 600, 40):
+        cv2.line(image, (0,k), (399,k+int(400*np.tan(np.pi/6))), 0, 3)
+    for k in range(20, 400, 50):
+        cv2.line(image, (k,0), (k,399), 0, 3)
+    orientations = annotationLib.find_dominant_orientations(image, 3)
+    assert np.allclose(np.sort(orientations)*180/np.pi, [30, 90], atol=.5) or \
+        np.allclose(np.sort(orientations)*180/np.pi, [-90, 30], atol=.5)
+    # the old behavior, the second is perpendicular to the strongest
+    orientations = annotationLib.find_dominant_orientations(image, 2, perpendicular=True)
+    assert np.allclose(np.sort(orientations)*180/np.pi, [-60, 30], atol=.5)
+
+########################################
+def test_lines_to_segments():
+    image = np.zeros((100,200), np.uint8)
+    image[50, 20:81] = 255 # two runs, with a gap of 3 pixels
+    image[50, 84:151] = 255
+    image[10:41, 30] = 255 # two runs, with a gap of 20 pixels
+    image[61:91, 30] = 255
+    image[70, 170:180] = 255 # too short
+    points = np.array([[0.,50], [30,0], [0,70]])
+    angles = np.array([0., np.pi/2, 0.])
+
+    segments = annotationLib.lines_to_segments(image, points, angles, max_gap=5, min_length=20, tolerance=1)
+    # sorted by line, and along the line
+    expected = [[20,50,150,50], [30,10,30,40], [30,61,30,90]]
+    assert segments.shape == (3,4)
+    # the tolerance extends the runs by a pixel
+    for (segment, exp) in zip(segments, expected):
+        (x1,y1,x2,y2) = segment
+        if x1 > x2 or y1 > y2: segment = [x2,y2,x1,y1]
+        assert np.allclose(segment, exp, atol=1.5)
+
+    # without the tolerance and with a larger gap, the vertical wall is one segment
+    segments = annotationLib.lines_to_segments(image, points, angles, max_gap=25, min_length=20, tolerance=0)
+    assert len(segments) == 2
+    assert np.allclose(sorted(segments[1][[1,3]]), [10, 90], atol=1.)
+    assert len(annotationLib.lines_to_segments(image, np.zeros((0,2)), np.zeros(0))) == 0
+
+########################################
+def test_traits_to_metric():
+    traits = TraitTable()
+    traits.add_segments([[0,0,10,0]])
+    traits.add_circles([[10,20]], [4])
+    boundary = [0, 0, 100, 50]
+
+    # the center of pixel (0,0) is half a pixel from the origin
+    info = {'resolution': .05, 'origin': [-10., -5., 0.]}
+    metric, metric_boundary = annotationLib.traits_to_metric(traits, boundary, info)
+    assert np.allclose(metric.points[0], [-9.975, -4.975, -9.475, -4.975])
+    assert np.allclose(metric.center[1], [-9.475, -3.975]) and np.isclose(metric.radius[1], .2)
+    assert np.allclose(metric_boundary, [-9.975, -4.975, -4.975, -2.475])
+
+    # rotated origin (yaw of 90 degrees)
+    info = {'resolution': 1., 'origin': [1., 2., np.pi/2]}
+    metric, _ = annotationLib.traits_to_metric(traits, None, info)
+    assert np.allclose(metric.points[0], [.5, 2.5, .5, 12.5])
+
+########################################
+def test_save_traits_in_metric_coordinates(tmp_path):
+    traits = TraitTable()
+    traits.add_segments([[0,0,10,0]])
+    file_name = str(tmp_path / 'traits.yaml')
+    info = {'resolution': .05, 'origin': [-10., -5., 0.]}
+    annotationLib.save_traits_to_file(file_name, traits, boundary=[0,0,100,50], map_info=info)
+    with open(file_name) as f:
+        data = annotationLib.yaml.safe_load(f)
+    assert data['resolution'] == .05 and data['origin'] == [-10., -5., 0.]
+    loaded = annotationLib.load_traits_from_file(file_name)
+    assert np.allclose(loaded.points[0], [-9.975, -4.975, -9.475, -4.975])
+
+########################################
+def test_sinograms_are_reused_when_only_peak_detection_changes():
+    productCache = pytest.importorskip('productCache')
+    image_name = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                              'example', 'octagon_BW_deformed_noisy.png')
+    image = annotationLib.binary_image(annotationLib.load_image(image_name))
+    orientations = np.array([-50., 85.]) * np.pi/180
+    products = productCache.ProductCache()
+    cache = products.bind('map', 'binary')
+
+    lines = annotationLib.radiography(image, orientations, [10,15,.15], cache=cache)
+    assert products.stats['misses'] == 2 # the nonzero pixels and the sinograms
+    other = annotationLib.radiography(image, orientations, [5,30,.3], cache=cache)
+    assert products.stats['misses'] == 2
+    # the same as without the cache
+    expected = annotationLib.radiography(image, orientations, [5,30,.3])
+    assert all([np.array_equal(a, b) for (a, b) in zip(other, expected)])
+    assert len(other[0]) < len(lines[0])
+
+    # new orientations, the nonzero pixels are reused
+    annotationLib.radiography(image, orientations+.01, [5,30,.3], cache=cache)
+    assert products.stats['misses'] == 3
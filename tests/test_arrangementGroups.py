@@ -0,0 +1,130 @@
+from __future__ import print_function
+
+import numpy as np
+import pytest
+
+pytest.importorskip('arrangement.arrangement')
+from traitTable import TraitTable
+import arrangementGroups
+
+
+########################################
+def room(traits, x0, y0, x1, y1):
+    ''' four walls, as separate segments '''
+    traits.add_segments([[x0,y0,x1,y0], [x1,y0,x1,y1], [x1,y1,x0,y1], [x0,y1,x0,y0]])
+
+########################################
+def test_separate_buildings_are_separate_groups():
+    traits = TraitTable()
+    for b in range(3):
+        room(traits, b*100, 0, b*100+50, 50)
+    groups = arrangementGroups.trait_groups(traits, [0,0,300,100])
+    assert sorted([len(g) for g in groups]) == [4, 4, 4]
+
+########################################
+def test_lines_that_cross_the_boundary_join_all():
+    traits = TraitTable()
+    for b in range(3):
+        room(traits, b*100, 0, b*100+50, 50)
+    traits.add_lines([[0,25,1,25]])
+    groups = arrangementGroups.trait_groups(traits, [0,0,300,100])
+    assert [len(g) for g in groups] == [13]
+
+########################################
+def test_nested_rooms_are_one_group():
+    # the boxes of the walls of the enclosure do not overlap the inner room,
+    # but the face of the enclosure contains the room
+    traits = TraitTable()
+    room(traits, 0, 0, 100, 100)
+    room(traits, 40, 40, 60, 60)
+    assert len(arrangementGroups.connected_groups(
+        arrangementGroups.overlapping_pairs(traits.bounding_boxes()), len(traits))) == 2
+    room(traits, 200, 0, 250, 50) # a separate building
+    groups = arrangementGroups.trait_groups(traits, [0,0,300,100])
+    assert [len(g) for g in groups] == [8, 4]
+    assert set(groups[0]) == set(range(8))
+
+########################################
+def test_clipped_traits_keep_separate_groups():
+    # four separate squares, with the border of the boundary added by clipped()
+    traits = TraitTable()
+    for b in range(4):
+        room(traits, 10+b*100, 10, b*100+60, 60)
+    boundary = [0,0,400,100]
+    clipped = traits.clipped(boundary)
+    frame = np.arange(len(traits), len(clipped))
+    groups = arrangementGroups.trait_groups(clipped, boundary, frame)
+    assert [len(g) for g in groups] == [4, 4, 4, 4, 4]
+    assert set(groups[0]) == set(frame) # the frame is the first group
+
+########################################
+def test_traits_reaching_the_boundary_join_the_frame():
+    traits = TraitTable()
+    room(traits, 0, 10, 50, 60) # on the border
+    room(traits, 110, 10, 160, 60)
+    traits.add_lines([[200,0,200,1]]) # clipped to a segment across the boundary
+    boundary = [0,0,400,100]
+    clipped = traits.clipped(boundary)
+    frame = np.arange(len(traits), len(clipped))
+    groups = arrangementGroups.trait_groups(clipped, boundary, frame)
+    assert [len(g) for g in groups] == [9, 4]
+    assert set(groups[1]) == set(range(4,8))
+
+########################################
+def test_build_arrangement_reports_its_progress():
+    traits = TraitTable()
+    for b in range(3):
+        room(traits, b*100, 0, b*100+50, 50)
+    reports = []
+    progress = lambda fraction, message='': reports.append(fraction)
+    config = {'multi_processing': 2, 'end_point': False}
+    arrangement = arrangementGroups.build_arrangement(traits, config, [0,0,300,100], progress=progress)
+
+    # one arrangement per group, in the order of the groups
+    assert isinstance(arrangement, arrangementGroups.ArrangementGroup)
+    assert [sorted(g) for g in arrangement.groups] == [list(range(b*4, b*4+4)) for b in range(3)]
+    assert len(arrangement.arrangements) == 3
+    assert reports[0] == 0 and reports[-1] > .9
+    assert all([f1 <= f2 for (f1, f2) in zip(reports[:-1], reports[1:])])
+
+    # a single group is a single arrangement
+    arrangement = arrangementGroups.build_arrangement(traits.subset(range(4)), config, [0,0,300,100])
+    assert not isinstance(arrangement, arrangementGroups.ArrangementGroup)
+
+########################################
+class Part(object):
+    ''' a stand-in for the arrangement of a group: faces are boxes [x0,y0,x1,y1] '''
+    def __init__(self, boxes):
+        self.decomposition = self
+        self.faces = list(boxes)
+        self.merged = []
+    def find_face(self, point):
+        for (idx, (x0,y0,x1,y1)) in enumerate(self.faces):
+            if x0 <= point[0] <= x1 and y0 <= point[1] <= y1:
+                return idx
+        return None
+    def merge_faces(self, face_idx):
+        self.merged.append(face_idx)
+
+########################################
+def test_arrangement_group_faces_are_indexed_globally():
+    frame = Part([[0,0,300,100]])
+    rooms = [Part([[10,10,30,50], [30,10,50,50]]), Part([[110,10,150,50]])]
+    group = arrangementGroups.ArrangementGroup([frame] + rooms, [[0], [1,2], [3]])
+    assert list(group.face_offsets()) == [0, 1, 3, 4]
+    assert len(group.decomposition.faces) == 4
+    assert [group.local_face(idx) for idx in range(4)] == [(0,0), (1,0), (1,1), (2,0)]
+
+    # the rooms are on top of the frame
+    assert group.decomposition.find_face((20,20)) == 1
+    assert group.decomposition.find_face((120,20)) == 3
+    assert group.decomposition.find_face((200,20)) == 0
+    assert group.decomposition.find_face((400,20)) is None
+
+    # faces are merged in their arrangement, only if they are in the same one
+    group.merge_faces([1, 2])
+    assert rooms[0].merged == [[0, 1]]
+    group.merge_faces([2, 3])
+    assert rooms[0].merged == [[0, 1]] and rooms[1].merged == []
+    assert arrangementGroups.arrangements_of(group) == [frame] + rooms
+    assert arrangementGroups.arrangements_of(frame) == [frame]
@@ -0,0 +1,43 @@
+from __future__ import print_function
+
+import os, sys
+import subprocess
+import pytest
+
+pytest.importorskip('cv2')
+import annotationLib
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+########################################
+@pytest.fixture
+def batch():
+    ''' the batch script, imported from the root of the repo '''
+    sys.path.insert(0, ROOT)
+    try:
+        import runMe_batch_annotation
+    finally:
+        sys.path.remove(ROOT)
+    return runMe_batch_annotation
+
+########################################
+def test_failed_save_does_not_raise(batch, tmp_path):
+    image_name = os.path.join(ROOT, 'example', 'octagon_BW_deformed_noisy.png')
+    output_dir = str(tmp_path / 'missing' / 'directory')
+    name, n_traits, _ = batch.annotate_and_save((image_name, output_dir, annotationLib.default_setting, False))
+    assert name == image_name and n_traits is None
+
+########################################
+def test_annotate_and_save(batch, tmp_path):
+    image_name = os.path.join(ROOT, 'example', 'octagon_BW_deformed_noisy.png')
+    name, n_traits, _ = batch.annotate_and_save((image_name, str(tmp_path), annotationLib.default_setting, False))
+    assert n_traits > 0
+    traits = annotationLib.load_traits_from_file(str(tmp_path / 'octagon_BW_deformed_noisy.yaml'))
+    assert len(traits) == n_traits
+
+########################################
+def test_batch_does_not_need_arrangement():
+    # the batch only needs the trait table, not the sympy objects of the arrangement repo
+    code = ( "import sys; sys.modules['arrangement'] = sys.modules['sympy'] = None; "
+             "import runMe_batch_annotation" )
+    subprocess.check_call([sys.executable, '-c', code], cwd=ROOT)
@@ -0,0 +1,62 @@
+from __future__ import print_function
+
+import numpy as np
+import pytest
+
+pytest.importorskip('sympy')
+import matplotlib.path
+import faceLabelMap
+
+
+########################################
+class Face(object):
+    ''' a stand-in for a face of the arrangement, a box [x0,y0,x1,y1] '''
+    def __init__(self, x0, y0, x1, y1):
+        self.path = matplotlib.path.Path([[x0,y0], [x1,y0], [x1,y1], [x0,y1], [x0,y0]], closed=True)
+    def get_punched_path(self):
+        return self.path
+
+########################################
+class Arrangement(object):
+    ''' a stand-in for an arrangement, with its decomposition '''
+    def __init__(self, faces):
+        self.decomposition = self
+        self.faces = faces
+    def find_face(self, point):
+        for (idx, face) in enumerate(self.faces):
+            if face.path.contains_point((float(point.x), float(point.y))):
+                return idx
+        return None
+
+########################################
+def grid():
+    ''' a 3 x 2 grid of 10 x 10 faces '''
+    return Arrangement([Face(x, y, x+10, y+10) for y in [0, 10] for x in [0, 10, 20]])
+
+########################################
+def test_faces_are_found_in_the_raster():
+    arrangement = grid()
+    labels = faceLabelMap.FaceLabelMap(arrangement, max_size=60)
+    assert labels.labels.shape == (41, 61)
+    assert np.array_equal(np.unique(labels.labels), np.arange(-1, 6))
+    for (idx, face) in enumerate(arrangement.faces):
+        (x0, y0), (x1, y1) = face.path.get_extents().get_points()
+        assert labels.find_face((x0+x1)/2., (y0+y1)/2.) == idx
+        # on the border of the faces, the face is found exactly
+        assert labels.find_face(x0+.1, y0+.1) == idx
+    assert labels.find_face(-5, 5) is None and labels.find_face(15, 25) is None
+
+########################################
+def test_update_after_merging_faces():
+    arrangement = grid()
+    labels = faceLabelMap.FaceLabelMap(arrangement, max_size=60)
+    # merging the faces 1 and 4 (the middle column), faces after them are renumbered
+    faces = arrangement.faces
+    arrangement.faces = [faces[0], faces[2], faces[3], faces[5], Face(10, 0, 20, 20)]
+    labels.update()
+
+    expected = faceLabelMap.FaceLabelMap(arrangement, max_size=60)
+    assert np.array_equal(labels.labels, expected.labels)
+    assert np.array_equal(labels.ambiguous, expected.ambiguous)
+    assert labels.find_face(15, 5) == labels.find_face(15, 15) == 4
+    assert labels.find_face(25, 15) == 3
@@ -0,0 +1,76 @@
+from __future__ import print_function
+
+import numpy as np
+import pytest
+
+import productCache
+
+
+########################################
+def product(n, value=0):
+    ''' a product of n kB, and the compute function that counts its calls '''
+    calls = []
+    def compute():
+        calls.append(1)
+        return np.full(n*1024, value, np.uint8)
+    return compute, calls
+
+########################################
+def test_least_recently_used_products_are_evicted():
+    cache = productCache.ProductCache(max_bytes=3*1024)
+    for name in ['a', 'b', 'c']:
+        cache.get(name, product(1)[0])
+    cache.get('a', product(1)[0]) # a is used again, b is the least recently used
+    compute, calls = product(1)
+    cache.get('d', compute)
+    assert len(calls) == 1
+    assert list(cache.products.keys()) == ['c', 'a', 'd']
+    assert cache.nbytes() <= 3*1024
+
+    # a product larger than the cache is computed, but not kept
+    cache.get('e', product(4)[0])
+    assert 'e' not in cache.products and len(cache) == 3
+    assert cache.stats == {'hits': 1, 'disk hits': 0, 'misses': 5}
+
+########################################
+def test_keys_are_the_exact_parameters():
+    cache = productCache.ProductCache()
+    compute, calls = product(1)
+    images = cache.bind(('map.pgm', 10, 0))
+    edges = images.bind('edges', [50., 150., 3])
+    edges.get('array', [], compute)
+    # numpy parameters are the same as python ones
+    images.bind('edges', np.array([50., 150., 3])).get('array', [], compute)
+    assert len(calls) == 1
+    images.bind('edges', [50., 151., 3]).get('array', [], compute)
+    images.get('array', [], compute)
+    assert len(calls) == 3
+
+########################################
+def test_disk_tier(tmp_path):
+    directory = str(tmp_path / 'map.cache')
+    cache = productCache.ProductCache(use_disk=True)
+    value = (np.arange(5.), np.ones((2,3), np.uint8))
+    cache.get('gradient', lambda: value, directory)
+    cache.get('report', lambda: 'not an array', directory)
+
+    # another session, arrays are loaded from the disk
+    cache = productCache.ProductCache(use_disk=True)
+    loaded = cache.get('gradient', lambda: pytest.fail('computed again'), directory)
+    assert isinstance(loaded, tuple) and all([np.array_equal(a, b) for (a, b) in zip(loaded, value)])
+    assert cache.get('report', lambda: 'computed', directory) == 'computed'
+    assert cache.stats == {'hits': 0, 'disk hits': 1, 'misses': 1}
+
+    # not without the directory, or if the disk tier is disabled
+    cache = productCache.ProductCache(use_disk=False)
+    assert cache.get('gradient', lambda: 'computed', directory) == 'computed'
+
+########################################
+def test_map_key_changes_with_the_file(tmp_path):
+    file_name = str(tmp_path / 'map.pgm')
+    with open(file_name, 'wb') as f: f.write(b'map')
+    key = productCache.map_key(file_name)
+    assert productCache.map_key(file_name) == key
+    with open(file_name, 'wb') as f: f.write(b'another map')
+    assert productCache.map_key(file_name) != key
+    assert productCache.cache_dir(file_name) == str(tmp_path / 'map.cache')
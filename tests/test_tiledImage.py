@@ -0,0 +1,109 @@
+from __future__ import print_function
+
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip('cv2')
+import tiledImage
+
+
+########################################
+def random_map(shape, seed=0):
+    ''' a map-like image, free (255) with random occupied (0) and unknown (205) pixels '''
+    rng = np.random.RandomState(seed)
+    return rng.choice(np.array([0, 205, 255], np.uint8), size=shape, p=[.1, .2, .7])
+
+########################################
+def test_pyramid_levels():
+    image = random_map((1000, 700))
+    levels = tiledImage.pyramid(image, min_size=100)
+    assert [level.shape for level in levels] == [(1000,700), (500,350), (250,175), (125,88)]
+    assert levels[0] is image
+
+########################################
+def test_downsample_by_bands_matches_the_whole_image(tmp_path):
+    image = random_map((300, 202))
+    file_name = str(tmp_path / 'map.npy')
+    np.save(file_name, image)
+    mapped = np.load(file_name, mmap_mode='r')
+    expected = cv2.resize(image, (101, 150), interpolation=cv2.INTER_AREA)
+    # bands of an even number of rows are downsampled independently
+    assert np.array_equal(tiledImage.downsample(mapped, band=16), expected)
+    assert np.array_equal(tiledImage.downsample(image), expected)
+    # odd sizes are rounded up
+    assert tiledImage.downsample(mapped[:299, :201], band=16).shape == (150, 101)
+
+########################################
+def write_pgm(file_name, image, comment=b'# a comment\n'):
+    ''' a binary (P5) pgm file, 16 bit images are big endian '''
+    maxval = 255 if image.dtype == np.uint8 else 65535
+    with open(file_name, 'wb') as f:
+        f.write(b'P5\n' + comment + '{:d} {:d}\n{:d}\n'.format(image.shape[1], image.shape[0], maxval).encode())
+        f.write(image.astype(image.dtype.newbyteorder('>')).tobytes())
+
+########################################
+@pytest.mark.parametrize('dtype', [np.uint8, np.uint16])
+def test_pgm_maps_are_memory_mapped(tmp_path, dtype):
+    image = random_map((60, 90)).astype(dtype) * (1 if dtype == np.uint8 else 257)
+    file_name = str(tmp_path / 'map.pgm')
+    write_pgm(file_name, image)
+
+    assert tiledImage.read_pgm_header(file_name)[:3] == (90, 60, 255 if dtype == np.uint8 else 65535)
+    mapped = tiledImage.memmap_image(file_name)
+    assert isinstance(mapped, np.memmap)
+    assert np.array_equal(mapped, image)
+
+    # flipped upside down, and still a view of the file
+    loaded = tiledImage.load_map(file_name)
+    assert np.array_equal(loaded, np.flipud(image))
+    assert not loaded.flags.owndata
+
+########################################
+def test_ascii_pgm_is_read_with_opencv(tmp_path):
+    image = random_map((20, 30))
+    file_name = str(tmp_path / 'map.pgm')
+    with open(file_name, 'w') as f:
+        f.write('P2\n30 20\n255\n' + ' '.join(str(v) for v in image.ravel()) + '\n')
+    assert tiledImage.read_pgm_header(file_name) is None
+    assert tiledImage.memmap_image(file_name) is None
+    assert np.array_equal(tiledImage.load_map(file_name), np.flipud(image))
+
+########################################
+def test_tiled_image_matches_the_whole_image():
+    image = random_map((250, 310))
+    blur = lambda tile: cv2.blur(tile, (5,5))
+    tiled = tiledImage.TiledImage(image, blur, tile_size=64, halo=2, max_tiles=4)
+    expected = blur(image)
+    assert tiled.shape == image.shape and tiled.dtype == np.uint8
+    assert np.array_equal(np.asarray(tiled), expected)
+    assert np.array_equal(tiled[10:200:3, 70:75], expected[10:200:3, 70:75])
+    assert np.array_equal(tiled[240:], expected[240:])
+    # at most max_tiles are kept
+    assert len(tiled.tiles) == 4
+    assert tiled.nbytes == sum([tile.nbytes for tile in tiled.tiles.values()])
+    with pytest.raises(TypeError):
+        tiled[5, 5]
+
+########################################
+def test_ros_map_server_maps(tmp_path):
+    image = random_map((40, 50))
+    write_pgm(str(tmp_path / 'office.pgm'), image)
+    yaml_name = str(tmp_path / 'office.yaml')
+    with open(yaml_name, 'w') as f:
+        f.write('image: office.pgm\nresolution: 0.05\norigin: [-10.0, -5.0, 0.0]\n'
+                'negate: 0\noccupied_thresh: 0.65\nfree_thresh: 0.196\n')
+
+    # the yaml file, or the image it points to
+    for file_name in [yaml_name, str(tmp_path / 'office.pgm')]:
+        info = tiledImage.ros_map_info(file_name)
+        assert info['resolution'] == .05 and info['origin'] == [-10, -5, 0]
+        assert info['image'] == str(tmp_path / 'office.pgm')
+        assert np.array_equal(tiledImage.load_map(file_name), np.flipud(image))
+
+    # not a map_server map
+    write_pgm(str(tmp_path / 'other.pgm'), image)
+    assert tiledImage.ros_map_info(str(tmp_path / 'other.pgm')) is None
+    with open(str(tmp_path / 'other.yaml'), 'w') as f:
+        f.write('segments: []\n')
+    assert tiledImage.ros_map_info(str(tmp_path / 'other.yaml')) is None
+    assert tiledImage.load_map(str(tmp_path / 'other.yaml')) is None
@@ -0,0 +1,151 @@
+from __future__ import print_function
+
+import numpy as np
+import pytest
+
+from traitTable import TraitTable, SEGMENT, LINE, ARC, CIRCLE
+
+
+########################################
+def test_reduced_merges_duplicate_lines():
+    traits = TraitTable()
+    traits.add_lines([[0,10,100,10], [5,10.3,50,10.3], [0,0,0,100], [0.2,50,0.25,0]])
+    reduced, removed = traits.reduced(.5*np.pi/180, 1.)
+    assert removed == 2
+    assert np.allclose(reduced.points, [[0,10,100,10], [0,0,0,100]])
+
+########################################
+def test_reduced_does_not_chain_past_the_tolerance():
+    # parallel lines 0.9 apart, each is only within the tolerance of its neighbors
+    traits = TraitTable()
+    traits.add_lines([[0,i*.9,1,i*.9] for i in range(20)])
+    reduced, removed = traits.reduced(.5*np.pi/180, 1.)
+    assert len(reduced) == 10
+    kept = reduced.points[:,1]
+    assert np.all(np.diff(kept) > 1.)
+
+########################################
+def test_reduced_merges_overlapping_collinear_segments():
+    traits = TraitTable()
+    traits.add_segments([[0,0,10,0], [8,0.2,20,0.2], [30,0,40,0]])
+    reduced, removed = traits.reduced(.5*np.pi/180, 1.)
+    assert removed == 1
+    assert np.allclose(reduced.points, [[0,0,20,0], [30,0,40,0]])
+
+########################################
+def test_reduced_removes_zero_length_segments():
+    traits = TraitTable()
+    traits.add_segments([[5,0,5,0], [0,0,10,0], [5,.2,20,.2]])
+    reduced, removed = traits.reduced(.5*np.pi/180, 1.)
+    assert removed == 2
+    assert np.all(np.isfinite(reduced.points))
+    assert np.allclose(reduced.points, [[0,0,20,0]])
+
+########################################
+def test_extend_unique_skips_existing_traits():
+    traits = TraitTable()
+    traits.add_lines([[0,10,100,10]])
+    traits.add_segments([[0,0,10,0]])
+    other = TraitTable()
+    other.add_lines([[100,10,-3,10]]) # same line, other points
+    other.add_segments([[10,0,0,0]]) # same segment, reversed
+    other.add_circles([[5,5]], [3])
+    traits.extend(other, unique=True)
+    assert len(traits) == 3
+    traits.extend(other, unique=True)
+    assert len(traits) == 3
+
+########################################
+def test_subset_keeps_version():
+    traits = TraitTable()
+    traits.add_segments([[0,0,1,0], [0,1,1,1]])
+    traits.add_circles([[0,0]], [1])
+    subset = traits.subset([2,0])
+    assert subset.version == traits.version == traits.copy().version
+    assert subset.kind.tolist() == [traits.kind[2], traits.kind[0]]
+
+########################################
+def test_clipped_turns_lines_and_rays_into_segments():
+    traits = TraitTable()
+    traits.add_lines([[0,5,1,5], [0,20,1,21], [3,0,3,1]]) # horizontal, outside, vertical
+    traits.add_rays([[5,5,6,6], [5,5,4,5]]) # diagonal, toward -x
+    traits.add_circles([[5,5]], [2])
+    clipped = traits.clipped([0,0,10,10], border=False)
+
+    assert len(clipped) == 5 # the line outside of the boundary is removed
+    assert clipped.kind.tolist() == [SEGMENT]*4 + [CIRCLE]
+    assert np.allclose(clipped.points[:4], [[0,5,10,5], [3,0,3,10], [5,5,10,10], [5,5,0,5]])
+    assert np.allclose(clipped.center[4], [5,5]) and clipped.radius[4] == 2
+
+########################################
+def test_clipped_adds_the_border():
+    traits = TraitTable()
+    traits.add_lines([[0,5,1,5]])
+    clipped = traits.clipped([0,0,10,10])
+    assert len(clipped) == 5
+    # the end points of the clipped line are exactly on the border segments
+    assert set(clipped.points[0,[0,2]]) == set([0., 10.])
+
+########################################
+def test_traits_round_trip():
+    pytest.importorskip('arrangement.geometricTraits')
+    traits = TraitTable()
+    traits.add_segments([[0,0,10,0]])
+    traits.add_circles([[5,5]], [2])
+    loaded = TraitTable.from_traits(traits.to_traits())
+    assert loaded.kind.tolist() == traits.kind.tolist()
+    assert np.allclose(loaded.points, traits.points, equal_nan=True)
+    assert np.allclose(loaded.radius, traits.radius, equal_nan=True)
+
+########################################
+def test_bounding_boxes():
+    traits = TraitTable()
+    traits.add_segments([[5,1,0,3]])
+    traits.add_rays([[1,2,2,2]])          # to the right
+    traits.add_lines([[0,4,1,4], [0,0,1,1]]) # horizontal, diagonal
+    traits.add_arcs([[1,2]], [3], [[0,np.pi/2]])
+    inf = np.inf
+    expected = [[0,1,5,3], [1,2,inf,2], [-inf,4,inf,4], [-inf,-inf,inf,inf], [-2,-1,4,5]]
+    boxes = traits.bounding_boxes()
+    assert np.array_equal(boxes, expected)
+    # cached until the rows change
+    assert traits.bounding_boxes() is boxes
+    traits.add_circles([[0,0]], [1])
+    assert np.array_equal(traits.bounding_boxes(), expected + [[-1,-1,1,1]])
+
+########################################
+def test_dict_round_trip():
+    data = {'segments': [[0,0,10,0]], 'rays': [[1,1,2,1]],
+            'lines': [[0,0,1,1], [0,5,2]], # two points, or a point and the slope
+            'circles': [[5,5,2]], 'arcs': [[1,2,3,0,1.5]]}
+    traits = TraitTable.from_dict(data)
+    assert len(traits) == 6
+    assert np.allclose(traits.points[traits.select(LINE)], [[0,0,1,1], [0,5,1,7]])
+    again = TraitTable.from_dict(traits.to_dict(boundary=[0,0,20,20]))
+    assert again.to_dict() == traits.to_dict()
+    assert traits.to_dict(boundary=[0,0,20,20])['boundary'] == [0,0,20,20]
+
+########################################
+def test_transform():
+    traits = TraitTable()
+    traits.add_segments([[1,0,2,0]])
+    traits.add_arcs([[1,0]], [1], [[0,np.pi/2]])
+    moved = traits.transform(scale=2., rotation=np.pi/2, translation=(10,0))
+    assert np.allclose(moved.points[0], [10,2,10,4])
+    assert np.allclose(moved.center[1], [10,2]) and moved.radius[1] == 2
+    assert np.allclose(moved.theta[1], [np.pi/2, np.pi])
+    # the table is not changed
+    assert np.allclose(traits.points[0], [1,0,2,0])
+
+########################################
+def test_delete_and_select():
+    traits = TraitTable()
+    traits.add_segments([[0,0,1,0], [0,1,1,1]])
+    traits.add_circles([[0,0]], [1])
+    traits.add_arcs([[0,0]], [2], [[0,1]])
+    version = traits.version
+    traits.delete([1, 2])
+    assert traits.kind.tolist() == [SEGMENT, ARC]
+    assert traits.version > version
+    assert list(traits.select([SEGMENT, CIRCLE])) == [0]
+    assert traits.describe(0).startswith('S')
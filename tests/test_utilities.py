@@ -0,0 +1,124 @@
+from __future__ import print_function
+
+import numpy as np
+import pytest
+
+import utilities
+
+
+########################################
+@pytest.mark.parametrize('ConvMode', ['full', 'same', 'valid'])
+@pytest.mark.parametrize('KernelSize, KernelSigma', [(7,1), (8,1), (31,5)])
+def test_ori_gradient_engines_match_direct(ConvMode, KernelSize, KernelSigma):
+    image = np.full((80,90), 255.)
+    image[20:60,30:70] = 0
+    image[10:15,5:10] = 0 # a zero region, where the output is exactly zero
+    image[:,:3] = 0
+    direct = utilities.OriGradientConvolution(image, KernelSize, KernelSigma, ConvMode, 'direct')
+    scale = np.abs(direct).max()
+    for Engine in ['separable', 'fft']:
+        other = utilities.OriGradientConvolution(image, KernelSize, KernelSigma, ConvMode, Engine)
+        assert other.shape == direct.shape
+        assert np.abs(other - direct).max() <= 1e-6 * scale
+        assert np.array_equal(other == 0, direct == 0)
+
+    single = utilities.OriGradientConvolution(image, KernelSize, KernelSigma, ConvMode, 'fft', Complex64=True)
+    assert single.dtype == np.complex64
+    assert np.abs(single - direct).max() <= 1e-5 * scale
+
+########################################
+def test_kernel_cache_is_bounded():
+    first = utilities.Gauss2DNormal(5, Sigma=.1)
+    assert utilities.Gauss2DNormal(5, Sigma=.1) is first
+    assert not first.flags.writeable
+    for i in range(2*utilities._kernel_cache_size):
+        utilities.Gauss2DNormal(5, Sigma=1.+i)
+    assert len(utilities._kernel_cache) == utilities._kernel_cache_size
+    # the least recently used are discarded, and built again
+    again = utilities.Gauss2DNormal(5, Sigma=.1)
+    assert again is not first and np.array_equal(again, first)
+
+########################################
+@pytest.mark.parametrize('Polar', [False, True])
+@pytest.mark.parametrize('Refine_win, MinPeakDist, MinPeakVal', [(10,15,.15), (1,1,.01), (3,30,.3)])
+def test_find_peaks_vectorized_matches_find_peaks(Polar, Refine_win, MinPeakDist, MinPeakVal):
+    # sinogram-like signals (see benchmark/bench_FindPeaks.py), with plateaus
+    rng = np.random.RandomState(0)
+    x = np.arange(360)
+    signals = 5 * rng.rand(4, 360)
+    for signal in signals:
+        for pos in rng.randint(0, 360, 20):
+            signal += 500*rng.rand() * np.exp(-((x-pos)/2.)**2)
+    signals[1, 100:110] = signals[1].max()
+    signals = np.round(signals, 1)
+
+    vectorized = utilities.FindPeaksVectorized(signals, Refine_win=Refine_win, MinPeakDist=MinPeakDist,
+                                               MinPeakVal=MinPeakVal, Polar=Polar)
+    assert len(vectorized) == len(signals)
+    for signal, peaks in zip(signals, vectorized):
+        expected = utilities.FindPeaks(signal, CWT=False, Refine_win=Refine_win, MinPeakDist=MinPeakDist,
+                                       MinPeakVal=MinPeakVal, Polar=Polar)
+        assert list(peaks) == list(expected)
+
+########################################
+def test_find_peaks_circular():
+    signal = np.array([5, 1, 0, 3, 1, 4, 6.])
+    # the first and the last samples are neighbors, 0 is not a peak
+    assert list(utilities.FindPeaksCircular(signal)) == [6, 3]
+    assert list(utilities.FindPeaksCircular(signal, NumPeaks=1)) == [6]
+    assert list(utilities.FindPeaksCircular(signal, MinPeakVal=.6)) == [6]
+    # 3 is 3 samples away from 6 (circular distance)
+    assert list(utilities.FindPeaksCircular(signal, MinPeakDist=4)) == [6]
+    assert list(utilities.FindPeaksCircular(signal, MinPeakDist=3)) == [6, 3]
+
+########################################
+@pytest.mark.parametrize('shape', [(200,200), (150,230)])
+def test_sparse_radon_matches_skimage(shape):
+    cv2 = pytest.importorskip('cv2')
+    skimage_transform = pytest.importorskip('skimage.transform')
+    # a sparse edge image (see benchmark/bench_SparseRadon.py)
+    rng = np.random.RandomState(0)
+    image = np.zeros(shape, dtype=np.uint8)
+    for _ in range(20):
+        p1 = tuple(int(v) for v in rng.randint(0, 150, 2))
+        p2 = tuple(int(v) for v in rng.randint(0, 150, 2))
+        cv2.line(image, p1, p2, 255, 1)
+    theta = np.array([-60.3, -15., 0., 12.7, 29.7, 90.])
+
+    expected = skimage_transform.radon(image, theta=theta, circle=False)
+    sinograms = utilities.SparseRadon(image, theta)
+    assert sinograms.shape == expected.shape
+    # equal up to the interpolation
+    assert np.allclose(sinograms.sum(axis=0), expected.sum(axis=0), rtol=.01)
+    assert np.abs(sinograms - expected).max() <= .05 * expected.max()
+    for (s1, s2) in zip(sinograms.T, expected.T):
+        assert np.corrcoef(s1, s2)[0,1] > .999
+        assert abs(np.argmax(s1) - np.argmax(s2)) <= 1
+
+    # the points of the image are shared by projections
+    points = utilities.SparseRadonPoints(image)
+    assert np.array_equal(utilities.SparseRadonProjection(points, theta[:2]), sinograms[:,:2])
+
+########################################
+def test_clip_to_box():
+    box = [0, 0, 10, 5]
+    points = [[0,1,1,1],     # horizontal line
+              [2,2,3,3],     # diagonal line, from the corner of the box
+              [20,0,20,1],   # vertical line, out of the box
+              [5,1,6,1],     # a ray, to the right
+              [-5,2,-4,2]]   # a ray that starts out of the box
+    clipped, valid = utilities.ClipToBox(points, box)
+    assert list(valid) == [True, True, False, True, True]
+    assert np.allclose(clipped[0], [0,1,10,1])
+    assert np.allclose(clipped[1], [0,0,5,5])
+    assert np.all(np.isnan(clipped[2]))
+
+    rays = np.array(points)[3:]
+    clipped, valid = utilities.ClipToBox(rays, box, tMin=0)
+    assert np.all(valid)
+    assert np.allclose(clipped, [[5,1,10,1], [0,2,10,2]])
+
+    # segments, [0,1] of their points
+    clipped, valid = utilities.ClipToBox([[2,2,4,2], [-2,2,4,2], [11,2,14,2]], box, tMin=0, tMax=1)
+    assert list(valid) == [True, True, False]
+    assert np.allclose(clipped[:2], [[2,2,4,2], [0,2,4,2]])
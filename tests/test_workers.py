@@ -0,0 +1,80 @@
+from __future__ import print_function
+
+import time
+import pytest
+
+pytest.importorskip('PySide')
+import workers
+
+
+########################################
+def count(n, progress=None):
+    ''' a step reporting its progress (top level, for run_in_process) '''
+    for i in range(n):
+        progress(float(i)/n, 'counting')
+    return n
+
+########################################
+def fail(progress=None):
+    raise ValueError('no map')
+
+########################################
+def sleep(seconds, progress=None):
+    progress(0, 'sleeping')
+    time.sleep(seconds)
+
+########################################
+class Recorder(object):
+    ''' a progress callback, recording the reports, cancelling after max_reports '''
+    def __init__(self, max_reports=None):
+        self.reports = []
+        self.max_reports = max_reports
+    def __call__(self, fraction=None, message=''):
+        if self.max_reports is not None and len(self.reports) >= self.max_reports:
+            raise workers.Cancelled()
+        if fraction is not None:
+            self.reports.append((fraction, message))
+
+########################################
+def run(worker):
+    ''' running a worker in this thread, returns the emitted signals as (name, argument) '''
+    emitted = []
+    worker.signals.finished.connect(lambda result: emitted.append(('finished', result)))
+    worker.signals.failed.connect(lambda error: emitted.append(('failed', error)))
+    worker.signals.cancelled.connect(lambda: emitted.append(('cancelled', None)))
+    worker.run()
+    return emitted
+
+########################################
+def test_worker_signals():
+    assert run(workers.Worker(count, 3)) == [('finished', 3)]
+    [(signal, error)] = run(workers.Worker(fail))
+    assert signal == 'failed' and 'no map' in error
+    worker = workers.Worker(count, 3)
+    worker.cancel()
+    assert run(worker) == [('cancelled', None)]
+
+########################################
+def test_sub_progress():
+    progress = Recorder()
+    step = workers.sub_progress(progress, .4, .8)
+    step(0, 'a')
+    step(.5, 'b')
+    assert progress.reports == [(.4, 'a'), (pytest.approx(.6), 'b')]
+    assert workers.sub_progress(None, .4, .8) is None
+
+########################################
+def test_run_in_process():
+    progress = Recorder()
+    assert workers.run_in_process(count, 4, progress=progress) == 4
+    assert [fraction for (fraction, _) in progress.reports] == [0, .25, .5, .75]
+
+    with pytest.raises(RuntimeError) as error:
+        workers.run_in_process(fail, progress=Recorder())
+    assert 'no map' in str(error.value)
+
+    # the process is terminated when the worker is cancelled
+    tic = time.time()
+    with pytest.raises(workers.Cancelled):
+        workers.run_in_process(sleep, 30, progress=Recorder(max_reports=1))
+    assert time.time() - tic < 10